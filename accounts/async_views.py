@@ -0,0 +1,93 @@
+"""
+Async variants of the hottest read endpoints.
+
+DRF views are synchronous, so under ASGI each request to them is run in a
+thread through sync_to_async. These are plain Django async views that await
+the cache and the async ORM directly, letting one ASGI worker keep thousands
+of slow clients in flight. The response bodies match the sync endpoints.
+"""
+
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import AuthenticationFailed
+
+from utils import json_utils
+
+from .authentication import AsyncJWTAuthentication, averify_token, get_bearer_token
+from .cache import aget_cached_profile
+from .models import Driver
+from .views import abuild_profile_payload, add_verification_cache_headers, driver_payload
+
+authentication = AsyncJWTAuthentication()
+
+
+def json_response(data, status=200):
+    return HttpResponse(json_utils.dumps(data), status=status, content_type='application/json')
+
+
+def unauthorized(message):
+    response = json_response({
+        'success': False,
+        'message': message
+    }, status=401)
+    response['WWW-Authenticate'] = authentication.keyword
+    return response
+
+
+async def authenticate_request(request):
+    """Return ``(user, None)``, or ``(None, 401 response)`` when not authenticated"""
+    try:
+        result = await authentication.aauthenticate(request)
+    except AuthenticationFailed as e:
+        return None, unauthorized(str(e.detail))
+    if result is None:
+        return None, unauthorized('Authentication credentials were not provided.')
+    return result[0], None
+
+
+@require_GET
+async def token_verify_view(request):
+    """Check the bearer token's signature, expiry and revocation and return its claims"""
+    token = get_bearer_token(request)
+    if token is None:
+        return unauthorized('Authentication credentials were not provided.')
+
+    try:
+        claims = await averify_token(token)
+    except AuthenticationFailed as e:
+        return unauthorized(str(e.detail))
+
+    response = json_response({
+        'success': True,
+        'claims': claims
+    })
+    return add_verification_cache_headers(response, claims)
+
+
+@require_GET
+async def get_profile_view(request):
+    user, error = await authenticate_request(request)
+    if error:
+        return error
+
+    profile = await aget_cached_profile(user.id, abuild_profile_payload)
+
+    return json_response({
+        'success': True,
+        'user': profile
+    })
+
+
+@require_GET
+async def get_all_drivers_view(request):
+    """Get all drivers with their vehicle IDs, usernames, and user IDs"""
+    drivers_data = [
+        driver_payload(driver)
+        async for driver in Driver.objects.select_related('user').all()
+    ]
+
+    return json_response({
+        'success': True,
+        'count': len(drivers_data),
+        'drivers': drivers_data
+    })
@@ -0,0 +1,52 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from .claims import TOKEN_RELATIONS
+from .hash_pool import amake_password
+from .hashers import hasher_for_role
+
+UserModel = get_user_model()
+
+
+class ProfileModelBackend(ModelBackend):
+    """
+    ModelBackend that loads the user with the role and the role profiles
+    used for token claims joined, so login needs no follow-up queries.
+    Password checks go through the User model, so they use the role's hash
+    profile and the hashing pool.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.select_related(*TOKEN_RELATIONS).get(
+                **{UserModel.USERNAME_FIELD: username}
+            )
+        except UserModel.DoesNotExist:
+            # Run the default password hasher once to reduce the timing
+            # difference between an existing and a nonexistent user
+            UserModel().set_password(password)
+        else:
+            if user.check_password(password) and self.user_can_authenticate(user):
+                return user
+        return None
+
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        """authenticate() that awaits password hashing (see accounts.hash_pool)"""
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = await UserModel._default_manager.select_related(*TOKEN_RELATIONS).aget(
+                **{UserModel.USERNAME_FIELD: username}
+            )
+        except UserModel.DoesNotExist:
+            await amake_password(password, hasher_for_role(None))
+        else:
+            if await user.acheck_password(password) and self.user_can_authenticate(user):
+                return user
+        return None
@@ -0,0 +1,233 @@
+"""
+Caching helpers for authentication lookups and profile payloads.
+
+Two layers are used:
+
+* ``user_cache`` - a per-worker LRU in front of everything, which saves
+  fetching and unpickling the user.
+* the shared Django cache (Redis in production, see ``CACHES``) - shared by
+  all workers so scaling out does not multiply the database read load.
+
+Entries are versioned: every shared key embeds a global generation and the
+user's own version, both bumped by model signals, and ``user_cache`` entries
+remember the version they were loaded under. A change therefore makes every
+older entry unreachable, in every worker, instead of relying on deletes to
+propagate.
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .claims import TOKEN_RELATIONS
+from .models import User
+
+GENERATION_KEY = 'auth:generation'
+USER_VERSION_KEY = 'auth:user-version:{user_id}'
+USER_KEY = 'auth:user:{user_id}'
+PROFILE_KEY = 'profile:{user_id}'
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache with a per-entry TTL.
+
+    Keeps hit/miss/eviction counters so the size and TTL can be tuned from
+    real traffic.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """Return the cached value or None, refreshing its LRU position"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """Store a value, evicting the least recently used entries if full"""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._data)
+            self._data.clear()
+
+    def stats(self):
+        """Snapshot of the cache counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
+
+
+# Per-worker cache of (version, User) pairs (with role and hot role profiles
+# joined)
+user_cache = LRUCache(settings.AUTH_USER_CACHE_SIZE, settings.AUTH_USER_CACHE_TTL)
+
+
+def _get_or_init(keys):
+    """Read version counters, initialising any that are missing or evicted"""
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            # A fresh timestamp is always newer than anything cached before,
+            # so losing a counter can never resurrect a stale entry
+            cache.add(key, time.time_ns(), timeout=None)
+            values[key] = cache.get(key)
+    return values
+
+
+def get_user_version(user_id):
+    """Version under which the user's shared cache entries are stored"""
+    user_key = USER_VERSION_KEY.format(user_id=user_id)
+    values = _get_or_init([GENERATION_KEY, user_key])
+    return f"{values[GENERATION_KEY]}.{values[user_key]}"
+
+
+async def _aget_or_init(keys):
+    """Async variant of ``_get_or_init``"""
+    values = await cache.aget_many(keys)
+    for key in keys:
+        if key not in values:
+            await cache.aadd(key, time.time_ns(), timeout=None)
+            values[key] = await cache.aget(key)
+    return values
+
+
+async def aget_user_version(user_id):
+    """Async variant of ``get_user_version``"""
+    user_key = USER_VERSION_KEY.format(user_id=user_id)
+    values = await _aget_or_init([GENERATION_KEY, user_key])
+    return f"{values[GENERATION_KEY]}.{values[user_key]}"
+
+
+def bump_user_version(user_id):
+    """Make every shared cache entry of the user unreachable"""
+    cache.set(USER_VERSION_KEY.format(user_id=user_id), time.time_ns(), timeout=None)
+
+
+def bump_generation():
+    """Make every versioned shared cache entry unreachable"""
+    cache.set(GENERATION_KEY, time.time_ns(), timeout=None)
+
+
+def get_cached_user(user_id):
+    """
+    Get a user by id through the per-worker cache, then the shared cache.
+
+    Callers get their own copy, so mutating and saving request.user never
+    alters the cached instance. Raises User.DoesNotExist like a normal lookup.
+    """
+    # Read the version even on a local hit: another worker may have changed
+    # the user, and only the shared version tells
+    version = get_user_version(user_id)
+    user = _local_user(user_id, version)
+    if user is None:
+        key = USER_KEY.format(user_id=user_id)
+        user = cache.get(key, version=version)
+        if user is None:
+            user = User.objects.select_related(*TOKEN_RELATIONS).get(id=user_id)
+            cache.set(key, user, timeout=settings.AUTH_SHARED_CACHE_TTL, version=version)
+        user_cache.set(user_id, (version, user))
+    return copy.copy(user)
+
+
+def _local_user(user_id, version):
+    """The user from ``user_cache`` if it was loaded under ``version``"""
+    entry = user_cache.get(user_id)
+    if entry is None:
+        return None
+    cached_version, user = entry
+    if cached_version != version:
+        user_cache.delete(user_id)
+        return None
+    return user
+
+
+def get_cached_profile(user_id, build, version=None):
+    """
+    Return the profile payload of a user from the shared cache, calling
+    ``build(user_id)`` to produce (and store) it on a miss. ``version`` is
+    the user's version when the caller already read it.
+    """
+    key = PROFILE_KEY.format(user_id=user_id)
+    if version is None:
+        version = get_user_version(user_id)
+    payload = cache.get(key, version=version)
+    if payload is None:
+        payload = build(user_id)
+        cache.set(key, payload, timeout=settings.AUTH_SHARED_CACHE_TTL, version=version)
+    return payload
+
+
+async def aget_cached_user(user_id):
+    """Async variant of ``get_cached_user`` for async views"""
+    version = await aget_user_version(user_id)
+    user = _local_user(user_id, version)
+    if user is None:
+        key = USER_KEY.format(user_id=user_id)
+        user = await cache.aget(key, version=version)
+        if user is None:
+            user = await User.objects.select_related(*TOKEN_RELATIONS).aget(id=user_id)
+            await cache.aset(key, user, timeout=settings.AUTH_SHARED_CACHE_TTL, version=version)
+        user_cache.set(user_id, (version, user))
+    return copy.copy(user)
+
+
+async def aget_cached_profile(user_id, abuild):
+    """Async variant of ``get_cached_profile``; ``abuild`` is a coroutine function"""
+    key = PROFILE_KEY.format(user_id=user_id)
+    version = await aget_user_version(user_id)
+    payload = await cache.aget(key, version=version)
+    if payload is None:
+        payload = await abuild(user_id)
+        await cache.aset(key, payload, timeout=settings.AUTH_SHARED_CACHE_TTL, version=version)
+    return payload
@@ -0,0 +1,37 @@
+"""
+System checks for settings the accounts app depends on.
+"""
+
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+
+# Cache backends whose entries are only visible to the process that wrote them
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+@register(Tags.security, Tags.caches)
+def check_revocation_cache(app_configs, **kwargs):
+    """
+    Per-user revocation markers (deactivation, role change, refresh token
+    replay) live in the default cache; a process-local cache only revokes
+    tokens in the worker that wrote the marker
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    if settings.JWT_STATELESS_AUTH:
+        return [Error(
+            f'JWT_STATELESS_AUTH needs a cache shared by all workers, not {backend}.',
+            hint='Set REDIS_URL. Revoked tokens would stay valid in every other worker '
+                 'until they expire.',
+            id='accounts.E001',
+        )]
+    return [Warning(
+        f'Token revocation markers are stored in {backend}, which is not shared between workers.',
+        hint='Set REDIS_URL when running more than one worker process; otherwise a refresh '
+             'token replay revokes the user\'s tokens in one worker only.',
+        id='accounts.W001',
+    )]
@@ -0,0 +1,53 @@
+"""
+Per-role token claims.
+
+``generate_jwt_token`` adds the claims of every builder registered for the
+user's role. A builder declares the role profile relation it reads, and the
+login backend (and the user caches) join those relations when loading the
+user, so minting a token costs no queries beyond loading the user itself.
+
+To add claims for a role::
+
+    @claim_builder(7, relation='auditor')
+    def auditor_claims(user):
+        return {'region': user.auditor.region}
+"""
+
+from django.core.exceptions import ObjectDoesNotExist
+
+# role id -> builders
+CLAIM_BUILDERS = {}
+# Relations joined whenever a user is loaded for authentication
+TOKEN_RELATIONS = ['role']
+
+
+def claim_builder(*role_ids, relation=None):
+    """Register ``builder(user) -> dict`` for the given roles"""
+    def register(builder):
+        for role_id in role_ids:
+            CLAIM_BUILDERS.setdefault(role_id, []).append(builder)
+        if relation is not None and relation not in TOKEN_RELATIONS:
+            TOKEN_RELATIONS.append(relation)
+        return builder
+    return register
+
+
+def build_role_claims(user):
+    """Extra claims for the user's role; a missing role profile adds none"""
+    claims = {}
+    for builder in CLAIM_BUILDERS.get(user.role_id, ()):
+        try:
+            claims.update(builder(user))
+        except ObjectDoesNotExist:
+            pass
+    return claims
+
+
+@claim_builder(6, relation='driver')
+def driver_claims(user):
+    return {'vehicle_id': user.driver.vehicle_id}
+
+
+@claim_builder(5, relation='warehousemanager')
+def warehouse_manager_claims(user):
+    return {'warehouse_id': user.warehousemanager.warehouse_id}
@@ -0,0 +1,74 @@
+"""
+Conditional GET support (ETag / Last-Modified / 304 Not Modified).
+
+Validators are derived from cheap version information, never from the
+response body: the user's cache version for profiles, and the table's
+latest ``updated_at`` plus the resource's latest deletion tombstone for
+lists. ``not_modified`` is checked before the payload is built, so an
+unchanged resource costs a couple of index lookups (or one cache read) and
+no serialization.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .models import DeletedRecord
+
+
+def make_etag(*parts):
+    """Weak ETag from version parts (weak: the renderer may vary the bytes)"""
+    digest = hashlib.sha1('|'.join(map(str, parts)).encode('utf-8')).hexdigest()
+    return f'W/{quote_etag(digest)}'
+
+
+def list_version(model, resource):
+    """
+    ``(etag parts, last modified)`` of a list of ``model`` rows: the latest
+    change in the whole table and the latest deletion tombstone of the sync
+    ``resource``, both read from an index. Filtered lists use the table-wide
+    version too, so a row updated out of a filter still changes the ETag.
+    """
+    last_modified = model.objects.aggregate(last_modified=Max('updated_at'))['last_modified']
+    last_deleted = (
+        DeletedRecord.objects.filter(resource=resource)
+        .order_by('-deleted_at', '-id')
+        .values_list('id', flat=True)
+        .first()
+    )
+    return (last_modified.isoformat() if last_modified else None, last_deleted), last_modified
+
+
+def not_modified(request, etag, last_modified=None, private=False):
+    """A 304 response if the client's copy is current, else None"""
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+    if response is not None:
+        set_validators(response, etag, last_modified, private=private)
+    return response
+
+
+def set_validators(response, etag, last_modified=None, private=False):
+    """
+    Add ETag/Last-Modified, and make caches revalidate before reuse
+    (``CONDITIONAL_GET_MAX_AGE`` seconds of freshness, 0 by default)
+    """
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    visibility = {'private': True} if private else {'public': True}
+    patch_cache_control(
+        response,
+        max_age=settings.CONDITIONAL_GET_MAX_AGE,
+        must_revalidate=True,
+        **visibility
+    )
+    if private:
+        patch_vary_headers(response, ['Authorization'])
+    return response
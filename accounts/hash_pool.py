@@ -0,0 +1,201 @@
+"""
+Password hashing off the request thread.
+
+PBKDF2, Argon2 and scrypt are CPU-bound, so with threaded workers (gthread)
+every login, registration and password change serializes the worker's
+threads on hashing. With ``PASSWORD_HASH_POOL_WORKERS`` set, hashing and
+verification run in a per-worker process pool instead:
+
+* at most ``PASSWORD_HASH_POOL_MAX_PENDING`` jobs are queued or running per
+  worker; further callers wait for a slot, so an overload queues in the
+  request threads rather than growing the pool's queue without bound
+* the async variants wait for the result without blocking the event loop
+* queue depth and wait time (submit until a pool process starts the job)
+  are exposed through ``hash_pool.snapshot()`` on the admin metrics endpoint
+
+Without it (the default) everything runs inline, as before.
+"""
+
+import asyncio
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+def _timed(func, submitted_at, *args, **kwargs):
+    """Runs in the pool: the result plus how long the job waited to start"""
+    # CLOCK_MONOTONIC is system-wide on Linux, so it compares across processes
+    waited = time.monotonic() - submitted_at
+    started_at = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, waited, time.perf_counter() - started_at
+
+
+class HashPool:
+    """Bounded process pool for password hashing, created on first use"""
+
+    # How often async callers retry for a free slot
+    SLOT_POLL_SECONDS = 0.005
+
+    def __init__(self, workers, max_pending, samples=1000):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=samples)
+        self._runs = deque(maxlen=samples)
+        self.counters = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'pending': 0,
+            'max_pending_seen': 0,
+            'slot_waits': 0,
+        }
+
+    @property
+    def enabled(self):
+        return self.workers > 0
+
+    def executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    # forkserver rather than fork: the pool is created lazily
+                    # inside a threaded worker that holds DB connections
+                    self._executor = ProcessPoolExecutor(
+                        self.workers, mp_context=multiprocessing.get_context('forkserver')
+                    )
+        return self._executor
+
+    def _submit(self, func, args, kwargs):
+        with self._lock:
+            self.counters['submitted'] += 1
+            self.counters['pending'] += 1
+            self.counters['max_pending_seen'] = max(
+                self.counters['max_pending_seen'], self.counters['pending']
+            )
+        try:
+            future = self.executor().submit(_timed, func, time.monotonic(), *args, **kwargs)
+        except Exception:
+            self._slots.release()
+            with self._lock:
+                self.counters['pending'] -= 1
+                self.counters['failed'] += 1
+            raise
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        self._slots.release()
+        with self._lock:
+            self.counters['pending'] -= 1
+            # Cancelled when an awaiting task was cancelled before the job ran
+            if future.cancelled() or future.exception() is not None:
+                self.counters['failed'] += 1
+                return
+            self.counters['completed'] += 1
+            _, waited, ran = future.result()
+            self._waits.append(waited)
+            self._runs.append(ran)
+
+    def run(self, func, *args, **kwargs):
+        """Run ``func`` in the pool (inline when disabled) and return its result"""
+        if not self.enabled:
+            return func(*args, **kwargs)
+        if not self._slots.acquire(blocking=False):
+            self._count_slot_wait()
+            self._slots.acquire()
+        return self._submit(func, args, kwargs).result()[0]
+
+    async def arun(self, func, *args, **kwargs):
+        """Awaitable ``run``; the event loop keeps serving while the pool works"""
+        if not self.enabled:
+            return func(*args, **kwargs)
+        if not self._slots.acquire(blocking=False):
+            self._count_slot_wait()
+            # Poll rather than block a thread on the semaphore: a cancelled
+            # task then never ends up holding a slot it will not release
+            while not self._slots.acquire(blocking=False):
+                await asyncio.sleep(self.SLOT_POLL_SECONDS)
+        result = await asyncio.wrap_future(self._submit(func, args, kwargs))
+        return result[0]
+
+    def map(self, func, args_list):
+        """
+        ``[func(*args) for args in args_list]``, run in parallel across the
+        pool (inline when disabled)
+        """
+        if not self.enabled:
+            return [func(*args) for args in args_list]
+        futures = []
+        for args in args_list:
+            if not self._slots.acquire(blocking=False):
+                self._count_slot_wait()
+                self._slots.acquire()
+            futures.append(self._submit(func, args, {}))
+        return [future.result()[0] for future in futures]
+
+    def _count_slot_wait(self):
+        with self._lock:
+            self.counters['slot_waits'] += 1
+
+    def snapshot(self):
+        """Counters plus wait and run time percentiles in milliseconds"""
+        with self._lock:
+            waits = sorted(self._waits)
+            runs = sorted(self._runs)
+            data = dict(self.counters)
+
+        def percentile(samples, p):
+            if not samples:
+                return None
+            index = min(len(samples) - 1, int(round(p * (len(samples) - 1))))
+            return round(samples[index] * 1000, 3)
+
+        data.update({
+            'enabled': self.enabled,
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            'wait_ms': {p: percentile(waits, q) for p, q in (('p50', 0.5), ('p99', 0.99), ('max', 1.0))},
+            'run_ms': {p: percentile(runs, q) for p, q in (('p50', 0.5), ('p99', 0.99), ('max', 1.0))},
+        })
+        return data
+
+
+hash_pool = HashPool(
+    settings.PASSWORD_HASH_POOL_WORKERS,
+    settings.PASSWORD_HASH_POOL_MAX_PENDING or 4 * max(settings.PASSWORD_HASH_POOL_WORKERS, 1),
+)
+
+
+def encode_password(password, hasher):
+    """make_password for a usable password; a pool job (keep importable without Django set up)"""
+    return hashers.make_password(password, hasher=hasher)
+
+
+def make_password(password, hasher):
+    if password is None:
+        return hashers.make_password(None)
+    return hash_pool.run(hashers.make_password, password, hasher=hasher)
+
+
+async def amake_password(password, hasher):
+    if password is None:
+        return hashers.make_password(None)
+    return await hash_pool.arun(hashers.make_password, password, hasher=hasher)
+
+
+def verify_password(password, encoded, preferred):
+    """``(is_correct, must_update)``, as django.contrib.auth.hashers.verify_password"""
+    return hash_pool.run(hashers.verify_password, password, encoded, preferred=preferred)
+
+
+async def averify_password(password, encoded, preferred):
+    return await hash_pool.arun(hashers.verify_password, password, encoded, preferred=preferred)
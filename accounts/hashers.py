@@ -0,0 +1,42 @@
+"""
+Password hashing cost profiles.
+
+``PASSWORD_HASH_PROFILES`` names a hasher and its parameters (Argon2 time
+and memory cost, scrypt work factor, PBKDF2 iterations); each role hashes
+new passwords with the profile from ``PASSWORD_HASH_ROLE_PROFILES``, falling
+back to ``PASSWORD_HASH_DEFAULT_PROFILE``. Verification reads the algorithm
+and parameters from the stored hash, so changing a role's profile never
+locks anyone out: ``User.check_password`` rehashes with the new profile on
+the user's next successful login.
+"""
+
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+
+@lru_cache(maxsize=None)
+def get_profile_hasher(name):
+    """Hasher instance configured with the parameters of a profile"""
+    try:
+        params = dict(settings.PASSWORD_HASH_PROFILES[name])
+    except KeyError:
+        raise ImproperlyConfigured(f"Unknown password hash profile '{name}'")
+    hasher = import_string(params.pop('hasher'))()
+    for param, value in params.items():
+        if not hasattr(hasher, param):
+            raise ImproperlyConfigured(
+                f"{type(hasher).__name__} has no parameter '{param}' (profile '{name}')"
+            )
+        setattr(hasher, param, value)
+    return hasher
+
+
+def profile_for_role(role_id):
+    return settings.PASSWORD_HASH_ROLE_PROFILES.get(role_id, settings.PASSWORD_HASH_DEFAULT_PROFILE)
+
+
+def hasher_for_role(role_id):
+    return get_profile_hasher(profile_for_role(role_id))
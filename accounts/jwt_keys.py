@@ -0,0 +1,162 @@
+"""
+Signing keys for access tokens.
+
+Without ``JWT_KEYS_DIR`` tokens are signed with HS256 and ``SECRET_KEY``, as
+before. With it, every ``<kid>.pem`` private key in the directory (RSA for
+RS256, Ed25519 for EdDSA) is loaded into a key ring:
+
+* tokens are signed with the ``JWT_ACTIVE_KID`` key and carry its ``kid``
+  in the header
+* tokens are verified with the key named by their ``kid``, so tokens signed
+  with a previous key stay valid while that key is in the directory
+* the public halves are published at ``/.well-known/jwks.json`` so other
+  services can verify tokens locally
+
+Rotation: add a key with ``manage.py generate_jwt_key``, deploy it so it is
+published, switch ``JWT_ACTIVE_KID`` to it once consumers have refreshed
+their JWKS cache, and delete the old file after the longest token lifetime.
+"""
+
+import os
+import threading
+import time
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from jwt.algorithms import OKPAlgorithm, RSAAlgorithm
+
+# Minimum seconds between reloads triggered by tokens with an unknown kid
+RELOAD_INTERVAL = 60
+
+
+def algorithm_for(private_key):
+    if isinstance(private_key, rsa.RSAPrivateKey):
+        return 'RS256'
+    if isinstance(private_key, ed25519.Ed25519PrivateKey):
+        return 'EdDSA'
+    raise ImproperlyConfigured(f'Unsupported JWT signing key type: {type(private_key).__name__}')
+
+
+def public_jwk(kid, algorithm, public_key):
+    """JWK (RFC 7517) for a public key"""
+    if algorithm == 'RS256':
+        jwk = RSAAlgorithm.to_jwk(public_key, as_dict=True)
+    else:
+        jwk = OKPAlgorithm.to_jwk(public_key, as_dict=True)
+    jwk.update({'kid': kid, 'alg': algorithm, 'use': 'sig'})
+    return jwk
+
+
+class SigningKey:
+    def __init__(self, kid, private_key):
+        self.kid = kid
+        self.private_key = private_key
+        self.public_key = private_key.public_key()
+        self.algorithm = algorithm_for(private_key)
+
+
+class KeyRing:
+    """The asymmetric keys from ``JWT_KEYS_DIR``, loaded once per process"""
+
+    def __init__(self, keys_dir, active_kid):
+        self.keys_dir = keys_dir
+        self.active_kid = active_kid
+        self._keys = {}
+        self._lock = threading.Lock()
+        self._loaded_at = None
+
+    def load(self):
+        keys = {}
+        for name in sorted(os.listdir(self.keys_dir)):
+            if not name.endswith('.pem'):
+                continue
+            with open(os.path.join(self.keys_dir, name), 'rb') as f:
+                private_key = serialization.load_pem_private_key(f.read(), password=None)
+            kid = name[:-len('.pem')]
+            keys[kid] = SigningKey(kid, private_key)
+
+        if self.active_kid not in keys:
+            raise ImproperlyConfigured(
+                f"JWT_ACTIVE_KID '{self.active_kid}' has no key file in {self.keys_dir}"
+            )
+        self._keys = keys
+        self._loaded_at = time.monotonic()
+
+    @property
+    def keys(self):
+        if self._loaded_at is None:
+            with self._lock:
+                if self._loaded_at is None:
+                    self.load()
+        return self._keys
+
+    def signing_key(self):
+        return self.keys[self.active_kid]
+
+    def verification_key(self, kid):
+        key = self.keys.get(kid)
+        if key is None and time.monotonic() - self._loaded_at > RELOAD_INTERVAL:
+            # A key added by a deploy this process has not seen yet
+            with self._lock:
+                self.load()
+            key = self._keys.get(kid)
+        return key
+
+    def jwks(self):
+        return {
+            'keys': [
+                public_jwk(key.kid, key.algorithm, key.public_key)
+                for key in self.keys.values()
+            ]
+        }
+
+
+_key_ring = None
+
+
+def get_key_ring():
+    """The process-wide key ring, or None when signing with HS256"""
+    global _key_ring
+    if _key_ring is None and settings.JWT_KEYS_DIR:
+        _key_ring = KeyRing(settings.JWT_KEYS_DIR, settings.JWT_ACTIVE_KID)
+    return _key_ring
+
+
+def encode_token(payload):
+    """Sign a token with the active key (HS256 with SECRET_KEY without a key ring)"""
+    key_ring = get_key_ring()
+    if key_ring is None:
+        return jwt.encode(payload, settings.SECRET_KEY, algorithm='HS256')
+
+    key = key_ring.signing_key()
+    return jwt.encode(payload, key.private_key, algorithm=key.algorithm, headers={'kid': key.kid})
+
+
+def decode_token(token):
+    """Verify the signature and expiry of a token and return its claims"""
+    key_ring = get_key_ring()
+    header = jwt.get_unverified_header(token)
+    kid = header.get('kid')
+
+    if kid is None:
+        # HS256 tokens: the only kind without a key ring, and still accepted
+        # during the switch to asymmetric keys unless disabled
+        if key_ring is not None and not settings.JWT_ACCEPT_HS256:
+            raise jwt.InvalidTokenError('Token has no key id')
+        return jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+
+    key = key_ring.verification_key(kid) if key_ring is not None else None
+    if key is None:
+        raise jwt.InvalidTokenError(f'Unknown key id: {kid}')
+    return jwt.decode(token, key.public_key, algorithms=[key.algorithm])
+
+
+def get_jwks():
+    """Public keys for /.well-known/jwks.json (empty without a key ring)"""
+    key_ring = get_key_ring()
+    if key_ring is None:
+        return {'keys': []}
+    return key_ring.jwks()
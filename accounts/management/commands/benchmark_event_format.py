@@ -0,0 +1,76 @@
+import gzip
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.management.commands.benchmark_kafka import sample_payload
+from accounts.models import Supplier
+from accounts.serializers import SupplierSerializer
+from utils.event_schema import decode_event
+from utils.kafka_utils import KafkaSupplierProducer, EVENT_FORMATS
+
+
+class Command(BaseCommand):
+    help = 'Compare message size and encode/decode throughput of the supplier event formats'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=50000,
+                            help='Messages encoded and decoded per format')
+        parser.add_argument('--batch', type=int, default=500,
+                            help='Messages per batch for the compressed size column')
+        parser.add_argument('--sample', action='store_true',
+                            help='Use a synthetic payload instead of suppliers from the database')
+
+    def handle(self, *args, **options):
+        payloads = self.payloads(options)
+        messages = [
+            KafkaSupplierProducer.build_message('supplier_updated', payload)
+            for payload in payloads
+        ]
+        count = options['messages']
+        messages = (messages * (count // len(messages) + 1))[:count]
+        self.stdout.write(f'{count} messages built from {len(payloads)} distinct payloads')
+
+        rows = []
+        for event_format in EVENT_FORMATS:
+            producer = KafkaSupplierProducer(event_format=event_format)
+
+            started_at = time.perf_counter()
+            values = [producer.serialize_value(message) for message in messages]
+            encode_elapsed = time.perf_counter() - started_at
+
+            started_at = time.perf_counter()
+            decoded = [decode_event(value) for value in values]
+            decode_elapsed = time.perf_counter() - started_at
+
+            if decoded[0] != messages[0]:
+                self.stderr.write(f'{event_format}: decoded message differs from the original')
+
+            # Brokers store compressed batches, so compare those sizes as well
+            batch = options['batch']
+            compressed = sum(
+                len(gzip.compress(b''.join(values[i:i + batch])))
+                for i in range(0, len(values), batch)
+            )
+            rows.append((
+                event_format,
+                sum(map(len, values)) / count,
+                compressed / count,
+                count / encode_elapsed,
+                count / decode_elapsed,
+            ))
+
+        self.stdout.write('')
+        self.stdout.write(f"{'format':<10}{'bytes/msg':>12}{'gzip bytes/msg':>16}"
+                          f"{'encode msg/s':>15}{'decode msg/s':>15}")
+        for event_format, size, compressed, encode_rate, decode_rate in rows:
+            self.stdout.write(f'{event_format:<10}{size:>12.1f}{compressed:>16.1f}'
+                              f'{encode_rate:>15.0f}{decode_rate:>15.0f}')
+
+    def payloads(self, options):
+        if not options['sample']:
+            suppliers = Supplier.objects.select_related('user').order_by('user_id')[:1000]
+            payloads = SupplierSerializer(suppliers, many=True).data
+            if payloads:
+                return payloads
+        return [sample_payload()]
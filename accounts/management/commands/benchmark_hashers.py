@@ -0,0 +1,100 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, ScryptPasswordHasher
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.hashers import get_profile_hasher
+
+PASSWORD = 'correct-horse-battery-staple'
+
+
+def verify_many(profile, encoded, count):
+    """Verify ``count`` times in a worker process; returns the elapsed seconds"""
+    import django
+    django.setup()
+    hasher = get_profile_hasher(profile)
+    started_at = time.perf_counter()
+    for _ in range(count):
+        hasher.verify(PASSWORD, encoded)
+    return time.perf_counter() - started_at
+
+
+def memory_per_hash(hasher):
+    """Memory one hash needs, in MiB"""
+    if isinstance(hasher, Argon2PasswordHasher):
+        return hasher.memory_cost / 1024
+    if isinstance(hasher, ScryptPasswordHasher):
+        return 128 * hasher.work_factor * hasher.block_size / 2 ** 20
+    return 0
+
+
+class Command(BaseCommand):
+    help = 'Measure logins per second per core for each password hash profile'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=20,
+                            help='Verifications per profile (per process)')
+        parser.add_argument('--processes', type=int, default=1,
+                            help='Verify in this many processes at once to include '
+                                 'contention for memory bandwidth and cores')
+        parser.add_argument('--profile', action='append', dest='profiles',
+                            help='Profile to measure (repeatable; default: all)')
+
+    def handle(self, *args, **options):
+        profiles = options['profiles'] or list(settings.PASSWORD_HASH_PROFILES)
+        unknown = set(profiles) - set(settings.PASSWORD_HASH_PROFILES)
+        if unknown:
+            raise CommandError(f"Unknown profiles: {', '.join(sorted(unknown))}")
+
+        rounds, processes = options['rounds'], options['processes']
+        self.stdout.write(f'{rounds} verifications per profile in {processes} process(es), '
+                          f'{len(os.sched_getaffinity(0))} CPUs available')
+
+        rows = []
+        for profile in profiles:
+            try:
+                hasher = get_profile_hasher(profile)
+                started_at = time.perf_counter()
+                encoded = hasher.encode(PASSWORD, hasher.salt())
+                hash_elapsed = time.perf_counter() - started_at
+            except (ImportError, ValueError) as e:
+                # e.g. argon2-cffi not installed, or OpenSSL without scrypt
+                self.stderr.write(f'{profile}: skipped ({e})')
+                continue
+
+            if processes == 1:
+                verify_elapsed = verify_many(profile, encoded, rounds)
+            else:
+                with ProcessPoolExecutor(processes) as executor:
+                    # Warm up the workers so startup is not measured
+                    list(executor.map(verify_many, [profile] * processes, [encoded] * processes,
+                                      [1] * processes))
+                    verify_elapsed = max(executor.map(
+                        verify_many, [profile] * processes, [encoded] * processes,
+                        [rounds] * processes
+                    ))
+
+            roles = sorted(
+                role_id for role_id, name in settings.PASSWORD_HASH_ROLE_PROFILES.items()
+                if name == profile
+            )
+            if profile == settings.PASSWORD_HASH_DEFAULT_PROFILE:
+                roles.append('default')
+            rows.append((
+                profile,
+                hash_elapsed * 1000,
+                verify_elapsed / rounds * 1000,
+                rounds / verify_elapsed,
+                memory_per_hash(hasher),
+                ','.join(map(str, roles)) or '-',
+            ))
+
+        self.stdout.write('')
+        self.stdout.write(f"{'profile':<20}{'hash ms':>10}{'verify ms':>11}"
+                          f"{'logins/s/core':>15}{'MiB/login':>11}  roles")
+        for profile, hash_ms, verify_ms, rate, memory, roles in rows:
+            self.stdout.write(f'{profile:<20}{hash_ms:>10.1f}{verify_ms:>11.1f}'
+                              f'{rate:>15.1f}{memory:>11.1f}  {roles}')
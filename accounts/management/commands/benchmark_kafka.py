@@ -0,0 +1,114 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from utils.kafka_utils import KafkaSupplierProducer, PRODUCER_BACKENDS, confluent_kafka
+
+
+def percentile(samples, p):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(round(p * (len(samples) - 1))))]
+
+
+def sample_payload():
+    """A supplier event shaped like SupplierSerializer output"""
+    now = timezone.now().isoformat().replace('+00:00', 'Z')
+    return {
+        'user': {
+            'id': 1042, 'username': 'supplier1042', 'email': 'supplier1042@example.com',
+            'first_name': 'Supplier', 'last_name': '1042', 'is_active': True,
+        },
+        'company_name': 'Delta Materials', 'code': 'SUP-104273', 'business_type': 'Wholesale',
+        'tax_id': 'TAX1042718', 'compliance_score': 7.4, 'active': True,
+        'created_at': now, 'updated_at': now,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Compare Kafka producer backends (messages/s and publish latency) against an in-process mock broker'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=20000,
+                            help='Messages per backend for the throughput run')
+        parser.add_argument('--sync-messages', type=int, default=500,
+                            help='Messages per backend for the blocking publish run')
+        parser.add_argument('--backends', default=','.join(PRODUCER_BACKENDS),
+                            help='Comma-separated backends to compare')
+        parser.add_argument('--bootstrap-servers', default=None,
+                            help='Use a real broker instead of the librdkafka mock cluster')
+
+    def handle(self, *args, **options):
+        backends = [name.strip() for name in options['backends'].split(',') if name.strip()]
+        unknown = set(backends) - set(PRODUCER_BACKENDS)
+        if unknown:
+            raise CommandError(f"Unknown backends: {', '.join(sorted(unknown))}")
+
+        bootstrap_servers = options['bootstrap_servers']
+        if bootstrap_servers is None:
+            # librdkafka ships an in-process mock cluster that speaks the real
+            # protocol, so both clients can be measured against it
+            if confluent_kafka is None:
+                raise CommandError('The mock broker needs confluent-kafka; pass --bootstrap-servers instead')
+            from confluent_kafka.admin import AdminClient
+            self._mock_cluster = AdminClient({'test.mock.num.brokers': 1, 'log_level': 0})
+            broker = next(iter(self._mock_cluster.list_topics(timeout=10).brokers.values()))
+            bootstrap_servers = f'{broker.host}:{broker.port}'
+            self.stdout.write(f'Started mock broker on {bootstrap_servers}')
+
+        payload = sample_payload()
+        rows = []
+        for name in backends:
+            producer = KafkaSupplierProducer(backend=name, bootstrap_servers=bootstrap_servers)
+            if producer.producer is None:
+                raise CommandError(f'Could not create the {name} producer')
+            rows.append((name, self.run_backend(producer, payload, options)))
+
+        self.stdout.write('')
+        self.stdout.write(f"{'backend':<18}{'msgs/s':>12}{'p50 ms':>10}{'p99 ms':>10}"
+                          f"{'sync p50 ms':>14}{'sync p99 ms':>14}")
+        for name, result in rows:
+            self.stdout.write(
+                f"{name:<18}{result['throughput']:>12.0f}{result['p50']:>10.2f}{result['p99']:>10.2f}"
+                f"{result['sync_p50']:>14.2f}{result['sync_p99']:>14.2f}"
+            )
+
+    def run_backend(self, producer, payload, options):
+        backend = producer.producer
+        topic = 'benchmark-supplier-events'
+        key = producer.serialize_key(1042)
+        value = producer.serialize_value(producer.build_message('supplier_updated', payload))
+
+        # Warm up: metadata, topic creation and connections
+        backend.send_and_wait(topic, key, value, timeout=30)
+
+        # Throughput: fire everything, latency is send -> delivery report
+        latencies = []
+        count = options['messages']
+        started_at = time.perf_counter()
+        for _ in range(count):
+            sent_at = time.perf_counter()
+            backend.send(topic, key, value,
+                         lambda error, sent_at=sent_at: latencies.append(time.perf_counter() - sent_at))
+        backend.flush(timeout=120)
+        elapsed = time.perf_counter() - started_at
+        if len(latencies) < count:
+            raise CommandError(f'{backend.name}: only {len(latencies)} of {count} messages were delivered')
+
+        # Blocking publish, as the sync request path does it
+        sync_latencies = []
+        for _ in range(options['sync_messages']):
+            sent_at = time.perf_counter()
+            backend.send_and_wait(topic, key, value, timeout=30)
+            sync_latencies.append(time.perf_counter() - sent_at)
+
+        self.stdout.write(f'{backend.name}: {count} messages in {elapsed:.2f}s')
+        return {
+            'throughput': count / elapsed,
+            'p50': percentile(latencies, 0.50) * 1000,
+            'p99': percentile(latencies, 0.99) * 1000,
+            'sync_p50': percentile(sync_latencies, 0.50) * 1000,
+            'sync_p99': percentile(sync_latencies, 0.99) * 1000,
+        }
@@ -0,0 +1,51 @@
+import os
+import secrets
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = 'Create a new token signing key in JWT_KEYS_DIR (the first step of a key rotation)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--algorithm', choices=['RS256', 'EdDSA'], default='RS256',
+                            help='RS256 (2048-bit RSA) or EdDSA (Ed25519)')
+        parser.add_argument('--kid', default=None,
+                            help='Key id (default: date plus a random suffix)')
+        parser.add_argument('--keys-dir', default=None,
+                            help='Directory to write to (default: JWT_KEYS_DIR)')
+
+    def handle(self, *args, **options):
+        keys_dir = options['keys_dir'] or settings.JWT_KEYS_DIR
+        if not keys_dir:
+            raise CommandError('Set JWT_KEYS_DIR or pass --keys-dir')
+        os.makedirs(keys_dir, exist_ok=True)
+
+        kid = options['kid'] or f"{timezone.now():%Y%m%d}-{secrets.token_hex(3)}"
+        path = os.path.join(keys_dir, f'{kid}.pem')
+        if os.path.exists(path):
+            raise CommandError(f'{path} already exists')
+
+        if options['algorithm'] == 'RS256':
+            private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        else:
+            private_key = ed25519.Ed25519PrivateKey.generate()
+        pem = private_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()
+        )
+
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(pem)
+
+        self.stdout.write(self.style.SUCCESS(f"Created {options['algorithm']} key {kid} at {path}"))
+        self.stdout.write(
+            'Deploy it so it is published in /.well-known/jwks.json, then set '
+            f'JWT_ACTIVE_KID={kid} once consumers have refreshed their JWKS cache.'
+        )
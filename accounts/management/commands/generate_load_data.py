@@ -0,0 +1,228 @@
+import multiprocessing
+import os
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+
+from accounts.hashers import hasher_for_role
+from accounts.management.commands.init_roles import ROLES
+from accounts.models import Driver, Role, Supplier, User, Vendor, WarehouseManager
+
+# Share of each role in the generated users (percent)
+DEFAULT_ROLE_WEIGHTS = '1:0.1,2:30,3:5,4:10,5:2,6:52.9'
+
+FIRST_NAMES = ['Amal', 'Nimal', 'Kamala', 'Sunil', 'Priya', 'Ruwan', 'Dilani', 'Kasun', 'Ishara', 'Tharindu']
+LAST_NAMES = ['Perera', 'Fernando', 'Silva', 'Jayasinghe', 'Bandara', 'Wickramasinghe', 'Dias', 'Gunawardena']
+CITIES = ['Colombo', 'Galle', 'Kandy', 'Jaffna', 'Negombo', 'Batticaloa', 'Matara', 'Kurunegala']
+STREETS = ['Galle Road', 'Main Street', 'Temple Road', 'Lake Drive', 'Station Road', 'Hill Street']
+BUSINESS_TYPES = ['Manufacturing', 'Distribution', 'Retail', 'Wholesale']
+DEPARTMENTS = ['Inbound', 'Outbound', 'Inventory', 'Returns', 'Cold Storage']
+VEHICLE_TYPES = ['Motorbike', 'Van', 'Light Truck', 'Heavy Truck', 'Three-wheeler']
+
+
+def parse_weights(value):
+    weights = {}
+    for pair in value.split(','):
+        role_id, weight = pair.split(':')
+        weights[int(role_id)] = float(weight)
+    return weights
+
+
+def build_profile(role_id, user, rng):
+    """Role profile row for a user (None for admins and regular users)"""
+    if role_id == 3:
+        return Supplier(
+            user=user,
+            company_name=f'{rng.choice(LAST_NAMES)} {rng.choice(BUSINESS_TYPES)} {user.username[-6:]}',
+            street_no=str(rng.randint(1, 999)),
+            street_name=rng.choice(STREETS),
+            city=rng.choice(CITIES),
+            zipcode=f'{rng.randint(10000, 99999)}',
+            # Unique and within the 10 character column whatever the id
+            code=f'L{user.id:09X}',
+            business_type=rng.choice(BUSINESS_TYPES),
+            tax_id=f'TAX-{rng.randrange(10 ** 9):09d}',
+            compliance_score=round(rng.uniform(0, 10), 1),
+            active=rng.random() > 0.1,
+        )
+    if role_id == 4:
+        return Vendor(
+            user=user,
+            shop_name=f'{rng.choice(LAST_NAMES)} Stores {user.username[-6:]}',
+            location=rng.choice(CITIES),
+            business_license=f'BL-{rng.randrange(10 ** 8):08d}',
+        )
+    if role_id == 5:
+        return WarehouseManager(
+            user=user,
+            warehouse_id=f'WH-{rng.randint(1, 200):03d}',
+            department=rng.choice(DEPARTMENTS),
+        )
+    if role_id == 6:
+        return Driver(
+            user=user,
+            license_number=f'DL{rng.randrange(10 ** 8):08d}',
+            vehicle_type=rng.choice(VEHICLE_TYPES),
+            vehicle_id=f'VH-{rng.randrange(10 ** 6):06d}',
+        )
+    return None
+
+
+def reserve_ids(model, count):
+    """Take ``count`` ids from the table's sequence (PostgreSQL)"""
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+            [table, count]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def copy_objects(model, objects):
+    """Insert model instances with COPY FROM STDIN (PostgreSQL)"""
+    fields = model._meta.concrete_fields
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        with cursor.cursor.copy(f'COPY {table} ({columns}) FROM STDIN') as copy:
+            for obj in objects:
+                copy.write_row([
+                    field.get_db_prep_save(field.pre_save(obj, add=True), connection)
+                    for field in fields
+                ])
+
+
+def generate_chunk(job):
+    """
+    Create one chunk of users and their profiles. Everything but the ids is
+    derived from (seed, chunk index), so a seed always yields the same data
+    however the chunks are spread across workers.
+    """
+    index, start, count, options = job
+    rng = random.Random(f"{options['seed']}:{index}")
+    role_ids = rng.choices(list(options['weights']), weights=list(options['weights'].values()), k=count)
+
+    users = []
+    for offset, role_id in enumerate(role_ids):
+        number = start + offset
+        username = f"{options['prefix']}{options['seed']}_{number}"
+        users.append(User(
+            username=username,
+            email=f'{username}@load.test',
+            password=options['hashes'][role_id],
+            first_name=rng.choice(FIRST_NAMES),
+            last_name=rng.choice(LAST_NAMES),
+            role_id=role_id,
+            is_verified=rng.random() > 0.2,
+            phone=f'07{rng.randrange(10 ** 8):08d}',
+        ))
+
+    with transaction.atomic():
+        if options['method'] == 'copy':
+            for user, user_id in zip(users, reserve_ids(User, count)):
+                user.id = user_id
+            copy_objects(User, users)
+        else:
+            User.objects.bulk_create(users)
+
+        profiles = {}
+        for user, role_id in zip(users, role_ids):
+            profile = build_profile(role_id, user, rng)
+            if profile is not None:
+                profiles.setdefault(type(profile), []).append(profile)
+        for model, objects in profiles.items():
+            if options['method'] == 'copy':
+                copy_objects(model, objects)
+            else:
+                model.objects.bulk_create(objects)
+
+    counts = {}
+    for role_id in role_ids:
+        counts[role_id] = counts.get(role_id, 0) + 1
+    return counts
+
+
+class Command(BaseCommand):
+    help = 'Generate a large deterministic set of users with role profiles for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000,
+                            help='Number of users to create')
+        parser.add_argument('--seed', type=int, default=1,
+                            help='Same seed and chunk size, same data; usernames embed the seed')
+        parser.add_argument('--offset', type=int, default=0,
+                            help='Number of the first user, to extend a data set made with the same seed')
+        parser.add_argument('--role-weights', default=DEFAULT_ROLE_WEIGHTS,
+                            help='role_id:percent pairs (default: %(default)s)')
+        parser.add_argument('--password', default='LoadTest123',
+                            help='Password of every generated user')
+        parser.add_argument('--prefix', default='load',
+                            help='Username prefix')
+        parser.add_argument('--chunk-size', type=int, default=10000,
+                            help='Users inserted per transaction')
+        parser.add_argument('--workers', type=int, default=len(os.sched_getaffinity(0)),
+                            help='Parallel worker processes')
+        parser.add_argument('--method', choices=['copy', 'bulk'], default=None,
+                            help='COPY FROM STDIN (PostgreSQL, the default there) or bulk_create')
+
+    def handle(self, *args, **options):
+        try:
+            weights = parse_weights(options['role_weights'])
+        except ValueError:
+            raise CommandError('--role-weights must look like 2:30,6:70')
+        unknown = set(weights) - {role_id for role_id, _, _ in ROLES}
+        if unknown:
+            raise CommandError(f"Unknown role ids in --role-weights: {', '.join(map(str, sorted(unknown)))}")
+
+        method = options['method'] or ('copy' if connection.vendor == 'postgresql' else 'bulk')
+        if method == 'copy' and connection.vendor != 'postgresql':
+            raise CommandError('--method copy needs PostgreSQL')
+
+        for role_id, name, description in ROLES:
+            Role.objects.get_or_create(id=role_id, defaults={'name': name, 'description': description})
+
+        # One hash per role (each role's hash profile), shared by all its users
+        self.stdout.write('Hashing the password once per role...')
+        hashes = {
+            role_id: make_password(options['password'], hasher=hasher_for_role(role_id))
+            for role_id in weights
+        }
+
+        total, chunk_size = options['users'], options['chunk_size']
+        job_options = {
+            'seed': options['seed'],
+            'weights': weights,
+            'hashes': hashes,
+            'prefix': options['prefix'],
+            'method': method,
+        }
+        jobs = [
+            (start // chunk_size, start, min(chunk_size, options['offset'] + total - start), job_options)
+            for start in range(options['offset'], options['offset'] + total, chunk_size)
+        ]
+
+        self.stdout.write(f'Creating {total} users in {len(jobs)} chunks with '
+                          f"{options['workers']} workers ({method})")
+        started_at = time.perf_counter()
+        created = {}
+
+        # Forked workers must not share the parent's database connection
+        connections.close_all()
+        with multiprocessing.get_context('fork').Pool(options['workers']) as pool:
+            for counts in pool.imap_unordered(generate_chunk, jobs):
+                for role_id, count in counts.items():
+                    created[role_id] = created.get(role_id, 0) + count
+                done = sum(created.values())
+                elapsed = time.perf_counter() - started_at
+                self.stdout.write(f'{done}/{total} users ({done / elapsed:.0f} users/s)')
+
+        elapsed = time.perf_counter() - started_at
+        self.stdout.write(self.style.SUCCESS(f'Created {sum(created.values())} users in {elapsed:.1f}s'))
+        names = {role_id: name for role_id, name, _ in ROLES}
+        for role_id in sorted(created):
+            self.stdout.write(f'  {names[role_id]}: {created[role_id]}')
+        self.stdout.write(f"Every user's password is '{options['password']}'")
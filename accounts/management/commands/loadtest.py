@@ -0,0 +1,148 @@
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import httpx
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.management.commands.benchmark_kafka import percentile
+
+
+class Command(BaseCommand):
+    help = 'Measure requests/s for the login and profile endpoints under each gunicorn worker class'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--worker-classes', default='sync,gthread,uvicorn',
+                            help='Comma-separated GUNICORN_WORKER_CLASS values to compare')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Override GUNICORN_WORKERS (default: derived from CPU count)')
+        parser.add_argument('--threads', type=int, default=None,
+                            help='Override GUNICORN_THREADS')
+        parser.add_argument('--concurrency', type=int, default=32,
+                            help='Concurrent client connections')
+        parser.add_argument('--duration', type=float, default=10.0,
+                            help='Seconds per endpoint')
+        parser.add_argument('--username', required=True)
+        parser.add_argument('--password', required=True)
+        parser.add_argument('--port', type=int, default=8765,
+                            help='Port the spawned gunicorn listens on')
+        parser.add_argument('--url', default=None,
+                            help='Load-test an already running server instead of spawning gunicorn')
+
+    def handle(self, *args, **options):
+        rows = []
+        if options['url']:
+            rows += self.run_scenarios('external', options['url'].rstrip('/'), options)
+        else:
+            for worker_class in options['worker_classes'].split(','):
+                worker_class = worker_class.strip()
+                server = self.start_server(worker_class, options)
+                try:
+                    rows += self.run_scenarios(worker_class, f"http://127.0.0.1:{options['port']}", options)
+                finally:
+                    self.stop_server(server)
+
+        self.stdout.write('')
+        self.stdout.write(f"{'server':<10}{'endpoint':<10}{'req/s':>10}{'p50 ms':>10}"
+                          f"{'p99 ms':>10}{'errors':>8}")
+        for server, endpoint, result in rows:
+            self.stdout.write(
+                f"{server:<10}{endpoint:<10}{result['rate']:>10.1f}{result['p50']:>10.1f}"
+                f"{result['p99']:>10.1f}{result['errors']:>8}"
+            )
+
+    def start_server(self, worker_class, options):
+        env = dict(
+            os.environ,
+            GUNICORN_WORKER_CLASS=worker_class,
+            GUNICORN_BIND=f"127.0.0.1:{options['port']}",
+            GUNICORN_ACCESS_LOG='',
+            GUNICORN_LOG_LEVEL='warning',
+        )
+        if options['workers']:
+            env['GUNICORN_WORKERS'] = str(options['workers'])
+        if options['threads']:
+            env['GUNICORN_THREADS'] = str(options['threads'])
+
+        self.stdout.write(f'Starting gunicorn with {worker_class} workers...')
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py'],
+            cwd=settings.BASE_DIR,
+            env=env,
+        )
+
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'gunicorn exited with code {server.returncode}')
+            try:
+                httpx.get(f"http://127.0.0.1:{options['port']}/api/v1/login/", timeout=1)
+                return server
+            except httpx.TransportError:
+                time.sleep(0.2)
+        self.stop_server(server)
+        raise CommandError('gunicorn did not start within 30 seconds')
+
+    def stop_server(self, server):
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            server.wait()
+
+    def run_scenarios(self, server, base_url, options):
+        credentials = {'username': options['username'], 'password': options['password']}
+        response = httpx.post(f'{base_url}/api/v1/login/', json=credentials, timeout=30)
+        if response.status_code != 200:
+            raise CommandError(f'Login failed ({response.status_code}): {response.text[:200]}')
+        headers = {'Authorization': f"Bearer {response.json()['token']}"}
+
+        scenarios = [
+            ('login', lambda client: client.post(f'{base_url}/api/v1/login/', json=credentials)),
+            ('profile', lambda client: client.get(f'{base_url}/api/v1/me/', headers=headers)),
+        ]
+        rows = []
+        for endpoint, send in scenarios:
+            result = asyncio.run(self.hammer(send, options['concurrency'], options['duration']))
+            self.stdout.write(f"{server} {endpoint}: {result['rate']:.1f} req/s")
+            rows.append((server, endpoint, result))
+        return rows
+
+    async def hammer(self, send, concurrency, duration):
+        """Keep ``concurrency`` requests in flight for ``duration`` seconds"""
+        latencies = []
+        errors = 0
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+        async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+            deadline = time.perf_counter() + duration
+
+            async def user():
+                nonlocal errors
+                while time.perf_counter() < deadline:
+                    started_at = time.perf_counter()
+                    try:
+                        response = await send(client)
+                        ok = response.status_code < 400
+                    except httpx.HTTPError:
+                        ok = False
+                    if ok:
+                        latencies.append(time.perf_counter() - started_at)
+                    else:
+                        errors += 1
+
+            started_at = time.perf_counter()
+            await asyncio.gather(*(user() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - started_at
+
+        return {
+            'rate': len(latencies) / elapsed,
+            'p50': (percentile(latencies, 0.50) or 0) * 1000,
+            'p99': (percentile(latencies, 0.99) or 0) * 1000,
+            'errors': errors,
+        }
@@ -0,0 +1,55 @@
+import csv
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.provisioning import provision_users
+
+
+class Command(BaseCommand):
+    help = 'Register users in bulk from a JSON array, NDJSON or CSV file (register_view fields as keys/columns)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='.json, .ndjson or .csv file')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Users validated, hashed and inserted together')
+        parser.add_argument('--all-or-nothing', action='store_true',
+                            help='Skip a whole batch when any of its rows is invalid')
+
+    def handle(self, *args, **options):
+        rows = self.read_rows(options['path'])
+        batch_size = options['batch_size']
+        created = 0
+        errors = 0
+
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            result = provision_users(batch, all_or_nothing=options['all_or_nothing'])
+            created += len(result['users'])
+            errors += len(result['errors'])
+            for error in result['errors']:
+                # Line numbers in the input, counting from 1
+                self.stderr.write(f"row {start + error['index'] + 1} "
+                                  f"({error['username']}): {error['message']}")
+            self.stdout.write(f'{min(start + batch_size, len(rows))}/{len(rows)} processed')
+
+        style = self.style.SUCCESS if not errors else self.style.WARNING
+        self.stdout.write(style(f'Created {created} users, {errors} rows rejected'))
+
+    def read_rows(self, path):
+        try:
+            with open(path, newline='') as f:
+                if path.endswith('.csv'):
+                    # Empty cells mean "not given", as a missing JSON key
+                    return [
+                        {key: value for key, value in row.items() if value != ''}
+                        for row in csv.DictReader(f)
+                    ]
+                if path.endswith('.ndjson'):
+                    return [json.loads(line) for line in f if line.strip()]
+                rows = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Cannot read {path}: {e}')
+        if not isinstance(rows, list):
+            raise CommandError(f'{path} must contain a JSON array of users')
+        return rows
@@ -0,0 +1,155 @@
+from datetime import timedelta
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Min, Q
+from django.utils import timezone
+
+from accounts.models import OutboxEvent
+from utils.kafka_utils import supplier_producer
+
+
+class Command(BaseCommand):
+    help = 'Publish pending outbox events to Kafka'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Events claimed and published per transaction')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep relaying instead of exiting once the outbox is empty')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds to sleep when the outbox is empty (with --loop)')
+        parser.add_argument('--purge-after-days', type=int, default=None,
+                            help='Delete published events older than this many days')
+        parser.add_argument('--max-attempts', type=int, default=10,
+                            help='Give up on an event after this many failed sends')
+        parser.add_argument('--backoff', type=float, default=5.0,
+                            help='Seconds before the first retry, doubled on each further failure')
+        parser.add_argument('--max-backoff', type=float, default=600.0,
+                            help='Longest wait between retries in seconds')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        self.retry_policy = (options['max_attempts'], options['backoff'], options['max_backoff'])
+        total = 0
+
+        while True:
+            published, failed = self.relay_batch(batch_size)
+            total += published
+            if published or failed:
+                self.stdout.write(f'Published {published} events ({failed} failed or deferred)')
+
+            if published == 0 or published + failed < batch_size:
+                # Outbox drained, or only failures left to retry later
+                if options['purge_after_days'] is not None:
+                    self.purge(options['purge_after_days'])
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f'Relayed {total} events'))
+
+    def relay_batch(self, batch_size):
+        """
+        Claim a batch of pending events, publish them and mark them done.
+
+        SKIP LOCKED lets several relays run side by side without publishing
+        the same event twice. Events of a key are published in order: a key
+        whose earlier event is waiting for a retry (or is claimed by another
+        relay) is held back, and after a failed send the later events of its
+        key in the batch stay pending and are sent again after it.
+        """
+        now = timezone.now()
+        pending = OutboxEvent.objects.filter(published_at__isnull=True, failed_at__isnull=True)
+        with transaction.atomic():
+            backing_off = pending.filter(next_attempt_at__gt=now, key__isnull=False)
+            events = list(
+                pending
+                .select_for_update(skip_locked=True)
+                .filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now))
+                .exclude(key__in=backing_off.values('key'))
+                .order_by('id')[:batch_size]
+            )
+            if not events:
+                return 0, 0
+            events = self.drop_out_of_order(pending, events)
+            if not events:
+                return 0, 0
+
+            errors = supplier_producer.send_batch([
+                (
+                    event.topic,
+                    event.key,
+                    supplier_producer.build_message(
+                        event.event_type,
+                        event.payload,
+                        timestamp=int(event.created_at.timestamp() * 1000)
+                    ),
+                )
+                for event in events
+            ])
+
+            published_ids = []
+            failed_keys = set()
+            for event, error in zip(events, errors):
+                if event.key is not None and event.key in failed_keys:
+                    # Sent after an earlier event of its key failed; resent
+                    # once that one is through so the key's last event wins
+                    continue
+                if error is None:
+                    published_ids.append(event.id)
+                else:
+                    failed_keys.add(event.key)
+                    self.record_failure(event, error, now)
+
+            OutboxEvent.objects.filter(id__in=published_ids).update(
+                published_at=timezone.now(),
+                attempts=F('attempts') + 1
+            )
+
+        return len(published_ids), len(events) - len(published_ids)
+
+    def drop_out_of_order(self, pending, events):
+        """
+        Leave out events whose key has an earlier pending event outside the
+        batch (locked by another relay or backing off)
+        """
+        keys = {event.key for event in events if event.key is not None}
+        if not keys:
+            return events
+        claimed_ids = [event.id for event in events]
+        earliest = dict(
+            pending
+            .filter(key__in=keys, id__lt=max(claimed_ids))
+            .exclude(id__in=claimed_ids)
+            .values('key')
+            .annotate(first_id=Min('id'))
+            .values_list('key', 'first_id')
+        )
+        return [
+            event for event in events
+            if event.key not in earliest or event.id < earliest[event.key]
+        ]
+
+    def record_failure(self, event, error, now):
+        """Schedule the retry with exponential backoff, or give up on the event"""
+        max_attempts, backoff, max_backoff = self.retry_policy
+        attempts = event.attempts + 1
+        update = {'attempts': attempts, 'last_error': error}
+        if attempts >= max_attempts:
+            update['failed_at'] = now
+            self.stderr.write(
+                f'Giving up on outbox event {event.id} ({event.event_type}, key {event.key}) '
+                f'after {attempts} attempts: {error}'
+            )
+        else:
+            delay = min(backoff * 2 ** (attempts - 1), max_backoff)
+            update['next_attempt_at'] = now + timedelta(seconds=delay)
+        OutboxEvent.objects.filter(id=event.id).update(**update)
+
+    def purge(self, days):
+        cutoff = timezone.now() - timedelta(days=days)
+        deleted, _ = OutboxEvent.objects.filter(published_at__lt=cutoff).delete()
+        if deleted:
+            self.stdout.write(f'Purged {deleted} published events')
@@ -0,0 +1,46 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from utils import db
+
+
+class DBConnectionTimingMiddleware:
+    """
+    Report the time each request spent acquiring database connections.
+
+    Adds a ``Server-Timing: db-conn;dur=<ms>`` header and feeds the per-worker
+    connection metrics shown on the admin metrics endpoint. Works for both
+    sync and async views.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        timer, token = db.start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            db.end_request(timer, token)
+        return self.add_header(response, timer)
+
+    async def __acall__(self, request):
+        timer, token = db.start_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            db.end_request(timer, token)
+        return self.add_header(response, timer)
+
+    def add_header(self, response, timer):
+        timing = f'db-conn;dur={timer.seconds * 1000:.3f}'
+        if response.has_header('Server-Timing'):
+            timing = f"{response['Server-Timing']}, {timing}"
+        response['Server-Timing'] = timing
+        return response
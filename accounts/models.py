@@ -1,9 +1,13 @@
 from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager as DjangoUserManager
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
 from django.core.validators import MinLengthValidator
 from datetime import timedelta
 
+from .hash_pool import amake_password, averify_password, make_password, verify_password
+from .hashers import hasher_for_role
+
 class Role(models.Model):
     """
     Role model for user roles
@@ -22,6 +26,24 @@ class Role(models.Model):
     def __str__(self):
         return self.name
 
+class UserManager(DjangoUserManager):
+    """
+    Hashes the passwords of new users with their role's profile, in the
+    hashing pool when enabled (Django's manager calls make_password directly)
+    """
+    
+    def _create_user(self, username, email, password, **extra_fields):
+        user = self._create_user_object(username, email, None, **extra_fields)
+        user.set_password(password)
+        user.save(using=self._db)
+        return user
+    
+    async def _acreate_user(self, username, email, password, **extra_fields):
+        user = self._create_user_object(username, email, None, **extra_fields)
+        user.password = await amake_password(password, hasher_for_role(user.role_id))
+        await user.asave(using=self._db)
+        return user
+
 class User(AbstractUser):
     """
     Extended User model
@@ -30,6 +52,11 @@ class User(AbstractUser):
     role = models.ForeignKey(Role, on_delete=models.SET_NULL, null=True, related_name='users')
     is_verified = models.BooleanField(default=False)
     phone = models.CharField(max_length=20, blank=True, null=True)
+    # Change tracking for the incremental sync API (not bumped by last_login
+    # or password rehash updates, which save with update_fields)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    
+    objects = UserManager()
     
     # Define REQUIRED_FIELDS for createsuperuser command
     REQUIRED_FIELDS = ['email']
@@ -53,6 +80,34 @@ class User(AbstractUser):
         except Role.DoesNotExist:
             # Default to regular user if role doesn't exist
             self.role = Role.objects.get_or_create(id=2, name='Regular User')[0]
+    
+    def set_password(self, raw_password):
+        # Hash with the cost profile of the user's role (in the hashing pool
+        # when PASSWORD_HASH_POOL_WORKERS is set)
+        self.password = make_password(raw_password, hasher_for_role(self.role_id))
+        self._password = raw_password
+    
+    def check_password(self, raw_password):
+        """
+        Check the password, rehashing it when it was hashed with a different
+        algorithm or cost than the role's profile now uses
+        """
+        is_correct, must_update = verify_password(raw_password, self.password, hasher_for_role(self.role_id))
+        if is_correct and must_update:
+            self.set_password(raw_password)
+            # A rehash is not a password change
+            self._password = None
+            self.save(update_fields=['password'])
+        return is_correct
+    
+    async def acheck_password(self, raw_password):
+        """See check_password(); awaits the hashing pool instead of blocking"""
+        hasher = hasher_for_role(self.role_id)
+        is_correct, must_update = await averify_password(raw_password, self.password, hasher)
+        if is_correct and must_update:
+            self.password = await amake_password(raw_password, hasher)
+            await self.asave(update_fields=['password'])
+        return is_correct
 
 class PasswordResetToken(models.Model):
     """
@@ -90,7 +145,7 @@ class Supplier(models.Model):
     compliance_score = models.FloatField(default=5.0)  # Added compliance score
     active = models.BooleanField(default=True)  # Added active status
     created_at = models.DateTimeField(default=timezone.now)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     def __str__(self):
         return f"Supplier: {self.user.username} ({self.company_name})"
@@ -100,6 +155,7 @@ class Vendor(models.Model):
     shop_name = models.CharField(max_length=255)
     location = models.CharField(max_length=255)
     business_license = models.CharField(max_length=50)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     def __str__(self):
         return f"Vendor: {self.user.username} ({self.shop_name})"
@@ -108,6 +164,7 @@ class WarehouseManager(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True)
     warehouse_id = models.CharField(max_length=50)
     department = models.CharField(max_length=100)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     def __str__(self):
         return f"Warehouse Manager: {self.user.username} ({self.warehouse_id})"
@@ -117,6 +174,83 @@ class Driver(models.Model):
     license_number = models.CharField(max_length=50)
     vehicle_type = models.CharField(max_length=100)
     vehicle_id = models.CharField(max_length=50, default="UNASSIGNED")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    
+    def __str__(self):
+        return f"Driver: {self.user.username} ({self.license_number})"
+
+class OutboxEvent(models.Model):
+    """
+    Event written in the same transaction as the change it describes and
+    published to Kafka afterwards by the relay_outbox command
+    """
+    topic = models.CharField(max_length=255)
+    event_type = models.CharField(max_length=100)
+    key = models.CharField(max_length=255, blank=True, null=True)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    published_at = models.DateTimeField(blank=True, null=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, null=True)
+    # Retry backoff; the event (and later events with its key) wait until then
+    next_attempt_at = models.DateTimeField(blank=True, null=True)
+    # Set when the relay gave up after its maximum attempts (later events of
+    # the key are then no longer held back); clear it to retry the event
+    failed_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        db_table = 'accounts_outbox_event'
+        verbose_name = 'Outbox Event'
+        verbose_name_plural = 'Outbox Events'
+        indexes = [
+            # Keeps the relay's "oldest unpublished" scan small
+            models.Index(
+                fields=['id'],
+                name='outbox_unpublished_idx',
+                condition=models.Q(published_at__isnull=True)
+            ),
+        ]
+    
+    def __str__(self):
+        status = 'published' if self.published_at else 'failed' if self.failed_at else 'pending'
+        return f"{self.event_type} ({self.key}) - {status}"
+
+class RevokedToken(models.Model):
+    """
+    Deny-list entry for a token revoked before its expiry (logout, refresh
+    rotation). Workers keep the unexpired jtis in memory, see
+    accounts.revocation.DenyList.
+    """
+    jti = models.CharField(max_length=64, unique=True)
+    token_type = models.CharField(max_length=10)
+    user_id = models.BigIntegerField(blank=True, null=True)
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(default=timezone.now, db_index=True)
+    
+    class Meta:
+        db_table = 'accounts_revoked_token'
+        verbose_name = 'Revoked Token'
+        verbose_name_plural = 'Revoked Tokens'
+    
+    def __str__(self):
+        return f"{self.token_type} {self.jti} (user {self.user_id})"
+
+class DeletedRecord(models.Model):
+    """
+    Tombstone of a deleted user or role profile, so the incremental sync API
+    can report deletions. Pruned after SYNC_TOMBSTONE_RETENTION_DAYS.
+    """
+    resource = models.CharField(max_length=32)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        db_table = 'accounts_deleted_record'
+        verbose_name = 'Deleted Record'
+        verbose_name_plural = 'Deleted Records'
+        indexes = [
+            models.Index(fields=['resource', 'deleted_at', 'id'], name='deleted_record_sync_idx'),
+        ]
     
     def __str__(self):
-        return f"Driver: {self.user.username} ({self.license_number})"
\ No newline at end of file
+        return f"{self.resource} {self.object_id} deleted at {self.deleted_at}"
@@ -0,0 +1,160 @@
+"""
+Keyset (cursor) pagination helpers.
+
+Pages are selected with ``WHERE id > <last id> ORDER BY id LIMIT n`` so the
+deepest page costs the same as the first one. Cursors are opaque tokens;
+clients just pass back the ``next_cursor`` they received.
+"""
+
+import base64
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connections
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+COUNT_MODES = ('exact', 'estimate', 'none')
+COUNT_CACHE_KEY = 'count:{digest}'
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor token cannot be decoded"""
+
+
+def encode_cursor(position):
+    """Encode a keyset position (a dict of ordering values) as an opaque token"""
+    raw = json.dumps(position, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Decode a token produced by encode_cursor"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        raise InvalidCursor(token)
+    if not isinstance(position, dict):
+        raise InvalidCursor(token)
+    return position
+
+
+def keyset_paginate(queryset, cursor, limit, key='id'):
+    """
+    Return one page of ``queryset`` ordered by the unique column ``key``
+    and the cursor of the next page (None on the last page)
+    """
+    if limit < 1:
+        raise ValueError('limit must be at least 1')
+    queryset = queryset.order_by(key)
+    if cursor:
+        position = decode_cursor(cursor)
+        if key not in position:
+            raise InvalidCursor(cursor)
+        try:
+            queryset = queryset.filter(**{f'{key}__gt': position[key]})
+        except (TypeError, ValueError, ValidationError):
+            # A value of the wrong type for the key column
+            raise InvalidCursor(cursor)
+
+    # Fetch one extra row to find out whether another page exists
+    rows = list(queryset[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor({key: getattr(rows[-1], key)})
+
+
+def estimated_table_count(model, using='default'):
+    """Planner row estimate of a table from pg_class (None if unavailable)"""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+            [model._meta.db_table]
+        )
+        row = cursor.fetchone()
+    # reltuples is -1 for tables that were never analyzed
+    if row is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+def count_queryset(queryset, mode='estimate'):
+    """
+    Count a queryset according to ``mode``:
+
+    * ``exact`` - a plain COUNT(*)
+    * ``estimate`` - the pg_class estimate for unfiltered querysets, otherwise
+      an exact count cached for PAGINATION_COUNT_CACHE_TTL seconds
+    * ``none`` - skip counting and return None
+
+    Returns a ``(count, is_estimate)`` tuple.
+    """
+    if mode == 'none':
+        return None, False
+    if mode == 'exact':
+        return queryset.count(), False
+
+    if not queryset.query.where:
+        estimate = estimated_table_count(queryset.model, queryset.db)
+        if estimate is not None:
+            return estimate, True
+
+    sql, params = queryset.order_by().query.sql_with_params()
+    digest = hashlib.sha1(f'{sql}{params}'.encode('utf-8')).hexdigest()
+    key = COUNT_CACHE_KEY.format(digest=digest)
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, timeout=settings.PAGINATION_COUNT_CACHE_TTL)
+        return count, False
+    return count, True
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Opt-in cursor pagination for viewsets.
+
+    Lists stay unpaginated unless the client sends ``page_size`` or
+    ``cursor``; the total is added according to the ``count`` parameter
+    (exact, estimate or none).
+    """
+    ordering = 'pk'
+    page_size = None
+    default_page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def get_page_size(self, request):
+        page_size = super().get_page_size(request)
+        if page_size is None and self.cursor_query_param in request.query_params:
+            return self.default_page_size
+        return page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count_mode = request.query_params.get('count', 'none')
+        if self.count_mode not in COUNT_MODES:
+            self.count_mode = 'none'
+        self.total, self.total_is_estimate = None, False
+        page = super().paginate_queryset(queryset, request, view)
+        if page is not None:
+            self.total, self.total_is_estimate = count_queryset(queryset, self.count_mode)
+        return page
+
+    def get_paginated_response(self, data):
+        response = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.count_mode != 'none':
+            response['count'] = self.total
+            response['count_is_estimate'] = self.total_is_estimate
+        return Response(response)
@@ -0,0 +1,248 @@
+"""
+Bulk user registration.
+
+``provision_users`` registers a batch of users the way ``register_view``
+does one, but in a fixed number of queries per batch:
+
+* every row is validated in memory (same rules and messages as
+  register_view, plus duplicates within the batch)
+* username, email and supplier code uniqueness is checked with one
+  ``IN`` query each
+* passwords are hashed in parallel, each with its role's hash profile
+* users and role profiles are inserted with ``bulk_create`` in one
+  transaction; rows registered concurrently in between are reported as
+  taken and the rest inserted again
+
+Invalid rows are reported by index and skipped, or fail the whole batch
+with ``all_or_nothing``.
+"""
+
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .hash_pool import encode_password, hash_pool
+from .hashers import hasher_for_role
+from .models import Driver, Role, Supplier, User, Vendor, WarehouseManager
+
+# Email validation regex
+EMAIL_REGEX = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+# Password validation - at least 8 chars, 1 uppercase, 1 lowercase, 1 number
+PASSWORD_REGEX = re.compile(r'^(?=.*[a-z])(?=.*[A-Z])(?=.*\d).{8,}$')
+
+USER_FIELDS = ['username', 'email', 'first_name', 'last_name', 'phone']
+
+# Role profile model, name, required fields and optional fields, by role id
+ROLE_PROFILES = {
+    3: (Supplier, 'Supplier', ['company_name', 'business_type', 'tax_id', 'street_no',
+                               'street_name', 'city', 'zipcode'], ['code']),
+    4: (Vendor, 'Vendor', ['shop_name', 'location', 'business_license'], []),
+    5: (WarehouseManager, 'Warehouse Manager', ['warehouse_id', 'department'], []),
+    6: (Driver, 'Driver', ['license_number', 'vehicle_type'], ['vehicle_id']),
+}
+
+
+# Fields that must be unique within a batch, with their names in messages
+UNIQUE_FIELDS = {'username': 'Username', 'email': 'Email', 'code': 'Supplier code'}
+
+
+def field_error(model, field, value):
+    """Message when a value does not fit its column, else None"""
+    if not isinstance(value, str):
+        return f'{field} must be a string'
+    max_length = model._meta.get_field(field).max_length
+    if max_length is not None and len(value) > max_length:
+        return f'{field} must be at most {max_length} characters'
+    return None
+
+
+def validate_row(row):
+    """Error message for one row, or None (the checks of register_view)"""
+    if not row.get('username') or not row.get('email') or not row.get('password'):
+        return 'Please provide username, email and password'
+    if not isinstance(row['password'], str):
+        return 'password must be a string'
+    for field in USER_FIELDS:
+        if row.get(field) is not None:
+            message = field_error(User, field, row[field])
+            if message:
+                return message
+    if not EMAIL_REGEX.match(row['email']):
+        return 'Invalid email format'
+    if not PASSWORD_REGEX.match(row['password']):
+        return 'Password must be at least 8 characters and include uppercase, lowercase, and numbers'
+
+    role_id = row['role_id']
+    if role_id in ROLE_PROFILES:
+        model, role_name, required, optional = ROLE_PROFILES[role_id]
+        if any(not row.get(field) for field in required):
+            return f'Missing required fields for {role_name} profile'
+        for field in required + optional:
+            if row.get(field) is not None:
+                message = field_error(model, field, row[field])
+                if message:
+                    return message
+    return None
+
+
+def find_existing(model, field, values):
+    """The subset of ``values`` already taken in ``field`` (one IN query)"""
+    if not values:
+        return set()
+    return set(model.objects.filter(**{f'{field}__in': values}).values_list(field, flat=True))
+
+
+def hash_passwords(rows):
+    """
+    Hash every row's password with its role's profile, in parallel: through
+    the hashing pool when enabled, else in threads (hashlib, argon2-cffi and
+    scrypt release the GIL while hashing)
+    """
+    args = [(row['password'], hasher_for_role(row['role_id'])) for row in rows]
+    if hash_pool.enabled:
+        return hash_pool.map(encode_password, args)
+    threads = settings.PROVISIONING_HASH_THREADS or len(os.sched_getaffinity(0))
+    with ThreadPoolExecutor(threads) as executor:
+        return list(executor.map(encode_password, *zip(*args)))
+
+
+def unique_values(row):
+    """The row's values of UNIQUE_FIELDS (the code only for suppliers)"""
+    values = {'username': row['username'], 'email': row['email']}
+    if row['role_id'] == 3 and row.get('code'):
+        values['code'] = row['code']
+    return values
+
+
+def provision_users(rows, all_or_nothing=False):
+    """
+    Register a batch of users. Returns ``{'users': [...], 'errors': [...]}``:
+    the created users and the rejected rows, each with its index in ``rows``.
+    """
+    errors = {}
+    valid = []
+    seen = {field: set() for field in UNIQUE_FIELDS}
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            errors[index] = 'Each user must be an object'
+            continue
+        try:
+            row = dict(row, role_id=int(row.get('role_id') or 2))
+        except (TypeError, ValueError):
+            errors[index] = 'Invalid role_id'
+            continue
+
+        message = validate_row(row)
+        if message is None:
+            values = unique_values(row)
+            repeated = [field for field, value in values.items() if value in seen[field]]
+            if repeated:
+                message = f'{UNIQUE_FIELDS[repeated[0]]} is repeated in the batch'
+            else:
+                for field, value in values.items():
+                    seen[field].add(value)
+        if message is None:
+            valid.append((index, row))
+        else:
+            errors[index] = message
+
+    # Role ids, and uniqueness against the database: one query each
+    roles = Role.objects.in_bulk({row['role_id'] for _, row in valid})
+    accepted = []
+    for index, row in valid:
+        if row['role_id'] not in roles:
+            errors[index] = f"Unknown role_id {row['role_id']}"
+        else:
+            accepted.append((index, row))
+    accepted = reject_taken(accepted, errors)
+
+    users = []
+    if accepted and not (errors and all_or_nothing):
+        passwords = hash_passwords([row for _, row in accepted])
+        passwords = {index: password for (index, _), password in zip(accepted, passwords)}
+        while True:
+            try:
+                users = insert_users(accepted, passwords)
+                break
+            except IntegrityError:
+                # Registered concurrently between the check and the insert:
+                # report the rows that now conflict and insert the rest
+                remaining = reject_taken(accepted, errors)
+                if len(remaining) == len(accepted):
+                    raise
+                accepted = remaining
+                if not accepted or all_or_nothing:
+                    break
+
+    return {
+        'users': [
+            {'index': index, 'username': user.username, 'user_id': user.id}
+            for (index, _), user in zip(accepted, users)
+        ],
+        'errors': [
+            {
+                'index': index,
+                'username': rows[index].get('username') if isinstance(rows[index], dict) else None,
+                'message': message,
+            }
+            for index, message in sorted(errors.items())
+        ],
+    }
+
+
+def reject_taken(accepted, errors):
+    """
+    Move the rows whose username, email or supplier code is already taken in
+    the database to ``errors``; returns the other rows
+    """
+    values = {field: set() for field in UNIQUE_FIELDS}
+    for _, row in accepted:
+        for field, value in unique_values(row).items():
+            values[field].add(value)
+    taken = {
+        'username': find_existing(User, 'username', values['username']),
+        'email': find_existing(User, 'email', values['email']),
+        'code': find_existing(Supplier, 'code', values['code']),
+    }
+    remaining = []
+    for index, row in accepted:
+        conflicts = [field for field, value in unique_values(row).items() if value in taken[field]]
+        if conflicts:
+            errors[index] = f'{UNIQUE_FIELDS[conflicts[0]]} already exists'
+        else:
+            remaining.append((index, row))
+    return remaining
+
+
+def insert_users(accepted, passwords):
+    """Insert the users and their role profiles in one transaction"""
+    users = [
+        User(
+            password=passwords[index],
+            role_id=row['role_id'],
+            **{field: row.get(field) or '' for field in USER_FIELDS}
+        )
+        for index, row in accepted
+    ]
+
+    with transaction.atomic():
+        # PostgreSQL returns the new ids from the same INSERT
+        User.objects.bulk_create(users, batch_size=settings.PROVISIONING_INSERT_BATCH_SIZE)
+
+        profiles = {}
+        for (_, row), user in zip(accepted, users):
+            if row['role_id'] not in ROLE_PROFILES:
+                continue
+            model, _, required, optional = ROLE_PROFILES[row['role_id']]
+            fields = {field: row[field] for field in required}
+            fields.update({field: row[field] for field in optional if row.get(field) is not None})
+            if model is Supplier:
+                fields.setdefault('code', f'SUP-{user.id:03d}')
+            profiles.setdefault(model, []).append(model(user=user, **fields))
+        for model, objects in profiles.items():
+            model.objects.bulk_create(objects, batch_size=settings.PROVISIONING_INSERT_BATCH_SIZE)
+    return users
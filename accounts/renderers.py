@@ -0,0 +1,26 @@
+from rest_framework.renderers import JSONRenderer
+
+from utils import json_utils
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes through orjson when it is available.
+
+    Falls back to DRF's own encoder when orjson is missing or the client asks
+    for indented output.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        renderer_context = renderer_context or {}
+        if json_utils.orjson is None or self.get_indent(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = json_utils.dumps(data)
+        # Like JSONRenderer, escape U+2028/U+2029 so the output is valid JavaScript
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
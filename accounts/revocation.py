@@ -0,0 +1,146 @@
+"""
+Token revocation markers for stateless JWT authentication.
+
+When a user is deactivated, deleted or has their role changed, every token
+issued before that moment must stop working. Instead of loading the user row
+on each request, we store a per-user "revoked before" timestamp in the cache
+and compare it against the token's ``iat`` claim.
+
+Single tokens (logout, rotated refresh tokens) are revoked by ``jti``: the
+``RevokedToken`` table is the source of truth and every worker keeps the
+unexpired jtis in an in-memory set, synced incrementally every
+``JWT_DENY_LIST_SYNC_SECONDS``, so checking a token is a set lookup.
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import RevokedToken
+
+REVOKED_BEFORE_KEY = 'auth:revoked-before:{user_id}'
+
+
+def _key(user_id):
+    return REVOKED_BEFORE_KEY.format(user_id=user_id)
+
+
+def revoke_user_tokens(user_id):
+    """Invalidate all tokens issued to the user up to now"""
+    # Sub-second precision (like the tokens' iat), so a token issued right
+    # after the revocation in the same second stays valid
+    cache.set(
+        _key(user_id),
+        time.time(),
+        timeout=settings.JWT_REVOCATION_TTL
+    )
+
+
+def is_token_revoked(payload):
+    """Check the token's issue time against the user's revocation marker"""
+    revoked_before = cache.get(_key(payload.get('user_id')))
+    if revoked_before is None:
+        return False
+    return payload.get('iat', 0) < revoked_before
+
+
+def revocation_markers(user_ids):
+    """Map of user id to "revoked before" timestamp, for users that have one"""
+    keys = {_key(user_id): user_id for user_id in user_ids}
+    return {keys[key]: value for key, value in cache.get_many(list(keys)).items()}
+
+
+async def ais_token_revoked(payload):
+    """Async variant of ``is_token_revoked``"""
+    revoked_before = await cache.aget(_key(payload.get('user_id')))
+    if revoked_before is None:
+        return False
+    return payload.get('iat', 0) < revoked_before
+
+
+class DenyList:
+    """
+    Per-worker set of revoked, unexpired jtis mirrored from ``RevokedToken``.
+
+    Rows are only ever inserted, so after the first full load a sync fetches
+    the rows revoked since the previous sync (minus a margin for transactions
+    that committed late); expired jtis are dropped from memory as they lapse.
+    """
+
+    # Seconds of overlap between syncs, covering rows committed late
+    SYNC_MARGIN = 60
+
+    def __init__(self, sync_interval):
+        self.sync_interval = sync_interval
+        self._expiry = {}  # jti -> expiry (epoch seconds)
+        self._since = None
+        self._synced_at = None
+        self._lock = threading.Lock()
+
+    def is_stale(self):
+        return self._synced_at is None or time.monotonic() - self._synced_at >= self.sync_interval
+
+    def contains(self, jti):
+        if jti is None:
+            return False
+        if self.is_stale():
+            self.sync()
+        return jti in self._expiry
+
+    async def acontains(self, jti):
+        """Async variant of ``contains`` (the periodic sync runs in a thread)"""
+        if jti is None:
+            return False
+        if self.is_stale():
+            await sync_to_async(self.sync)()
+        return jti in self._expiry
+
+    def sync(self):
+        with self._lock:
+            if not self.is_stale():
+                return  # Another thread synced while we waited for the lock
+            now = timezone.now()
+            rows = RevokedToken.objects.filter(expires_at__gt=now)
+            if self._since is not None:
+                rows = rows.filter(revoked_at__gte=self._since)
+            for jti, expires_at in rows.values_list('jti', 'expires_at'):
+                self._expiry[jti] = expires_at.timestamp()
+            self._since = now - timedelta(seconds=self.SYNC_MARGIN)
+            now_ts = now.timestamp()
+            for jti in [jti for jti, expires in self._expiry.items() if expires <= now_ts]:
+                del self._expiry[jti]
+            self._synced_at = time.monotonic()
+
+    def add(self, jti, expires):
+        """Record a revocation made by this worker without waiting for the sync"""
+        with self._lock:
+            self._expiry[jti] = expires
+
+    def __len__(self):
+        return len(self._expiry)
+
+
+deny_list = DenyList(settings.JWT_DENY_LIST_SYNC_SECONDS)
+
+
+def revoke_token(payload):
+    """
+    Deny-list a single decoded token (access or refresh) until it expires.
+
+    Returns False if the token was already revoked.
+    """
+    jti = payload.get('jti')
+    if jti is None:
+        return True  # Legacy tokens without a jti can only be revoked per user
+    _, created = RevokedToken.objects.get_or_create(jti=jti, defaults={
+        'token_type': payload.get('type', 'access'),
+        'user_id': payload.get('user_id'),
+        'expires_at': datetime.fromtimestamp(payload['exp'], tz=dt_timezone.utc),
+    })
+    deny_list.add(jti, payload['exp'])
+    return created
@@ -1,5 +1,5 @@
 """
-Serializers for the Supplier model and related endpoints
+Serializers for the Supplier model, admin user listing and related endpoints
 """
 
 from rest_framework import serializers
@@ -15,6 +15,50 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
+class AdminUserSerializer(serializers.ModelSerializer):
+    """
+    Serializer for the admin user list.
+    
+    Expects a queryset with ``role`` and every role profile select_related,
+    so a whole page is serialized without extra queries.
+    """
+    # Role profile relation and exposed fields, keyed by role id
+    ROLE_PROFILES = {
+        3: ('supplier', [
+            'company_name', 'street_no', 'street_name', 'city', 'zipcode',
+            'code', 'business_type', 'tax_id', 'compliance_score', 'active'
+        ]),
+        4: ('vendor', ['shop_name', 'location', 'business_license']),
+        5: ('warehousemanager', ['warehouse_id', 'department']),
+        6: ('driver', ['license_number', 'vehicle_type', 'vehicle_id']),
+    }
+    
+    user_id = serializers.IntegerField(source='id', read_only=True)
+    role_id = serializers.IntegerField(read_only=True)
+    role = serializers.SerializerMethodField()
+    role_data = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = User
+        fields = [
+            'user_id', 'username', 'email', 'first_name', 'last_name',
+            'role_id', 'role', 'is_verified', 'role_data'
+        ]
+    
+    def get_role(self, obj):
+        return getattr(obj.role, 'name', 'Regular User')
+    
+    def get_role_data(self, obj):
+        """Role-specific profile data; admins and regular users have none"""
+        relation, fields = self.ROLE_PROFILES.get(obj.role_id, (None, []))
+        if relation is None:
+            return {}
+        profile = getattr(obj, relation, None)  # None if the profile row is missing
+        if profile is None:
+            return {}
+        return {field: getattr(profile, field) for field in fields}
+
+
 class SupplierSerializer(serializers.ModelSerializer):
     """Serializer for the Supplier model"""
     user = UserSerializer(read_only=True)
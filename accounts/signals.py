@@ -0,0 +1,95 @@
+"""
+Model signal handlers for the accounts app
+"""
+
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cache import user_cache, bump_user_version, bump_generation
+from .models import User, Role, Supplier, Vendor, Driver, WarehouseManager, DeletedRecord
+from .revocation import revoke_user_tokens
+from .sync import PROFILE_RESOURCES, PROFILE_USER_FIELDS, SYNC_RESOURCES, resource_for_instance
+
+
+@receiver(pre_save, sender=User)
+def revoke_tokens_on_claim_change(sender, instance, update_fields=None, **kwargs):
+    """
+    Revoke outstanding tokens when a user is deactivated or changes role,
+    since stateless authentication trusts the claims baked into the token
+    """
+    if instance.pk is None:
+        return
+    if update_fields is not None and not {'is_active', 'role', 'role_id'} & set(update_fields):
+        return
+
+    previous = User.objects.filter(pk=instance.pk).values('is_active', 'role_id', 'last_login').first()
+    if previous is None:
+        return
+    if previous['role_id'] is None and previous['last_login'] is None:
+        # Fresh from create_user, getting its first role: no token was ever
+        # issued to it, so there is nothing to revoke
+        return
+
+    deactivated = previous['is_active'] and not instance.is_active
+    role_changed = previous['role_id'] != instance.role_id
+    if deactivated or role_changed:
+        revoke_user_tokens(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def revoke_tokens_on_delete(sender, instance, **kwargs):
+    """Revoke outstanding tokens of a deleted user"""
+    revoke_user_tokens(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Drop the cached copies of a changed or deleted user"""
+    user_cache.delete(instance.pk)
+    # Bump after commit so no worker can re-cache the pre-commit row under
+    # the new version
+    transaction.on_commit(lambda: bump_user_version(instance.pk))
+
+
+@receiver([post_save, post_delete], sender=Supplier)
+@receiver([post_save, post_delete], sender=Vendor)
+@receiver([post_save, post_delete], sender=Driver)
+@receiver([post_save, post_delete], sender=WarehouseManager)
+def invalidate_cached_profile_owner(sender, instance, **kwargs):
+    """Cached users and profile payloads carry the role profile"""
+    user_cache.delete(instance.user_id)
+    transaction.on_commit(lambda: bump_user_version(instance.user_id))
+
+
+@receiver([post_save, post_delete], sender=Role)
+def invalidate_cached_users_for_role(sender, instance, **kwargs):
+    """A role is shared by many cached users, so drop them all"""
+    user_cache.clear()
+    transaction.on_commit(bump_generation)
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Supplier)
+@receiver(post_delete, sender=Vendor)
+@receiver(post_delete, sender=Driver)
+@receiver(post_delete, sender=WarehouseManager)
+def record_deletion(sender, instance, **kwargs):
+    """Leave a tombstone for the incremental sync API"""
+    resource = resource_for_instance(instance)
+    DeletedRecord.objects.create(resource=resource.name, object_id=instance.pk)
+
+
+@receiver(post_save, sender=User)
+def touch_profile_on_user_change(sender, instance, created=False, update_fields=None, **kwargs):
+    """
+    Role profile payloads carry copies of some user columns (username,
+    email...), so mark the profile changed when those may have changed
+    """
+    if created or instance.role_id not in PROFILE_RESOURCES:
+        return
+    if update_fields is not None and not PROFILE_USER_FIELDS & set(update_fields):
+        return
+    model = SYNC_RESOURCES[PROFILE_RESOURCES[instance.role_id]].model
+    model.objects.filter(user_id=instance.pk).update(updated_at=timezone.now())
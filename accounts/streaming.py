@@ -0,0 +1,124 @@
+"""
+Streaming exports of large tables.
+
+The list is read with ``values_list().iterator(chunk_size=...)`` (a
+server-side cursor on PostgreSQL) and encoded row by row into a
+``StreamingHttpResponse``, so memory stays flat whatever the table size and
+the first bytes leave before the query has finished. Two formats:
+
+* ``ndjson``: one JSON object per line (``application/x-ndjson``)
+* ``json``: the same document as the buffered endpoint, written
+  incrementally: a bare array, or ``{"success": true, "<key>": [...]}``
+  with ``count`` after the array
+
+Under ASGI (uvicorn workers) Django reads a synchronous body to the end
+before sending anything, so there the body is handed over as an async
+iterator that runs each step of the export in the request's thread.
+"""
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+from utils import json_utils
+
+STREAM_FORMATS = ('ndjson', 'json')
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
+}
+
+
+def iter_rows(queryset, fields, chunk_size=None):
+    """
+    Yield one dict per row. ``fields`` maps output keys to lookups, e.g.
+    ``{'username': 'user__username'}``; only those columns are selected.
+    """
+    names = list(fields)
+    rows = queryset.values_list(*fields.values()).iterator(
+        chunk_size=chunk_size or settings.EXPORT_CHUNK_SIZE
+    )
+    for row in rows:
+        yield dict(zip(names, row))
+
+
+def encode_ndjson(rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(json_utils.dumps(row))
+        if len(batch) >= batch_size:
+            yield b'\n'.join(batch) + b'\n'
+            batch = []
+    if batch:
+        yield b'\n'.join(batch) + b'\n'
+
+
+def encode_json(rows, key, batch_size):
+    # Sent before the query runs, so the client sees the first byte at once
+    if key is None:
+        yield b'['
+    else:
+        yield b'{"success":true,"' + key.encode() + b'":['
+    count = 0
+    batch = []
+    for row in rows:
+        batch.append(json_utils.dumps(row))
+        count += 1
+        if len(batch) >= batch_size:
+            yield (b',' if count > len(batch) else b'') + b','.join(batch)
+            batch = []
+    if batch:
+        yield (b',' if count > len(batch) else b'') + b','.join(batch)
+    if key is None:
+        yield b']'
+    else:
+        yield b'],"count":' + str(count).encode() + b'}'
+
+
+async def aiter_chunks(chunks):
+    """
+    Async iterator over a synchronous one. Each step runs in the request's
+    thread-sensitive executor, where the view ran, so the export keeps using
+    the same database connection and server-side cursor.
+    """
+    chunks = iter(chunks)
+    step = sync_to_async(next, thread_sensitive=True)
+    done = object()
+    while True:
+        chunk = await step(chunks, done)
+        if chunk is done:
+            return
+        yield chunk
+
+
+def is_asgi(request):
+    """Whether the (DRF or Django) request is served by the ASGI handler"""
+    return isinstance(getattr(request, '_request', request), ASGIRequest)
+
+
+def streaming_export(rows, stream_format, key=None, request=None):
+    """
+    StreamingHttpResponse for an iterable of row dicts. ``key`` names the
+    array in the ``json`` format (e.g. ``'drivers'``); without it the
+    ``json`` format is a bare array. Pass the ``request`` so the body is
+    streamed under ASGI too.
+    """
+    batch_size = settings.EXPORT_BATCH_ROWS
+    if stream_format == 'ndjson':
+        content = encode_ndjson(rows, batch_size)
+    else:
+        content = encode_json(rows, key, batch_size)
+    if request is not None and is_asgi(request):
+        content = aiter_chunks(content)
+    response = StreamingHttpResponse(content, content_type=CONTENT_TYPES[stream_format])
+    # Keep proxies (nginx) from buffering the whole body
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def invalid_stream_format(stream_format):
+    return {
+        'success': False,
+        'message': f"Invalid stream format '{stream_format}'. Use one of: {', '.join(STREAM_FORMATS)}"
+    }
@@ -0,0 +1,184 @@
+"""
+Incremental ("changed since") sync of users and role profiles.
+
+Each resource is read in keyset order of ``(updated_at, pk)`` and its
+tombstones (``DeletedRecord``) in order of ``(deleted_at, id)``. The
+watermark handed back to clients is an opaque token holding the position
+reached in both, so a periodic sync reads only rows changed since the last
+one through the ``updated_at`` index, however large the table.
+
+``updated_at`` is set when a row is saved, before its transaction commits,
+so rows younger than ``SYNC_SETTLE_SECONDS`` are held back until a later
+sync; a transaction still open after that long can be missed.
+"""
+
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import DeletedRecord, Driver, Supplier, User, Vendor, WarehouseManager
+from .pagination import InvalidCursor, decode_cursor, encode_cursor
+
+
+class WatermarkExpired(ValueError):
+    """The tombstones a watermark needs have already been pruned"""
+
+
+class SyncResource:
+    """
+    A model exposed through the sync API and the columns it returns; every
+    resource is keyed by ``user_id``
+    """
+
+    def __init__(self, name, model, fields, admin_only=False):
+        self.name = name
+        self.model = model
+        # Output key -> lookup, read with values_list
+        self.fields = fields
+        self.admin_only = admin_only
+
+    def rows(self, queryset):
+        names = list(self.fields)
+        for row in queryset.values_list(*self.fields.values()):
+            yield dict(zip(names, row))
+
+
+SYNC_RESOURCES = {
+    resource.name: resource for resource in [
+        SyncResource('users', User, {
+            'user_id': 'id',
+            'username': 'username',
+            'email': 'email',
+            'first_name': 'first_name',
+            'last_name': 'last_name',
+            'role_id': 'role_id',
+            'is_active': 'is_active',
+            'is_verified': 'is_verified',
+            'updated_at': 'updated_at',
+        }, admin_only=True),
+        SyncResource('drivers', Driver, {
+            'user_id': 'user_id',
+            'username': 'user__username',
+            'vehicle_id': 'vehicle_id',
+            'vehicle_type': 'vehicle_type',
+            'license_number': 'license_number',
+            'updated_at': 'updated_at',
+        }),
+        SyncResource('suppliers', Supplier, {
+            'user_id': 'user_id',
+            'username': 'user__username',
+            'email': 'user__email',
+            'company_name': 'company_name',
+            'code': 'code',
+            'business_type': 'business_type',
+            'tax_id': 'tax_id',
+            'compliance_score': 'compliance_score',
+            'active': 'active',
+            'updated_at': 'updated_at',
+        }),
+        SyncResource('vendors', Vendor, {
+            'user_id': 'user_id',
+            'username': 'user__username',
+            'shop_name': 'shop_name',
+            'location': 'location',
+            'business_license': 'business_license',
+            'updated_at': 'updated_at',
+        }),
+        SyncResource('warehouse-managers', WarehouseManager, {
+            'user_id': 'user_id',
+            'username': 'user__username',
+            'warehouse_id': 'warehouse_id',
+            'department': 'department',
+            'updated_at': 'updated_at',
+        }),
+    ]
+}
+# Resource whose rows carry copies of User columns, keyed by role id
+PROFILE_RESOURCES = {3: 'suppliers', 4: 'vendors', 5: 'warehouse-managers', 6: 'drivers'}
+# User columns copied into profile payloads (sync rows, the driver and
+# supplier lists); saving them touches the profile's updated_at
+PROFILE_USER_FIELDS = {'username', 'email', 'first_name', 'last_name', 'is_active'}
+
+
+def resource_for_instance(instance):
+    for resource in SYNC_RESOURCES.values():
+        if isinstance(instance, resource.model):
+            return resource
+    return None
+
+
+def encode_watermark(changed, deleted):
+    return encode_cursor({
+        'c': [changed[0].isoformat(), changed[1]],
+        'd': [deleted[0].isoformat(), deleted[1]],
+    })
+
+
+def decode_watermark(token):
+    """``(changed, deleted)`` positions, each ``(datetime, pk)``"""
+    position = decode_cursor(token)
+    try:
+        changed = (datetime.fromisoformat(position['c'][0]), int(position['c'][1]))
+        deleted = (datetime.fromisoformat(position['d'][0]), int(position['d'][1]))
+    except (KeyError, IndexError, TypeError, ValueError):
+        raise InvalidCursor(token)
+    return changed, deleted
+
+
+def after(position, timestamp_field, key_field):
+    """Filter for rows after a keyset position"""
+    timestamp, key = position
+    return Q(**{f'{timestamp_field}__gt': timestamp}) | Q(
+        **{timestamp_field: timestamp, f'{key_field}__gt': key}
+    )
+
+
+def get_changes(resource, watermark, limit):
+    """
+    Rows of ``resource`` changed and deleted after ``watermark`` (None for a
+    full sync), at most ``limit`` of each, plus the next watermark
+    """
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=settings.SYNC_SETTLE_SECONDS)
+    if watermark is None:
+        # A full sync has nothing to delete; start the tombstones from here
+        changed_after, deleted_after = None, (cutoff, 0)
+    else:
+        changed_after, deleted_after = decode_watermark(watermark)
+        retention = timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+        if deleted_after[0] < now - retention:
+            raise WatermarkExpired(watermark)
+
+    pk = resource.model._meta.pk.attname
+    changed = resource.model.objects.filter(updated_at__lt=cutoff)
+    if changed_after is not None:
+        changed = changed.filter(after(changed_after, 'updated_at', pk))
+    changed = list(resource.rows(changed.order_by('updated_at', pk)[:limit + 1]))
+
+    deleted = DeletedRecord.objects.filter(
+        after(deleted_after, 'deleted_at', 'id'), resource=resource.name, deleted_at__lt=cutoff
+    ).order_by('deleted_at', 'id').values_list('deleted_at', 'id', 'object_id')[:limit + 1]
+    deleted = list(deleted)
+
+    has_more = len(changed) > limit or len(deleted) > limit
+    changed, deleted = changed[:limit], deleted[:limit]
+
+    # Advance each position to the last row returned, or to the cutoff once
+    # everything before it has been read
+    if len(changed) == limit:
+        changed_after = (changed[-1]['updated_at'], changed[-1]['user_id'])
+    else:
+        changed_after = (cutoff, 0)
+    if len(deleted) == limit:
+        deleted_after = deleted[-1][:2]
+    else:
+        deleted_after = (cutoff, 0)
+
+    return {
+        'changed': changed,
+        'deleted': [object_id for _, _, object_id in deleted],
+        'watermark': encode_watermark(changed_after, deleted_after),
+        'has_more': has_more,
+    }
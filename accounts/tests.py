@@ -0,0 +1,948 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+import json
+import time
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+
+from utils import event_schema, json_utils
+from utils.kafka_utils import supplier_producer
+
+from . import provisioning
+from .authentication import JWTAuthentication, TokenUser, verify_tokens
+from .cache import bump_user_version, get_cached_user, user_cache
+from .claims import TOKEN_RELATIONS
+from .jwt_keys import decode_token
+from .management.commands.init_roles import ROLES
+from .models import DeletedRecord, Driver, OutboxEvent, Role, Supplier, User, WarehouseManager
+from .pagination import encode_cursor
+from .provisioning import provision_users
+from .revocation import deny_list, is_token_revoked, revoke_user_tokens
+from .streaming import aiter_chunks, encode_json, encode_ndjson
+from .sync import SYNC_RESOURCES, WatermarkExpired, encode_watermark, get_changes
+from .views import generate_jwt_token, generate_refresh_token
+
+DRIVERS = SYNC_RESOURCES['drivers']
+
+# Passwords hashed at test speed (provisioning hashes every accepted row)
+FAST_HASHING = {
+    'PASSWORD_HASHERS': ['django.contrib.auth.hashers.MD5PasswordHasher'],
+    'PASSWORD_HASH_PROFILES': {'test': {'hasher': 'django.contrib.auth.hashers.MD5PasswordHasher'}},
+    'PASSWORD_HASH_DEFAULT_PROFILE': 'test',
+    'PASSWORD_HASH_ROLE_PROFILES': {},
+}
+
+
+def create_roles():
+    for role_id, name, description in ROLES:
+        Role.objects.create(id=role_id, name=name, description=description)
+
+
+def create_driver(number):
+    user = User.objects.create(
+        username=f'driver{number}', email=f'driver{number}@example.com', role_id=6
+    )
+    return Driver.objects.create(user=user, license_number=f'DL{number}', vehicle_type='Van')
+
+
+def clear_caches():
+    """Revocation markers and cached users outlive each test's transaction"""
+    cache.clear()
+    user_cache.clear()
+
+
+def sync_all(watermark=None, limit=2):
+    """Follow has_more to the end; returns the pages and the last watermark"""
+    pages = []
+    while True:
+        page = get_changes(DRIVERS, watermark, limit)
+        pages.append(page)
+        watermark = page['watermark']
+        if not page['has_more']:
+            return pages, watermark
+
+
+class SyncChangesTests(TestCase):
+    """Watermarks, keyset paging and tombstones of get_changes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_roles()
+        cls.drivers = [create_driver(number) for number in range(5)]
+        # Three drivers changed at the same instant, so a page boundary
+        # falls inside the tie
+        an_hour_ago = timezone.now() - timedelta(hours=1)
+        times = [an_hour_ago, an_hour_ago + timedelta(seconds=1), an_hour_ago + timedelta(seconds=1),
+                 an_hour_ago + timedelta(seconds=1), an_hour_ago + timedelta(seconds=2)]
+        for driver, updated_at in zip(cls.drivers, times):
+            Driver.objects.filter(pk=driver.pk).update(updated_at=updated_at)
+
+    def test_full_sync_pages_through_ties_once_each(self):
+        pages, _ = sync_all(limit=2)
+
+        self.assertEqual([page['has_more'] for page in pages], [True, True, False])
+        synced = [row['user_id'] for page in pages for row in page['changed']]
+        self.assertEqual(synced, [driver.pk for driver in self.drivers])
+
+    def test_page_size_equal_to_the_rows_left_ends_sync(self):
+        pages, _ = sync_all(limit=5)
+
+        self.assertEqual(len(pages), 1)
+        self.assertEqual(len(pages[0]['changed']), 5)
+        self.assertFalse(pages[0]['has_more'])
+
+    @override_settings(SYNC_SETTLE_SECONDS=0)
+    def test_incremental_sync_returns_only_changes_and_deletions(self):
+        _, watermark = sync_all()
+
+        changed, deleted = self.drivers[1], self.drivers[3]
+        changed.vehicle_id = 'VH-9'
+        changed.save()
+        deleted.user.delete()
+
+        pages, watermark = sync_all(watermark)
+        self.assertEqual([row['user_id'] for page in pages for row in page['changed']], [changed.pk])
+        self.assertEqual(pages[0]['changed'][0]['vehicle_id'], 'VH-9')
+        self.assertEqual([object_id for page in pages for object_id in page['deleted']], [deleted.pk])
+
+        # Nothing new since
+        pages, _ = sync_all(watermark)
+        self.assertEqual(pages, [{**pages[0], 'changed': [], 'deleted': []}])
+
+    @override_settings(SYNC_SETTLE_SECONDS=0)
+    def test_tombstones_page_with_ties_on_deleted_at(self):
+        _, watermark = sync_all()
+        removed = [driver.pk for driver in self.drivers[:3]]
+        Driver.objects.filter(pk__in=removed).delete()
+        DeletedRecord.objects.filter(resource='drivers').update(deleted_at=timezone.now())
+
+        pages, _ = sync_all(watermark, limit=2)
+        self.assertEqual([page['has_more'] for page in pages], [True, False])
+        self.assertEqual(sorted(object_id for page in pages for object_id in page['deleted']), removed)
+
+    @override_settings(SYNC_SETTLE_SECONDS=60)
+    def test_rows_changed_within_the_settle_window_wait(self):
+        _, watermark = sync_all()
+        driver = self.drivers[0]
+        driver.save()
+
+        pages, _ = sync_all(watermark)
+        self.assertEqual(pages[0]['changed'], [])
+
+    @override_settings(SYNC_TOMBSTONE_RETENTION_DAYS=30)
+    def test_watermark_older_than_tombstone_retention_expires(self):
+        old = timezone.now() - timedelta(days=31)
+        watermark = encode_watermark((old, 0), (old, 0))
+
+        with self.assertRaises(WatermarkExpired):
+            get_changes(DRIVERS, watermark, 10)
+
+
+class SyncChangesViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_roles()
+        cls.admin = User.objects.create(username='admin', email='admin@example.com', role_id=1)
+        cls.driver = create_driver(1)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def test_expired_watermark_is_gone(self):
+        old = timezone.now() - timedelta(days=365)
+        response = self.client.get('/api/v1/sync/drivers/', {'since': encode_watermark((old, 0), (old, 0))})
+
+        self.assertEqual(response.status_code, 410)
+        self.assertFalse(response.json()['success'])
+
+    def test_malformed_watermark_is_rejected(self):
+        for since in ['not-a-watermark', encode_cursor({'c': ['x', 1], 'd': ['y', 2]})]:
+            response = self.client.get('/api/v1/sync/drivers/', {'since': since})
+            self.assertEqual(response.status_code, 400)
+
+    def test_users_resource_is_admin_only(self):
+        self.client.force_authenticate(user=self.driver.user)
+
+        self.assertEqual(self.client.get('/api/v1/sync/users/').status_code, 403)
+        self.assertEqual(self.client.get('/api/v1/sync/drivers/').status_code, 200)
+
+
+@override_settings(**FAST_HASHING)
+class ProvisionUsersTests(TestCase):
+    """Per-row validation and conflicts of provision_users"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_roles()
+        User.objects.create(username='taken', email='taken@example.com', role_id=2)
+
+    def driver_row(self, name, **fields):
+        row = {
+            'username': name,
+            'email': f'{name}@example.com',
+            'password': 'Passw0rdX',
+            'role_id': 6,
+            'license_number': 'DL1',
+            'vehicle_type': 'Van',
+        }
+        row.update(fields)
+        return row
+
+    def test_invalid_rows_are_reported_and_the_rest_created(self):
+        rows = [
+            self.driver_row('ok1'),
+            self.driver_row('bad-email', email='nope'),
+            self.driver_row('number-email', email=5),
+            self.driver_row('x' * 151),
+            self.driver_row('weak', password='password'),
+            self.driver_row('taken'),
+            self.driver_row('ok1', email='other@example.com'),
+            self.driver_row('no-profile', license_number=''),
+            self.driver_row('unknown-role', role_id=42),
+            'not an object',
+            self.driver_row('ok2', vehicle_id='VH-1'),
+        ]
+
+        result = provision_users(rows)
+
+        self.assertEqual([user['index'] for user in result['users']], [0, 10])
+        self.assertEqual({error['index']: error['message'] for error in result['errors']}, {
+            1: 'Invalid email format',
+            2: 'email must be a string',
+            3: 'username must be at most 150 characters',
+            4: 'Password must be at least 8 characters and include uppercase, lowercase, and numbers',
+            5: 'Username already exists',
+            6: 'Username is repeated in the batch',
+            7: 'Missing required fields for Driver profile',
+            8: 'Unknown role_id 42',
+            9: 'Each user must be an object',
+        })
+        user = User.objects.select_related('driver').get(username='ok2')
+        self.assertEqual(user.role_id, 6)
+        self.assertEqual(user.driver.vehicle_id, 'VH-1')
+        self.assertTrue(user.check_password('Passw0rdX'))
+
+    def test_supplier_fields_are_checked_against_their_columns(self):
+        supplier = {
+            'role_id': 3, 'company_name': 'Acme', 'business_type': 'Retail', 'tax_id': 'T1',
+            'street_no': '1', 'street_name': 'Main Street', 'city': 'Colombo', 'zipcode': '10100',
+        }
+        rows = [
+            self.driver_row('long-zip', **dict(supplier, zipcode='101000')),
+            self.driver_row('long-code', **dict(supplier, code='S' * 11)),
+            self.driver_row('supplier', **dict(supplier, code='S-1')),
+        ]
+
+        result = provision_users(rows)
+
+        self.assertEqual([user['index'] for user in result['users']], [2])
+        self.assertEqual([error['message'] for error in result['errors']], [
+            'zipcode must be at most 5 characters',
+            'code must be at most 10 characters',
+        ])
+        self.assertTrue(Supplier.objects.filter(code='S-1').exists())
+
+    def test_all_or_nothing_creates_nothing_when_a_row_fails(self):
+        result = provision_users([self.driver_row('ok1'), self.driver_row('taken')], all_or_nothing=True)
+
+        self.assertEqual(result['users'], [])
+        self.assertEqual([error['index'] for error in result['errors']], [1])
+        self.assertFalse(User.objects.filter(username='ok1').exists())
+
+    def test_user_registered_between_check_and_insert_is_a_row_error(self):
+        check = provisioning.reject_taken
+
+        def racing_check(accepted, errors):
+            remaining = check(accepted, errors)
+            if not User.objects.filter(username='raced').exists():
+                User.objects.create(username='raced', email='elsewhere@example.com', role_id=2)
+            return remaining
+
+        rows = [self.driver_row('ok1'), self.driver_row('raced'), self.driver_row('ok2')]
+        with mock.patch.object(provisioning, 'reject_taken', side_effect=racing_check):
+            result = provision_users(rows)
+
+        self.assertEqual([user['index'] for user in result['users']], [0, 2])
+        self.assertEqual(result['errors'], [{'index': 1, 'username': 'raced', 'message': 'Username already exists'}])
+        self.assertEqual(Driver.objects.count(), 2)
+
+
+@override_settings(**FAST_HASHING, PROVISIONING_BATCH_LIMIT=3)
+class AdminBulkRegisterViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_roles()
+        cls.admin = User.objects.create(username='admin', email='admin@example.com', role_id=1)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def post(self, body):
+        return self.client.post('/api/v1/admin/users/bulk/', body, format='json')
+
+    def user(self, name):
+        return {'username': name, 'email': f'{name}@example.com', 'password': 'Passw0rdX', 'role_id': 2}
+
+    def test_partial_batch_is_created_with_row_errors(self):
+        response = self.post({'users': [self.user('new'), self.user('admin')]})
+
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual(body['message'], 'Registered 1 of 2 users')
+        self.assertEqual([error['index'] for error in body['errors']], [1])
+
+    def test_nothing_created_is_a_bad_request(self):
+        response = self.post({'users': [self.user('new'), self.user('admin')], 'all_or_nothing': True})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(User.objects.filter(username='new').exists())
+
+    def test_batch_must_be_a_list_within_the_limit(self):
+        for users in [None, [], 'x', [self.user(f'user{number}') for number in range(4)]]:
+            self.assertEqual(self.post({'users': users}).status_code, 400)
+
+    def test_admins_only(self):
+        self.client.force_authenticate(user=User.objects.create(username='plain', role_id=2))
+
+        self.assertEqual(self.post({'users': [self.user('new')]}).status_code, 403)
+
+
+class TokenRevocationTests(TestCase):
+    """TokenUser and the per-user revocation markers"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_roles()
+        driver = create_driver(1)
+        driver.vehicle_id = 'VH-1'
+        driver.save()
+        cls.user = driver.user
+        cls.other = create_driver(2).user
+
+    def setUp(self):
+        clear_caches()
+        # Load the jti deny list now so authenticating needs no query
+        deny_list.sync()
+        self.authentication = JWTAuthentication(stateless=True)
+
+    def token(self, user=None):
+        user = User.objects.select_related(*TOKEN_RELATIONS).get(pk=(user or self.user).pk)
+        return generate_jwt_token(user)
+
+    def authenticate(self, token):
+        return self.authentication.authenticate_credentials(token)[0]
+
+    def test_token_user_serves_claims_without_queries(self):
+        token = self.token()
+
+        with self.assertNumQueries(0):
+            user = self.authenticate(token)
+            self.assertIsInstance(user, TokenUser)
+            self.assertEqual((user.id, user.pk, user.username, user.role_id), (self.user.pk, self.user.pk, 'driver1', 6))
+            self.assertEqual(user.vehicle_id, 'VH-1')
+            self.assertTrue(user.is_active)
+            self.assertTrue(user.is_authenticated)
+            self.assertEqual(user, self.user)
+
+    def test_token_user_loads_the_row_once_for_other_attributes(self):
+        user = self.authenticate(self.token())
+
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, 'driver1@example.com')
+            self.assertEqual(user.role.name, 'Driver')
+            self.assertEqual(user.driver.vehicle_id, 'VH-1')
+
+        user.first_name = 'Dana'
+        user.save(update_fields=['first_name'])
+        self.assertEqual(User.objects.get(pk=self.user.pk).first_name, 'Dana')
+
+    def test_tokens_issued_before_the_marker_are_revoked(self):
+        token = self.token()
+        revoke_user_tokens(self.user.pk)
+
+        with self.assertRaisesMessage(AuthenticationFailed, 'Token has been revoked'):
+            self.authenticate(token)
+        with self.assertRaisesMessage(AuthenticationFailed, 'Token has been revoked'):
+            JWTAuthentication(stateless=False).authenticate_credentials(token)
+        self.assertEqual(self.authenticate(self.token()).id, self.user.pk)
+        self.assertEqual(self.authenticate(self.token(self.other)).id, self.other.pk)
+
+    def test_marker_compares_sub_second_issue_times(self):
+        second = int(time.time())
+        with mock.patch('accounts.revocation.time.time', return_value=second + 0.5):
+            revoke_user_tokens(self.user.pk)
+
+        self.assertTrue(is_token_revoked({'user_id': self.user.pk, 'iat': second + 0.4}))
+        self.assertTrue(is_token_revoked({'user_id': self.user.pk, 'iat': second}))
+        self.assertFalse(is_token_revoked({'user_id': self.user.pk, 'iat': second + 0.6}))
+        self.assertFalse(is_token_revoked({'user_id': self.other.pk, 'iat': second + 0.4}))
+
+    def test_deactivation_and_role_change_revoke_tokens(self):
+        for change in [{'is_active': False}, {'role_id': 2}]:
+            with self.subTest(change=change):
+                clear_caches()
+                user = User.objects.get(pk=self.user.pk)
+                token = self.token(user)
+                for field, value in change.items():
+                    setattr(user, field, value)
+                user.save()
+
+                with self.assertRaisesMessage(AuthenticationFailed, 'Token has been revoked'):
+                    self.authenticate(token)
+                User.objects.filter(pk=user.pk).update(is_active=True, role_id=6)
+
+    def test_other_changes_keep_tokens_valid(self):
+        token = self.token()
+        user = User.objects.get(pk=self.user.pk)
+        user.first_name = 'Dana'
+        user.save()
+        user.last_name = 'Lee'
+        user.save(update_fields=['last_name'])
+
+        self.assertEqual(self.authenticate(token).id, self.user.pk)
+
+    def test_batch_verification_checks_the_markers(self):
+        tokens = [self.token(), self.token(self.other), 'not-a-token']
+        revoke_user_tokens(self.user.pk)
+
+        results = verify_tokens(tokens)
+
+        self.assertEqual(results[0], (None, 'Token has been revoked'))
+        self.assertEqual(results[1][0]['user_id'], self.other.pk)
+        self.assertEqual(results[2], (None, 'Invalid token'))
+
+
+class CachedUserTests(TestCase):
+    """The per-worker user cache against the shared user version"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_roles()
+        cls.user = User.objects.create(username='cached', email='cached@example.com', role_id=2)
+
+    def setUp(self):
+        clear_caches()
+
+    def test_local_hits_need_no_query(self):
+        get_cached_user(self.user.pk)
+
+        with self.assertNumQueries(0):
+            user = get_cached_user(self.user.pk)
+        self.assertEqual(user.role.name, 'Regular User')
+
+    def test_copies_are_returned(self):
+        user = get_cached_user(self.user.pk)
+        user.first_name = 'Changed'
+
+        self.assertEqual(get_cached_user(self.user.pk).first_name, '')
+
+    def test_change_made_in_another_worker_is_seen(self):
+        get_cached_user(self.user.pk)
+        # Another worker saves the user: the row and the shared version
+        # change, this worker's local entry is left behind
+        User.objects.filter(pk=self.user.pk).update(first_name='Elsewhere')
+        bump_user_version(self.user.pk)
+
+        self.assertEqual(get_cached_user(self.user.pk).first_name, 'Elsewhere')
+
+    def test_missing_user_raises(self):
+        with self.assertRaises(User.DoesNotExist):
+            get_cached_user(0)
+
+
+class AdminUsersPaginationTests(TestCase):
+    """Offset and keyset pagination of the admin users list"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_roles()
+        cls.admin = User.objects.create(username='admin', email='admin@example.com', role_id=1)
+        for number in range(4):
+            User.objects.create(username=f'user{number}', email=f'user{number}@example.com', role_id=2)
+        cls.ids = list(User.objects.order_by('id').values_list('id', flat=True))
+
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def get(self, **params):
+        return self.client.get('/api/v1/admin/users/', params)
+
+    def test_offset_pages_keep_their_shape(self):
+        body = self.get(page=2, limit=2).json()
+
+        self.assertEqual(set(body), {'success', 'users', 'pagination'})
+        self.assertEqual([user['user_id'] for user in body['users']], self.ids[2:4])
+        self.assertEqual(body['pagination'], {'total': 5, 'page': 2, 'limit': 2, 'pages': 3})
+
+    def test_keyset_pages_follow_the_cursor(self):
+        ids = []
+        cursor = ''
+        while cursor is not None:
+            body = self.get(cursor=cursor, limit=2, count='exact').json()
+            ids.extend(user['user_id'] for user in body['users'])
+            self.assertEqual(body['pagination']['total'], 5)
+            cursor = body['pagination']['next_cursor']
+
+        self.assertEqual(ids, self.ids)
+
+    def test_bad_page_limit_or_count_is_rejected(self):
+        for params in [{'page': 0}, {'page': 'x'}, {'limit': 0}, {'limit': -1}, {'limit': '1.5'},
+                       {'cursor': '', 'limit': 0}, {'count': 'all'}]:
+            with self.subTest(params=params):
+                response = self.get(**params)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.json()['success'])
+
+    def test_bad_cursor_is_rejected(self):
+        for cursor in ['%%%', 'bm90IGpzb24', encode_cursor([1]), encode_cursor({'pk': 1}),
+                       encode_cursor({'id': 'abc'}), encode_cursor({'id': [1]})]:
+            with self.subTest(cursor=cursor):
+                response = self.get(cursor=cursor)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['message'], 'Invalid cursor')
+
+    def test_admins_only(self):
+        self.client.force_authenticate(user=User.objects.get(username='user0'))
+
+        self.assertEqual(self.get().status_code, 403)
+
+
+class RelayOutboxTests(TestCase):
+    """Ordering per key and retry backoff of the relay_outbox command"""
+
+    def setUp(self):
+        self.sent = []
+        self.failing = set()
+        patcher = mock.patch.object(supplier_producer, 'send_batch', side_effect=self.send_batch)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def send_batch(self, messages):
+        errors = []
+        for _, key, message in messages:
+            self.sent.append((key, message['payload']['n']))
+            errors.append('broker down' if key in self.failing else None)
+        return errors
+
+    def event(self, key, n):
+        return OutboxEvent.objects.create(topic='supplier-events', event_type='supplier_updated',
+                                          key=key, payload={'n': n})
+
+    def relay(self, *args):
+        self.sent = []
+        call_command('relay_outbox', *args, stdout=StringIO(), stderr=StringIO())
+        return self.sent
+
+    def test_events_are_published_in_order(self):
+        events = [self.event('a', 1), self.event('b', 2), self.event('a', 3)]
+
+        self.assertEqual(self.relay(), [('a', 1), ('b', 2), ('a', 3)])
+        for event in events:
+            event.refresh_from_db()
+            self.assertIsNotNone(event.published_at)
+            self.assertEqual(event.attempts, 1)
+        self.assertEqual(self.relay(), [])
+
+    def test_failure_holds_back_the_rest_of_its_key(self):
+        first, other, later = self.event('a', 1), self.event('b', 2), self.event('a', 3)
+        self.failing = {'a'}
+
+        self.relay('--backoff', '5')
+
+        first.refresh_from_db()
+        self.assertEqual((first.attempts, first.last_error), (1, 'broker down'))
+        self.assertIsNone(first.published_at)
+        self.assertAlmostEqual((first.next_attempt_at - timezone.now()).total_seconds(), 5, delta=2)
+        later.refresh_from_db()
+        self.assertEqual((later.attempts, later.published_at), (0, None))
+        other.refresh_from_db()
+        self.assertIsNotNone(other.published_at)
+
+        # While the first event backs off, nothing of its key is sent, even
+        # events written after the failure
+        self.failing = set()
+        newest = self.event('a', 4)
+        self.assertEqual(self.relay(), [])
+
+        OutboxEvent.objects.filter(pk=first.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(self.relay(), [('a', 1), ('a', 3), ('a', 4)])
+        newest.refresh_from_db()
+        self.assertIsNotNone(newest.published_at)
+
+    def test_backoff_doubles_up_to_the_maximum(self):
+        event = self.event('a', 1)
+        self.failing = {'a'}
+        delays = []
+        for _ in range(4):
+            OutboxEvent.objects.filter(pk=event.pk).update(next_attempt_at=None)
+            self.relay('--backoff', '5', '--max-backoff', '30')
+            event.refresh_from_db()
+            delays.append(round((event.next_attempt_at - timezone.now()).total_seconds()))
+
+        self.assertEqual(delays, [5, 10, 20, 30])
+        self.assertEqual(event.attempts, 4)
+
+    def test_gives_up_after_max_attempts_and_releases_the_key(self):
+        event, later = self.event('a', 1), self.event('a', 2)
+        OutboxEvent.objects.filter(pk=event.pk).update(attempts=2)
+        self.failing = {'a'}
+
+        self.relay('--max-attempts', '3')
+
+        event.refresh_from_db()
+        self.assertEqual(event.attempts, 3)
+        self.assertIsNotNone(event.failed_at)
+        self.failing = set()
+        self.assertEqual(self.relay(), [('a', 2)])
+        later.refresh_from_db()
+        self.assertIsNotNone(later.published_at)
+
+    def test_events_without_a_key_are_not_held_back(self):
+        failed, unkeyed = self.event(None, 1), self.event(None, 2)
+        self.failing = {None}
+        self.relay()
+        self.failing = set()
+        OutboxEvent.objects.filter(pk=unkeyed.pk).update(next_attempt_at=None)
+
+        self.assertEqual(self.relay(), [(None, 2)])
+        failed.refresh_from_db()
+        self.assertIsNone(failed.published_at)
+        self.assertEqual(failed.attempts, 1)
+
+
+def supplier_event(**payload):
+    supplier = {
+        'user': {'id': 7, 'username': 'acme', 'email': 'acme@example.com',
+                 'first_name': 'Ann', 'last_name': 'Smith', 'is_active': True},
+        'company_name': 'Acme Ltd', 'code': 'SUP-7', 'business_type': 'Retail', 'tax_id': 'T-7',
+        'compliance_score': 4.5, 'active': True,
+        'created_at': '2024-05-01T10:20:30.123456Z', 'updated_at': '2024-05-02T08:00:00Z',
+    }
+    supplier.update(payload)
+    return supplier_producer.build_message('supplier_updated', supplier, timestamp=1714558830123)
+
+
+class EventSchemaTests(SimpleTestCase):
+    """Binary event codec and its JSON fallback"""
+
+    def test_supplier_event_round_trips(self):
+        message = supplier_event()
+
+        encoded = event_schema.encode_event(message)
+
+        self.assertEqual(encoded[:5], b'\x00\x00\x00\x00\x01')
+        self.assertLess(len(encoded), len(json_utils.dumps(message)))
+        self.assertEqual(event_schema.decode_event(encoded), message)
+
+    def test_optional_timestamps_round_trip(self):
+        message = supplier_event(created_at=None, updated_at=None)
+
+        self.assertEqual(event_schema.decode_event(event_schema.encode_event(message)), message)
+
+    def test_deleted_event_round_trips(self):
+        message = supplier_producer.build_message('supplier_deleted', {'id': 7}, timestamp=1)
+
+        encoded = event_schema.encode_event(message)
+
+        self.assertEqual(encoded[:5], b'\x00\x00\x00\x00\x02')
+        self.assertEqual(event_schema.decode_event(encoded), message)
+
+    def test_longs_round_trip(self):
+        for value in [0, 1, -1, 63, -64, 64, 2 ** 31, -2 ** 31, 2 ** 63 - 1, -2 ** 63]:
+            buf = bytearray()
+            event_schema.write_long(buf, value)
+            self.assertEqual(event_schema.read_long(buf, 0), (value, len(buf)))
+
+    def test_messages_that_do_not_fit_are_sent_as_json(self):
+        messages = [
+            supplier_producer.build_message('supplier_archived', {'id': 7}),
+            supplier_event(compliance_score='4.5'),
+            supplier_event(rating=3),
+            supplier_event(created_at='yesterday'),
+            supplier_event(user=None),
+            supplier_producer.build_message('supplier_deleted', {'id': True}),
+        ]
+        for message in messages:
+            with self.subTest(message=message):
+                encoded = event_schema.encode_event(message)
+                self.assertEqual(encoded, json_utils.dumps(message))
+                self.assertEqual(event_schema.decode_event(encoded), message)
+
+    def test_schema_ids_cannot_be_reused(self):
+        registry = event_schema.SchemaRegistry()
+        registry.register(1, 'long')
+        registry.register(1, 'long')
+
+        with self.assertRaises(ValueError):
+            registry.register(1, 'string')
+
+    def test_unknown_schema_id_is_rejected(self):
+        with self.assertRaises(ValueError):
+            event_schema.decode_event(b'\x00\x00\x00\x00\x63\x00')
+
+
+class TokenRefreshTests(TestCase):
+    """Refresh token rotation and replay detection"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_roles()
+        driver = create_driver(1)
+        driver.vehicle_id = 'VH-1'
+        driver.save()
+        cls.user = driver.user
+
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+
+    def refresh(self, refresh_token):
+        return self.client.post('/api/v1/token/refresh/', {'refresh_token': refresh_token}, format='json')
+
+    def test_refresh_rotates_the_token_pair(self):
+        refresh_token = generate_refresh_token(self.user)
+
+        response = self.refresh(refresh_token)
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertNotEqual(body['refresh_token'], refresh_token)
+        self.assertEqual(body['expires_in'], settings.JWT_ACCESS_TOKEN_LIFETIME)
+        claims = decode_token(body['token'])
+        self.assertEqual((claims['type'], claims['user_id'], claims['vehicle_id']), ('access', self.user.pk, 'VH-1'))
+        self.assertEqual(JWTAuthentication().authenticate_credentials(body['token'])[0], self.user)
+        self.assertEqual(self.refresh(body['refresh_token']).status_code, 200)
+
+    def test_replayed_refresh_token_revokes_every_token_of_the_user(self):
+        stolen = generate_refresh_token(self.user)
+        body = self.refresh(stolen).json()
+
+        response = self.refresh(stolen)
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['message'], 'Refresh token has been revoked')
+        # The pair handed out for the first use is revoked as well
+        self.assertEqual(self.refresh(body['refresh_token']).status_code, 401)
+        with self.assertRaisesMessage(AuthenticationFailed, 'Token has been revoked'):
+            JWTAuthentication().authenticate_credentials(body['token'])
+
+    def test_only_refresh_tokens_are_accepted(self):
+        for token in [generate_jwt_token(self.user), 'not-a-token']:
+            response = self.refresh(token)
+            self.assertEqual(response.status_code, 401)
+            self.assertEqual(response.json()['message'], 'Invalid refresh token')
+        self.assertEqual(self.refresh('').status_code, 400)
+
+    def test_inactive_user_cannot_refresh(self):
+        refresh_token = generate_refresh_token(self.user)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+
+        self.assertEqual(self.refresh(refresh_token).status_code, 401)
+
+    def test_role_claims_are_read_with_the_user(self):
+        manager = User.objects.create(username='manager', email='manager@example.com', role_id=5)
+        WarehouseManager.objects.create(user=manager, warehouse_id='WH-1', department='Inbound')
+
+        for user, claim, value in [(self.user, 'vehicle_id', 'VH-1'), (manager, 'warehouse_id', 'WH-1')]:
+            with self.subTest(claim=claim), CaptureQueriesContext(connection) as queries:
+                body = self.refresh(generate_refresh_token(user)).json()
+            self.assertEqual(decode_token(body['token'])[claim], value)
+            profile_queries = [
+                query['sql'] for query in queries
+                if 'FROM "accounts_driver"' in query['sql'] or 'FROM "accounts_warehousemanager"' in query['sql']
+            ]
+            self.assertEqual(profile_queries, [])
+
+
+class StreamEncoderTests(SimpleTestCase):
+    """ndjson and json encoders of the streaming exports"""
+
+    def rows(self, count):
+        return [{'user_id': number, 'username': f'driver{number}'} for number in range(count)]
+
+    def test_ndjson_is_one_object_per_line_in_batches(self):
+        for count in [0, 1, 2, 5]:
+            with self.subTest(count=count):
+                chunks = list(encode_ndjson(iter(self.rows(count)), 2))
+                self.assertEqual(len(chunks), (count + 1) // 2)
+                self.assertTrue(all(chunk.endswith(b'\n') for chunk in chunks))
+                lines = b''.join(chunks).splitlines()
+                self.assertEqual([json.loads(line) for line in lines], self.rows(count))
+
+    def test_json_matches_the_buffered_document(self):
+        for count in [0, 1, 2, 3, 4]:
+            with self.subTest(count=count):
+                body = b''.join(encode_json(iter(self.rows(count)), 'drivers', 2))
+                self.assertEqual(json.loads(body), {'success': True, 'drivers': self.rows(count), 'count': count})
+
+    def test_json_without_key_is_a_bare_array(self):
+        for count in [0, 3]:
+            self.assertEqual(json.loads(b''.join(encode_json(iter(self.rows(count)), None, 2))), self.rows(count))
+
+    def test_first_chunk_is_sent_before_reading_rows(self):
+        def rows():
+            raise AssertionError('rows read before the first chunk')
+            yield
+
+        self.assertEqual(next(encode_json(rows(), 'drivers', 10)), b'{"success":true,"drivers":[')
+
+    def test_values_are_encoded_like_the_api(self):
+        row = {'at': datetime(2024, 5, 1, 10, 0, tzinfo=dt_timezone.utc), 'score': Decimal('4.50')}
+
+        line = b''.join(encode_ndjson([row], 10))
+
+        self.assertEqual(line, json_utils.dumps(row) + b'\n')
+        self.assertEqual(json.loads(line)['at'], '2024-05-01T10:00:00Z')
+
+    def test_async_iteration_yields_the_same_chunks(self):
+        async def collect():
+            return [chunk async for chunk in aiter_chunks(encode_ndjson(iter(self.rows(5)), 2))]
+
+        self.assertEqual(async_to_sync(collect)(), list(encode_ndjson(iter(self.rows(5)), 2)))
+
+
+class DriverExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_roles()
+        for number in range(3):
+            create_driver(number)
+
+    def test_streamed_formats_match_the_list(self):
+        drivers = self.client.get('/api/v1/drivers/').json()['drivers']
+
+        response = self.client.get('/api/v1/drivers/', {'stream': 'ndjson'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(response['X-Accel-Buffering'], 'no')
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual(sorted((json.loads(line) for line in lines), key=lambda row: row['user_id']),
+                         sorted(drivers, key=lambda row: row['user_id']))
+
+        response = self.client.get('/api/v1/drivers/', {'stream': 'json'})
+        body = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(body['count'], 3)
+        self.assertEqual(sorted(body['drivers'], key=lambda row: row['user_id']),
+                         sorted(drivers, key=lambda row: row['user_id']))
+
+    def test_unknown_format_is_rejected(self):
+        self.assertEqual(self.client.get('/api/v1/drivers/', {'stream': 'xml'}).status_code, 400)
+
+
+class ConditionalGetTests(TestCase):
+    """ETag / Last-Modified validators and 304 responses"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_roles()
+        cls.drivers = [create_driver(number) for number in range(3)]
+        cls.suppliers = []
+        for number in range(2):
+            user = User.objects.create(username=f'supplier{number}', email=f'supplier{number}@example.com', role_id=3)
+            cls.suppliers.append(Supplier.objects.create(
+                user=user, company_name=f'Supplier {number}', code=f'SUP-{number}', business_type='Retail',
+                tax_id=f'T{number}', street_no='1', street_name='Main Street', city='Colombo', zipcode='10100'
+            ))
+
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+
+    def revalidate(self, url, response, **params):
+        return self.client.get(url, params, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_list_is_not_modified_without_reading_it(self):
+        response = self.client.get('/api/v1/drivers/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        self.assertIn('must-revalidate', response['Cache-Control'])
+
+        # Latest change and latest tombstone only
+        with self.assertNumQueries(2):
+            revalidated = self.revalidate('/api/v1/drivers/', response)
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated['ETag'], response['ETag'])
+        self.assertEqual(revalidated.content, b'')
+
+        since = self.client.get('/api/v1/drivers/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(since.status_code, 304)
+
+    def test_change_or_deletion_changes_the_etag(self):
+        response = self.client.get('/api/v1/drivers/')
+        driver = self.drivers[0]
+        driver.vehicle_id = 'VH-9'
+        driver.save()
+
+        changed = self.revalidate('/api/v1/drivers/', response)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+
+        # Deleting a row that is not the latest change leaves MAX(updated_at)
+        # alone; the tombstone still changes the ETag
+        self.drivers[1].delete()
+        deleted = self.revalidate('/api/v1/drivers/', changed)
+        self.assertEqual(deleted.status_code, 200)
+        self.assertEqual(len(deleted.json()['drivers']), 2)
+
+    def test_formats_have_their_own_etags(self):
+        listed = self.client.get('/api/v1/drivers/')
+        streamed = self.client.get('/api/v1/drivers/', {'stream': 'ndjson'})
+
+        self.assertNotEqual(listed['ETag'], streamed['ETag'])
+        self.assertEqual(self.revalidate('/api/v1/drivers/', streamed, stream='ndjson').status_code, 304)
+        self.assertEqual(self.revalidate('/api/v1/drivers/', streamed).status_code, 200)
+
+    def test_row_leaving_a_filter_changes_the_filtered_etag(self):
+        response = self.client.get('/api/v1/suppliers/', {'active': 'true'})
+        self.assertEqual(len(response.json()), 2)
+        self.assertEqual(self.revalidate('/api/v1/suppliers/', response, active='true').status_code, 304)
+
+        supplier = self.suppliers[0]
+        supplier.active = False
+        supplier.save()
+
+        revalidated = self.revalidate('/api/v1/suppliers/', response, active='true')
+        self.assertEqual(revalidated.status_code, 200)
+        self.assertEqual(len(revalidated.json()), 1)
+
+    def test_supplier_detail_is_validated_by_its_row(self):
+        url = f'/api/v1/suppliers/{self.suppliers[0].pk}/'
+        response = self.client.get(url)
+
+        self.assertEqual(self.revalidate(url, response).status_code, 304)
+        self.suppliers[1].save()
+        self.assertEqual(self.revalidate(url, response).status_code, 304)
+        self.suppliers[0].save()
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+        self.assertEqual(self.client.get('/api/v1/suppliers/0/').status_code, 404)
+
+    def test_profile_etag_follows_the_user_version(self):
+        user = self.drivers[0].user
+        self.client.force_authenticate(user=user)
+        response = self.client.get('/api/v1/me/')
+
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('Authorization', response['Vary'])
+        self.assertEqual(self.revalidate('/api/v1/me/', response).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user.first_name = 'Dana'
+            user.save()
+        revalidated = self.revalidate('/api/v1/me/', response)
+        self.assertEqual(revalidated.status_code, 200)
+        self.assertEqual(revalidated.json()['user']['first_name'], 'Dana')
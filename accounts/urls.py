@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 app_name = 'accounts'
 
@@ -10,6 +10,10 @@ urlpatterns = [
     path('register/vendor/', views.register_customer_view, name='register_customer'),
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
+    path('token/refresh/', views.token_refresh_view, name='token_refresh'),
+    path('token/verify/', views.token_verify_view, name='token_verify'),
+    path('token/verify/batch/', views.token_verify_batch_view, name='token_verify_batch'),
+    path('token/introspect/', views.token_introspect_view, name='token_introspect'),
     
     # User profile endpoints
     path('me/', views.get_profile_view, name='get_profile'),
@@ -20,9 +24,19 @@ urlpatterns = [
     
     # Admin endpoints
     path('admin/users/', views.admin_get_all_users, name='admin_get_all_users'),
+    path('admin/users/bulk/', views.admin_bulk_register_view, name='admin_bulk_register'),
     path('admin/users/<int:user_id>/', views.admin_update_user, name='admin_update_user'),
     path('admin/users/<int:user_id>/delete/', views.admin_delete_user, name='admin_delete_user'),
+    path('admin/metrics/', views.admin_metrics_view, name='admin_metrics'),
 
     # Driver endpoints
     path('drivers/', views.get_all_drivers_view, name='get_all_drivers'),
+
+    # Incremental sync (users, drivers, suppliers, vendors, warehouse-managers)
+    path('sync/<str:resource>/', views.sync_changes_view, name='sync_changes'),
+
+    # Async variants (served without thread hops under ASGI)
+    path('async/token/verify/', async_views.token_verify_view, name='async_token_verify'),
+    path('async/me/', async_views.get_profile_view, name='async_get_profile'),
+    path('async/drivers/', async_views.get_all_drivers_view, name='async_get_all_drivers'),
 ]
\ No newline at end of file
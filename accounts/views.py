@@ -1,5 +1,3 @@
-import re
-
 import jwt
 from django.contrib.auth import authenticate, login, logout
 from django.http import JsonResponse
@@ -7,58 +5,70 @@ from django.views.decorators.csrf import ensure_csrf_cookie, csrf_exempt
 import json
 import uuid
 from django.utils import timezone
-from datetime import datetime, timedelta
 import secrets
+import time
 from django.core.mail import send_mail
 from django.conf import settings
+from django.db import connection
+from django.utils.cache import patch_vary_headers
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 
 from rest_framework.decorators import api_view, permission_classes, authentication_classes
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
-from .models import User, PasswordResetToken, Supplier, Vendor, WarehouseManager, Driver
-
-# Email validation regex
-EMAIL_REGEX = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+from utils.db import connection_metrics
+from utils.kafka_utils import supplier_producer
 
-# Password validation - at least 8 chars, 1 uppercase, 1 lowercase, 1 number
-PASSWORD_REGEX = re.compile(r'^(?=.*[a-z])(?=.*[A-Z])(?=.*\d).{8,}$')
+from .authentication import JWTAuthentication, get_bearer_token, verify_token, verify_tokens
+from .cache import user_cache, get_cached_profile, get_user_version
+from .claims import TOKEN_RELATIONS, build_role_claims
+from .conditional import list_version, make_etag, not_modified, set_validators
+from .hash_pool import hash_pool
+from .jwt_keys import decode_token, encode_token, get_jwks
+from .models import User, PasswordResetToken, Supplier, Vendor, WarehouseManager, Driver
+from .pagination import COUNT_MODES, InvalidCursor, count_queryset, keyset_paginate
+from .provisioning import EMAIL_REGEX, PASSWORD_REGEX, provision_users
+from .revocation import is_token_revoked, revoke_token, revoke_user_tokens
+from .serializers import AdminUserSerializer
+from .streaming import STREAM_FORMATS, invalid_stream_format, iter_rows, streaming_export
+from .sync import SYNC_RESOURCES, WatermarkExpired, get_changes
 
 # JWT token generation
 def generate_jwt_token(user):
     """Generate JWT token for user authentication"""
     # Create token payload
+    issued_at = time.time()
     payload = {
         'user_id': user.id,
         'username': user.username,
         'role_id': getattr(user, 'role_id', 2),
-        'exp': datetime.utcnow() + timedelta(days=7)  # 7 days expiration
+        'iat': issued_at,  # Sub-second, checked against revocation markers
+        'exp': int(issued_at) + settings.JWT_ACCESS_TOKEN_LIFETIME,
+        'jti': uuid.uuid4().hex,  # Deny-listed on logout
+        'type': 'access'
     }
-
-    if user.role_id == 6:  # Driver
-        try:
-            driver = Driver.objects.get(user=user)
-            payload['vehicle_id'] = driver.vehicle_id
-        except Driver.DoesNotExist:
-            pass
-    
-    elif user.role_id == 5:  # Warehouse Manager
-        try:
-            warehouse_manager = WarehouseManager.objects.get(user=user)
-            payload['warehouse_id'] = warehouse_manager.warehouse_id
-        except WarehouseManager.DoesNotExist:
-            pass
+    # Role-specific claims (vehicle_id, warehouse_id...); no queries when the
+    # user was loaded with TOKEN_RELATIONS, as the login backend does
+    payload.update(build_role_claims(user))
     
-    # Generate token
-    token = jwt.encode(
-        payload,
-        settings.SECRET_KEY,
-        algorithm='HS256'
-    )
+    # Sign with the active key (HS256 with SECRET_KEY without a key ring)
+    token = encode_token(payload)
     
     return token
 
+def generate_refresh_token(user):
+    """Generate the long-lived token exchanged for new access tokens at token/refresh/"""
+    issued_at = time.time()
+    return encode_token({
+        'user_id': user.id,
+        'iat': issued_at,
+        'exp': int(issued_at) + settings.JWT_REFRESH_TOKEN_LIFETIME,
+        'jti': uuid.uuid4().hex,
+        'type': 'refresh'
+    })
+
 @api_view(['POST'])
 @authentication_classes([])
 @permission_classes([AllowAny])
@@ -108,20 +118,18 @@ def register_view(request):
             'message': 'Email already exists'
         }, status=400)
     
-    # Create new user using Django's User model create_user method
+    # Create new user using Django's User model create_user method; the
+    # role is set up front so the password gets the role's hash profile
     user = User.objects.create_user(
         username=username,
         email=email,
         password=password,  # create_user handles password hashing
         first_name=first_name,
         last_name=last_name,
-        phone=phone
+        phone=phone,
+        role_id=role_id
     )
     
-    # Set role_id
-    user.role_id = role_id
-    user.save()
-    
     # Create role-specific profile with all required fields
     try:
         if role_id == 3:  # Supplier
@@ -278,6 +286,8 @@ def login_view(request):
             'success': True,
             'message': 'Login successful',
             'token': token,
+            'refresh_token': generate_refresh_token(user),
+            'expires_in': settings.JWT_ACCESS_TOKEN_LIFETIME,
             'user': {
                 'user_id': user.id,
                 'username': user.username,
@@ -296,26 +306,235 @@ def login_view(request):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def logout_view(request):
-    # JWT doesn't need server-side invalidation
-    # Just instruct the client to remove the token
+    # Deny-list the access token of this request and, if given, the refresh
+    # token, so neither can be used again
+    if isinstance(request.auth, str):
+        revoke_token(decode_token(request.auth))
+    
+    refresh_token = request.data.get('refresh_token')
+    if refresh_token:
+        try:
+            claims = decode_token(refresh_token)
+        except jwt.InvalidTokenError:
+            claims = None
+        if claims and claims.get('type') == 'refresh' and claims.get('user_id') == request.user.id:
+            revoke_token(claims)
+    
     logout(request)
     return Response({
         'success': True,
         'message': 'Logged out successfully'
     })
 
+@csrf_exempt
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def token_refresh_view(request):
+    """
+    Exchange a refresh token for a new access token and refresh token.
+    
+    The presented refresh token is revoked (rotation). Presenting an already
+    revoked one means it was stolen or replayed, so every token of the user
+    is revoked.
+    """
+    refresh_token = request.data.get('refresh_token', '')
+    if not refresh_token:
+        return Response({
+            'success': False,
+            'message': 'Please provide a refresh token'
+        }, status=400)
+    
+    try:
+        claims = decode_token(refresh_token)
+    except jwt.ExpiredSignatureError:
+        return Response({
+            'success': False,
+            'message': 'Refresh token has expired'
+        }, status=401)
+    except jwt.InvalidTokenError:
+        claims = None
+    if not claims or claims.get('type') != 'refresh':
+        return Response({
+            'success': False,
+            'message': 'Invalid refresh token'
+        }, status=401)
+    
+    if is_token_revoked(claims):
+        return Response({
+            'success': False,
+            'message': 'Refresh token has been revoked'
+        }, status=401)
+    
+    user = User.objects.select_related(*TOKEN_RELATIONS).filter(id=claims['user_id']).first()
+    if user is None or not user.is_active:
+        return Response({
+            'success': False,
+            'message': 'User inactive or deleted'
+        }, status=401)
+    
+    # Revoking doubles as the claim on this refresh token: only one request
+    # can insert its jti
+    if not revoke_token(claims):
+        revoke_user_tokens(claims['user_id'])
+        return Response({
+            'success': False,
+            'message': 'Refresh token has been revoked'
+        }, status=401)
+    
+    return Response({
+        'success': True,
+        'token': generate_jwt_token(user),
+        'refresh_token': generate_refresh_token(user),
+        'expires_in': settings.JWT_ACCESS_TOKEN_LIFETIME,
+    })
+
+def add_verification_cache_headers(response, claims):
+    """Let the caller cache a verification result briefly, never past expiry"""
+    max_age = min(settings.JWT_VERIFY_CACHE_SECONDS, int(claims['exp'] - time.time()))
+    response['Cache-Control'] = f'private, max-age={max(0, max_age)}'
+    patch_vary_headers(response, ['Authorization'])
+    return response
+
 @api_view(['GET'])
-@permission_classes([IsAuthenticated])
-def get_profile_view(request):
-    user = request.user
+@authentication_classes([])
+@permission_classes([AllowAny])
+def token_verify_view(request):
+    """
+    Verify the bearer token for other services and return its claims.
     
+    Signature, expiry and revocation only: no database access.
+    """
+    token = get_bearer_token(request)
+    if token is None:
+        return Response({
+            'success': False,
+            'message': 'Authentication credentials were not provided.'
+        }, status=401)
+    
+    try:
+        claims = verify_token(token)
+    except AuthenticationFailed as e:
+        return Response({
+            'success': False,
+            'message': str(e.detail)
+        }, status=401)
+    
+    response = Response({
+        'success': True,
+        'claims': claims
+    })
+    return add_verification_cache_headers(response, claims)
+
+@csrf_exempt
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def token_verify_batch_view(request):
+    """Verify a list of tokens in one call; one result per token, in order"""
+    tokens = request.data.get('tokens')
+    if not isinstance(tokens, list) or not all(isinstance(token, str) for token in tokens):
+        return Response({
+            'success': False,
+            'message': 'Please provide a list of tokens'
+        }, status=400)
+    
+    if len(tokens) > settings.JWT_VERIFY_BATCH_LIMIT:
+        return Response({
+            'success': False,
+            'message': f'At most {settings.JWT_VERIFY_BATCH_LIMIT} tokens per request'
+        }, status=400)
+    
+    results = []
+    for claims, error in verify_tokens(tokens):
+        if error is None:
+            results.append({'valid': True, 'claims': claims})
+        else:
+            results.append({'valid': False, 'message': error})
+    
+    return Response({
+        'success': True,
+        'results': results
+    })
+
+@csrf_exempt
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def token_introspect_view(request):
+    """
+    Introspect a list of tokens in one call.
+    
+    Like token/verify/batch/, but also checks that each user still exists
+    and is active, loading all of them with a single query. One result per
+    token, in order.
+    """
+    tokens = request.data.get('tokens')
+    if not isinstance(tokens, list) or not all(isinstance(token, str) for token in tokens):
+        return Response({
+            'success': False,
+            'message': 'Please provide a list of tokens'
+        }, status=400)
+    
+    if len(tokens) > settings.JWT_VERIFY_BATCH_LIMIT:
+        return Response({
+            'success': False,
+            'message': f'At most {settings.JWT_VERIFY_BATCH_LIMIT} tokens per request'
+        }, status=400)
+    
+    results = []
+    for user, claims, error in JWTAuthentication().authenticate_credentials_batch(tokens):
+        if error is not None:
+            results.append({'active': False, 'message': error})
+            continue
+        results.append({
+            'active': True,
+            'claims': claims,
+            'user': {
+                'user_id': user.id,
+                'username': user.username,
+                'role_id': user.role_id,
+                'role': getattr(user.role, 'name', 'Regular User'),
+                'is_verified': user.is_verified,
+            }
+        })
+    
+    return Response({
+        'success': True,
+        'results': results
+    })
+
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def jwks_view(request):
+    """Public token signing keys, for services verifying tokens locally"""
+    response = Response(get_jwks())
+    response['Cache-Control'] = f'public, max-age={settings.JWT_JWKS_CACHE_SECONDS}'
+    return response
+
+PROFILE_RELATIONS = ('role', 'supplier', 'vendor', 'warehousemanager', 'driver')
+
+def build_profile_payload(user_id):
+    """Build the profile payload served by get_profile_view (cached per user version)"""
+    # Fresh row with the role and every role profile joined in one query
+    user = User.objects.select_related(*PROFILE_RELATIONS).get(id=user_id)
+    return profile_payload(user)
+
+async def abuild_profile_payload(user_id):
+    """Async variant of build_profile_payload"""
+    user = await User.objects.select_related(*PROFILE_RELATIONS).aget(id=user_id)
+    return profile_payload(user)
+
+def profile_payload(user):
+    """Profile payload of a user loaded with PROFILE_RELATIONS (no queries)"""
     # Get role-specific data if available
     role_data = {}
     role_id = getattr(user, 'role_id', 2)
     
     try:
         if role_id == 3:  # Supplier
-            supplier = Supplier.objects.get(user_id=user.id)
+            supplier = user.supplier
             role_data = {
                 'company_name': supplier.company_name,
                 'street_no': supplier.street_no,
@@ -331,20 +550,20 @@ def get_profile_view(request):
                 'updated_at': supplier.updated_at
             }
         elif role_id == 4:  # Vendor
-            vendor = Vendor.objects.get(user_id=user.id)
+            vendor = user.vendor
             role_data = {
                 'shop_name': vendor.shop_name,
                 'location': vendor.location,
                 'business_license': vendor.business_license
             }
         elif role_id == 5:  # Warehouse Manager
-            warehouse_manager = WarehouseManager.objects.get(user_id=user.id)
+            warehouse_manager = user.warehousemanager
             role_data = {
                 'warehouse_id': warehouse_manager.warehouse_id,
                 'department': warehouse_manager.department
             }
         elif role_id == 6:  # Driver
-            driver = Driver.objects.get(user_id=user.id)
+            driver = user.driver
             role_data = {
                 'license_number': driver.license_number,
                 'vehicle_type': driver.vehicle_type,
@@ -356,21 +575,38 @@ def get_profile_view(request):
         # No role-specific data found
         pass
     
-    return Response({
+    return {
+        'user_id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'role_id': role_id,
+        'role': getattr(user.role, 'name', 'Regular User'),
+        'is_verified': getattr(user, 'is_verified', False),
+        'phone': user.phone,  # Added phone field
+        'role_data': role_data
+    }
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_profile_view(request):
+    # The user's cache version changes with the user, their role profile and
+    # roles, so it validates the payload without building it
+    version = get_user_version(request.user.id)
+    etag = make_etag('profile', request.user.id, version)
+    response = not_modified(request, etag, private=True)
+    if response is not None:
+        return response
+    
+    # Served from the shared cache; no DB access unless the user changed
+    profile = get_cached_profile(request.user.id, build_profile_payload, version=version)
+    
+    response = Response({
         'success': True,
-        'user': {
-            'user_id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'first_name': user.first_name,
-            'last_name': user.last_name,
-            'role_id': role_id,
-            'role': getattr(user.role, 'name', 'Regular User'),
-            'is_verified': getattr(user, 'is_verified', False),
-            'phone': user.phone,  # Added phone field
-            'role_data': role_data
-        }
+        'user': profile
     })
+    return set_validators(response, etag, private=True)
 
 @api_view(['PUT'])
 @permission_classes([IsAuthenticated])
@@ -590,73 +826,117 @@ def admin_get_all_users(request):
         }, status=403)
     
     # Get query parameters for pagination
-    page = int(request.GET.get('page', 1))
-    limit = int(request.GET.get('limit', 10))
+    # Offset pagination (?page=N, the default) as before; sending ?cursor=
+    # (empty for the first page) switches to keyset pagination, whose cost
+    # does not grow with the page depth
+    keyset = 'cursor' in request.GET
+    cursor = request.GET.get('cursor')
     role_id = request.GET.get('role_id')
+    count_mode = request.GET.get('count', 'estimate' if keyset else 'exact')
+    try:
+        page = int(request.GET.get('page', 1))
+        limit = int(request.GET.get('limit', 10))
+    except ValueError:
+        page = limit = 0
+    if page < 1 or limit < 1:
+        return Response({
+            'success': False,
+            'message': 'page and limit must be positive integers'
+        }, status=400)
     
-    # Calculate offset
-    offset = (page - 1) * limit
+    if count_mode not in COUNT_MODES:
+        return Response({
+            'success': False,
+            'message': f"count must be one of: {', '.join(COUNT_MODES)}"
+        }, status=400)
     
-    # Query all users
-    users_query = User.objects.all()
+    # Query all users with the role and every role profile joined, so a page
+    # costs the same number of queries whatever its size
+    users_query = User.objects.select_related(
+        'role', 'supplier', 'vendor', 'warehousemanager', 'driver'
+    ).order_by('id')
     
     # Filter by role_id if provided
     if role_id:
         users_query = users_query.filter(role_id=role_id)
     
-    # Get total count for pagination
-    total_count = users_query.count()
+    # Get total count for pagination (exact, estimated or skipped)
+    total_count, total_is_estimate = count_queryset(users_query, count_mode)
     
-    # Get paginated users
-    users = users_query[offset:offset+limit]
-    
-    # Format user data
-    user_list = []
-    for user in users:
-        # Get role-specific data if available
-        role_data = {}
-        role_id = getattr(user, 'role_id', 2)
+    if not keyset:
+        # Offset pagination
+        offset = (page - 1) * limit
+        users = users_query[offset:offset+limit]
         
-        try:
-            if role_id == 3:  # Supplier
-                supplier = Supplier.objects.get(user_id=user.id)
-                role_data = {
-                    'company_name': supplier.company_name,
-                    'contact_number': supplier.contact_number,
-                }
-            elif role_id == 4:  # Vendor
-                vendor = Vendor.objects.get(user_id=user.id)
-                role_data = {
-                    'store_name': vendor.store_name,
-                    'business_address': vendor.business_address,
-                }
-            # Add other role-specific data retrieval
-        except:
-            pass
-            
-        user_list.append({
-            'user_id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'first_name': user.first_name,
-            'last_name': user.last_name,
-            'role_id': role_id,
-            'role': getattr(user.role, 'name', 'Regular User'),
-            'is_verified': getattr(user, 'is_verified', False),
-            'role_data': role_data
+        return Response({
+            'success': True,
+            'users': AdminUserSerializer(users, many=True).data,
+            'pagination': {
+                'total': total_count,
+                'page': page,
+                'limit': limit,
+                'pages': (total_count + limit - 1) // limit if total_count is not None else None  # Ceiling division
+            }
         })
     
+    try:
+        users, next_cursor = keyset_paginate(users_query, cursor, limit)
+    except InvalidCursor:
+        return Response({
+            'success': False,
+            'message': 'Invalid cursor'
+        }, status=400)
+    
     return Response({
         'success': True,
-        'users': user_list,
+        'users': AdminUserSerializer(users, many=True).data,
         'pagination': {
             'total': total_count,
-            'page': page,
+            'total_is_estimate': total_is_estimate,
             'limit': limit,
-            'pages': (total_count + limit - 1) // limit  # Ceiling division
+            'next_cursor': next_cursor
         }
     })
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def admin_bulk_register_view(request):
+    """
+    Admin endpoint registering a batch of users (same fields and rules as
+    register_view) with batched validation, hashing and inserts
+    
+    Body: {"users": [...], "all_or_nothing": false}. Invalid rows are
+    reported by index in ``errors``; with all_or_nothing no row is created
+    unless every row is valid.
+    """
+    if getattr(request.user, 'role_id', 0) != 1:
+        return Response({
+            'success': False,
+            'message': 'Permission denied'
+        }, status=403)
+    
+    rows = request.data.get('users')
+    if not isinstance(rows, list) or not rows:
+        return Response({
+            'success': False,
+            'message': 'Please provide a non-empty users list'
+        }, status=400)
+    if len(rows) > settings.PROVISIONING_BATCH_LIMIT:
+        return Response({
+            'success': False,
+            'message': f'At most {settings.PROVISIONING_BATCH_LIMIT} users per request'
+        }, status=400)
+    
+    result = provision_users(rows, all_or_nothing=request.data.get('all_or_nothing') is True)
+    created = len(result['users'])
+    
+    return Response({
+        'success': created > 0,
+        'message': f"Registered {created} of {len(rows)} users",
+        'users': result['users'],
+        'errors': result['errors']
+    }, status=201 if created else 400)
+
 @api_view(['PUT'])
 @permission_classes([IsAuthenticated])
 def admin_update_user(request, user_id):
@@ -788,6 +1068,37 @@ def admin_delete_user(request, user_id):
             'message': 'User not found'
         }, status=404)
 
+def db_connection_metrics():
+    """Acquisition timings, plus the psycopg pool's own stats when pooling"""
+    metrics = connection_metrics.snapshot()
+    pool = getattr(connection, 'pool', None)
+    if pool is not None:
+        metrics['pool'] = pool.get_stats()
+    return metrics
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def admin_metrics_view(request):
+    """Admin endpoint exposing this worker's cache, DB connection, password hashing and Kafka producer counters"""
+    admin = request.user
+    
+    # Check if user is admin (role_id = 1)
+    if getattr(admin, 'role_id', 0) != 1:
+        return Response({
+            'success': False,
+            'message': 'Permission denied'
+        }, status=403)
+    
+    return Response({
+        'success': True,
+        'metrics': {
+            'user_cache': user_cache.stats(),
+            'kafka_producer': supplier_producer.get_metrics(),
+            'db_connections': db_connection_metrics(),
+            'password_hashing': hash_pool.snapshot(),
+        }
+    })
+
 @api_view(['POST'])
 @authentication_classes([])
 @permission_classes([AllowAny])
@@ -852,21 +1163,18 @@ def register_supplier_view(request):
             'message': 'Email already exists'
         }, status=400)
     
-    # Create new user 
+    # Create new user with the Supplier role (3), which picks the password's
+    # hash profile
     user = User.objects.create_user(
         username=username,
         email=email,
         password=password,
         first_name=first_name,
         last_name=last_name,
-        phone=phone
+        phone=phone,
+        role_id=3
     )
     
-    # Set role_id to Supplier (3)
-    user.role_id = 3
-    user.save()
-
-    
     code = data.get('code', f"SUP-{user.id:03d}")
     
     # Create supplier profile
@@ -889,6 +1197,8 @@ def register_supplier_view(request):
         'success': True,
         'message': 'Supplier registered successfully',
         'token': token,
+        'refresh_token': generate_refresh_token(user),
+        'expires_in': settings.JWT_ACCESS_TOKEN_LIFETIME,
         'user': {
             'user_id': user.id,
             'username': user.username,
@@ -958,20 +1268,18 @@ def register_customer_view(request):
             'message': 'Email already exists'
         }, status=400)
     
-    # Create new user
+    # Create new user with the Vendor role (4), which picks the password's
+    # hash profile
     user = User.objects.create_user(
         username=username,
         email=email,
         password=password,
         first_name=first_name,
         last_name=last_name,
-        phone=phone
+        phone=phone,
+        role_id=4
     )
     
-    # Set role_id to Vendor (4)
-    user.role_id = 4
-    user.save()
-    
     # Create vendor profile
     vendor = Vendor.objects.create(
         user=user,
@@ -987,6 +1295,8 @@ def register_customer_view(request):
         'success': True,
         'message': 'Vendor registered successfully',
         'token': token,
+        'refresh_token': generate_refresh_token(user),
+        'expires_in': settings.JWT_ACCESS_TOKEN_LIFETIME,
         'user': {
             'user_id': user.id,
             'username': user.username,
@@ -996,6 +1306,25 @@ def register_customer_view(request):
         }
     })
 
+def driver_payload(driver):
+    """Driver list entry (driver loaded with select_related('user'))"""
+    return {
+        'user_id': driver.user.id,
+        'username': driver.user.username,
+        'vehicle_id': driver.vehicle_id,
+        'vehicle_type': driver.vehicle_type,
+        'license_number': driver.license_number
+    }
+
+# Columns of a driver list entry, for the streaming export
+DRIVER_EXPORT_FIELDS = {
+    'user_id': 'user_id',
+    'username': 'user__username',
+    'vehicle_id': 'vehicle_id',
+    'vehicle_type': 'vehicle_type',
+    'license_number': 'license_number',
+}
+
 @api_view(['GET'])
 @authentication_classes([])
 @permission_classes([AllowAny])
@@ -1003,23 +1332,88 @@ def get_all_drivers_view(request):
     """
     Get all drivers with their vehicle IDs, usernames, and user IDs
     Only accessible to authenticated users (may want to restrict further based on role)
+    
+    ?stream=ndjson or ?stream=json streams the list instead of building it
+    in memory (see accounts/streaming.py)
     """
+    stream_format = request.query_params.get('stream')
+    if stream_format is not None and stream_format not in STREAM_FORMATS:
+        return Response(invalid_stream_format(stream_format), status=400)
+    
+    # Answer 304 from the latest change and deletion before reading any driver
+    parts, last_modified = list_version(Driver, 'drivers')
+    etag = make_etag('drivers', stream_format, *parts)
+    response = not_modified(request, etag, last_modified)
+    if response is not None:
+        return response
+    
+    if stream_format is not None:
+        rows = iter_rows(Driver.objects.order_by('user_id'), DRIVER_EXPORT_FIELDS)
+        response = streaming_export(rows, stream_format, 'drivers', request=request)
+        return set_validators(response, etag, last_modified)
+    
     # Query all drivers with their related user information
     drivers = Driver.objects.select_related('user').all()
     
     # Format the response data
-    drivers_data = []
-    for driver in drivers:
-        drivers_data.append({
-            'user_id': driver.user.id,
-            'username': driver.user.username,
-            'vehicle_id': driver.vehicle_id,
-            'vehicle_type': driver.vehicle_type,
-            'license_number': driver.license_number
-        })
+    drivers_data = [driver_payload(driver) for driver in drivers]
     
-    return Response({
+    response = Response({
         'success': True,
         'count': len(drivers_data),
         'drivers': drivers_data
-    })
\ No newline at end of file
+    })
+    return set_validators(response, etag, last_modified)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def sync_changes_view(request, resource):
+    """
+    Rows of a resource changed or deleted since a watermark
+    
+    Start with no ``since`` for a full sync, then pass back the returned
+    ``watermark``; repeat immediately while ``has_more`` is true. Changed
+    rows may be sent again (upsert them by user_id); ``deleted`` lists the
+    user ids removed since the watermark.
+    """
+    sync_resource = SYNC_RESOURCES.get(resource)
+    if sync_resource is None:
+        return Response({
+            'success': False,
+            'message': f"Unknown resource '{resource}'. Use one of: {', '.join(SYNC_RESOURCES)}"
+        }, status=404)
+    
+    if sync_resource.admin_only and getattr(request.user, 'role_id', 0) != 1:
+        return Response({
+            'success': False,
+            'message': 'Permission denied'
+        }, status=403)
+    
+    try:
+        limit = min(int(request.GET.get('limit', settings.SYNC_PAGE_SIZE)), settings.SYNC_MAX_PAGE_SIZE)
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        return Response({
+            'success': False,
+            'message': 'limit must be a positive integer'
+        }, status=400)
+    
+    try:
+        changes = get_changes(sync_resource, request.GET.get('since') or None, limit)
+    except WatermarkExpired:
+        return Response({
+            'success': False,
+            'message': 'Watermark is older than the deletion history; sync again without since'
+        }, status=410)
+    except InvalidCursor:
+        return Response({
+            'success': False,
+            'message': 'Invalid watermark'
+        }, status=400)
+    
+    return Response({
+        'success': True,
+        'resource': resource,
+        **changes
+    })
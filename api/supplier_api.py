@@ -6,14 +6,39 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.db.models import Q
+from accounts.conditional import list_version, make_etag, not_modified, set_validators
 from accounts.models import User, Supplier
+from accounts.pagination import KeysetCursorPagination
 from accounts.serializers import SupplierSerializer, SupplierDetailSerializer
+from accounts.streaming import STREAM_FORMATS, invalid_stream_format, streaming_export
 from utils.kafka_utils import supplier_producer
+from functools import partial
 import logging
 
 logger = logging.getLogger(__name__)
 
+# SupplierSerializer's output fields, read with values_list for the export
+SUPPLIER_USER_FIELDS = ['id', 'username', 'email', 'first_name', 'last_name', 'is_active']
+SUPPLIER_FIELDS = [
+    'company_name', 'code', 'business_type', 'tax_id',
+    'compliance_score', 'active', 'created_at', 'updated_at'
+]
+
+
+def supplier_export_rows(queryset):
+    """Suppliers shaped like SupplierSerializer output, without model instances"""
+    lookups = [f'user__{field}' for field in SUPPLIER_USER_FIELDS] + SUPPLIER_FIELDS
+    split = len(SUPPLIER_USER_FIELDS)
+    rows = queryset.values_list(*lookups).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+    for row in rows:
+        data = {'user': dict(zip(SUPPLIER_USER_FIELDS, row[:split]))}
+        data.update(zip(SUPPLIER_FIELDS, row[split:]))
+        yield data
+
 
 class SupplierViewSet(viewsets.ModelViewSet):
     """
@@ -21,6 +46,7 @@ class SupplierViewSet(viewsets.ModelViewSet):
     """
     permission_classes = [AllowAny]
     serializer_class = SupplierSerializer
+    pagination_class = KeysetCursorPagination
     
     def get_queryset(self):
         """
@@ -44,16 +70,70 @@ class SupplierViewSet(viewsets.ModelViewSet):
             return SupplierDetailSerializer
         return SupplierSerializer
     
+    def list(self, request, *args, **kwargs):
+        """
+        List suppliers; ?stream=ndjson or ?stream=json streams every
+        matching supplier instead of building the list in memory
+        """
+        stream_format = request.query_params.get('stream')
+        if stream_format is not None and stream_format not in STREAM_FORMATS:
+            return Response(invalid_stream_format(stream_format), status=status.HTTP_400_BAD_REQUEST)
+        
+        # The query string selects filters, page and format
+        parts, last_modified = list_version(Supplier, 'suppliers')
+        etag = make_etag('suppliers', request.query_params.urlencode(), *parts)
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+        
+        if stream_format is None:
+            response = super().list(request, *args, **kwargs)
+        else:
+            rows = supplier_export_rows(self.get_queryset().order_by('pk'))
+            response = streaming_export(rows, stream_format, request=request)
+        return set_validators(response, etag, last_modified)
+    
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_detail(request, partial(super().retrieve, request, *args, **kwargs))
+    
+    def conditional_detail(self, request, build):
+        """
+        Answer 304 from the supplier's updated_at (one indexed lookup) when
+        the client's copy is current; otherwise ``build()`` the response
+        """
+        try:
+            updated_at = self.get_queryset().filter(pk=self.kwargs['pk']).values_list(
+                'updated_at', flat=True
+            ).first()
+        except (TypeError, ValueError, ValidationError):
+            updated_at = None
+        if updated_at is None:
+            # Let the regular lookup produce the 404
+            return build()
+        
+        etag = make_etag('supplier', self.action, self.kwargs['pk'], updated_at.isoformat())
+        response = not_modified(request, etag, updated_at)
+        if response is not None:
+            return response
+        
+        response = build()
+        if response.status_code == status.HTTP_200_OK:
+            set_validators(response, etag, updated_at)
+        return response
+    
     def create(self, request, *args, **kwargs):
         """
         Create a new supplier
         """
-        response = super().create(request, *args, **kwargs)
-        
-        # Publish supplier created event to Kafka
-        if response.status_code == status.HTTP_201_CREATED:
-            supplier_id = response.data.get('user', {}).get('id')
-            supplier_producer.publish_supplier_created(supplier_id, response.data)
+        # The event is committed together with the supplier (outbox) or only
+        # sent once the transaction commits
+        with transaction.atomic():
+            response = super().create(request, *args, **kwargs)
+            
+            # Publish supplier created event to Kafka
+            if response.status_code == status.HTTP_201_CREATED:
+                supplier_id = response.data.get('user', {}).get('id')
+                supplier_producer.publish_supplier_created(supplier_id, response.data)
             
         return response
     
@@ -61,12 +141,13 @@ class SupplierViewSet(viewsets.ModelViewSet):
         """
         Update an existing supplier
         """
-        response = super().update(request, *args, **kwargs)
-        
-        # Publish supplier updated event to Kafka
-        if response.status_code == status.HTTP_200_OK:
-            supplier_id = response.data.get('user', {}).get('id')
-            supplier_producer.publish_supplier_updated(supplier_id, response.data)
+        with transaction.atomic():
+            response = super().update(request, *args, **kwargs)
+            
+            # Publish supplier updated event to Kafka
+            if response.status_code == status.HTTP_200_OK:
+                supplier_id = response.data.get('user', {}).get('id')
+                supplier_producer.publish_supplier_updated(supplier_id, response.data)
             
         return response
     
@@ -74,14 +155,15 @@ class SupplierViewSet(viewsets.ModelViewSet):
         """
         Delete a supplier
         """
-        instance = self.get_object()
-        supplier_id = instance.user.id
-        
-        response = super().destroy(request, *args, **kwargs)
-        
-        # Publish supplier deleted event to Kafka
-        if response.status_code == status.HTTP_204_NO_CONTENT:
-            supplier_producer.publish_supplier_deleted(supplier_id)
+        with transaction.atomic():
+            instance = self.get_object()
+            supplier_id = instance.user.id
+            
+            response = super().destroy(request, *args, **kwargs)
+            
+            # Publish supplier deleted event to Kafka
+            if response.status_code == status.HTTP_204_NO_CONTENT:
+                supplier_producer.publish_supplier_deleted(supplier_id)
             
         return response
     
@@ -98,6 +180,9 @@ class SupplierViewSet(viewsets.ModelViewSet):
         """
         Get detailed information about a supplier including compliance score
         """
+        return self.conditional_detail(request, self.info_response)
+    
+    def info_response(self):
         try:
             supplier = self.get_object()
             serializer = self.get_serializer(supplier)
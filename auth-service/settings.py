@@ -29,6 +29,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'accounts.middleware.DBConnectionTimingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -58,18 +59,64 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'auth-service.wsgi.application'
 
+# Under ASGI (uvicorn workers) each request runs its sync code in a thread
+# of its own, so persistent connections would pile up instead of being
+# reused: close them after each request there, or use DATABASE_POOL
+ASGI_WORKERS = os.getenv("GUNICORN_WORKER_CLASS", "gthread") == "uvicorn"
+
 # Database
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql",
+        # Stock PostgreSQL backend with connection acquisition timing
+        "ENGINE": "utils.db.postgresql",
         "NAME": os.getenv("DATABASE_NAME", "postgres"),
         "USER": os.getenv("DATABASE_USER", "postgres"),
         "PASSWORD": os.getenv("DATABASE_PASSWORD", "postgres"),
         "HOST": os.getenv("DATABASE_HOST", "db"),  # important!
         "PORT": os.getenv("DATABASE_PORT", "5432"),
+        # Keep connections open between requests (seconds, 0 = close after
+        # each request) and check them before reuse
+        "CONN_MAX_AGE": int(os.getenv("DATABASE_CONN_MAX_AGE", 0 if ASGI_WORKERS else 60)),
+        "CONN_HEALTH_CHECKS": os.getenv("DATABASE_CONN_HEALTH_CHECKS", "True") == "True",
     }
 }
 
+# psycopg 3 connection pool, one per worker process. Size max_size to the
+# worker's thread count (GUNICORN_THREADS); workers x max_size must stay below
+# Postgres' max_connections.
+if os.getenv("DATABASE_POOL", "False") == "True":
+    DATABASES["default"]["CONN_MAX_AGE"] = 0  # the pool owns connection lifetime
+    DATABASES["default"]["OPTIONS"] = {
+        "pool": {
+            "min_size": int(os.getenv("DATABASE_POOL_MIN_SIZE", 2)),
+            "max_size": int(os.getenv("DATABASE_POOL_MAX_SIZE", 8)),
+            # Seconds a request waits for a free connection before failing
+            "timeout": float(os.getenv("DATABASE_POOL_TIMEOUT", 10)),
+        },
+    }
+
+# Cache
+# Shared Redis cache when REDIS_URL is set so all workers see the same entries;
+# otherwise a pluggable local backend (locmem by default, or e.g.
+# django.core.cache.backends.filebased.FileBasedCache for tests)
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+            "KEY_PREFIX": "user-service",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+            "LOCATION": os.getenv("CACHE_LOCATION", "user-service"),
+            "KEY_PREFIX": "user-service",
+        }
+    }
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -86,6 +133,61 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing. Every hasher listed here can verify stored hashes; which
+# one (and at what cost) new hashes use is chosen per role from the profiles
+# below (see accounts/hashers.py). Argon2 needs argon2-cffi.
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+# Cost profiles: a hasher plus the parameters it is run with. Pick values
+# from `manage.py benchmark_hashers`, which reports logins/s per core.
+PASSWORD_HASH_PROFILES = {
+    # Django's defaults (PBKDF2-SHA256, 1,000,000 iterations)
+    'pbkdf2': {
+        'hasher': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    },
+    # Argon2id, 100 MiB, for accounts with wide access (admins)
+    'argon2': {
+        'hasher': 'django.contrib.auth.hashers.Argon2PasswordHasher',
+        'time_cost': int(os.getenv('ARGON2_TIME_COST', 2)),
+        'memory_cost': int(os.getenv('ARGON2_MEMORY_COST', 102400)),
+        'parallelism': int(os.getenv('ARGON2_PARALLELISM', 8)),
+    },
+    # Argon2id at the OWASP minimum (19 MiB, 2 passes) for high-volume
+    # logins such as drivers at shift start
+    'argon2-interactive': {
+        'hasher': 'django.contrib.auth.hashers.Argon2PasswordHasher',
+        'time_cost': int(os.getenv('ARGON2_INTERACTIVE_TIME_COST', 2)),
+        'memory_cost': int(os.getenv('ARGON2_INTERACTIVE_MEMORY_COST', 19456)),
+        'parallelism': int(os.getenv('ARGON2_INTERACTIVE_PARALLELISM', 1)),
+    },
+    # scrypt, N=2^14 r=8 p=1 (16 MiB)
+    'scrypt': {
+        'hasher': 'django.contrib.auth.hashers.ScryptPasswordHasher',
+        'work_factor': int(os.getenv('SCRYPT_WORK_FACTOR', 2 ** 14)),
+        'block_size': int(os.getenv('SCRYPT_BLOCK_SIZE', 8)),
+        'parallelism': int(os.getenv('SCRYPT_PARALLELISM', 1)),
+    },
+}
+PASSWORD_HASH_DEFAULT_PROFILE = os.getenv('PASSWORD_HASH_DEFAULT_PROFILE', 'pbkdf2')
+# Per-role overrides as comma-separated role_id:profile pairs, e.g.
+# "1:argon2,6:argon2-interactive". Users are rehashed with their role's
+# profile the next time they log in.
+PASSWORD_HASH_ROLE_PROFILES = {
+    int(role_id): profile
+    for role_id, profile in (
+        pair.split(':') for pair in os.getenv('PASSWORD_HASH_ROLE_PROFILES', '').split(',') if pair
+    )
+}
+# Hash and verify passwords in a pool of this many processes per worker
+# instead of on the request thread (0 = inline). At most MAX_PENDING jobs are
+# queued per worker (0 = 4 per pool process); further requests wait.
+PASSWORD_HASH_POOL_WORKERS = int(os.getenv('PASSWORD_HASH_POOL_WORKERS', 0))
+PASSWORD_HASH_POOL_MAX_PENDING = int(os.getenv('PASSWORD_HASH_POOL_MAX_PENDING', 0))
+
 # Internationalization
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
@@ -101,6 +203,9 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Custom User Model
 AUTH_USER_MODEL = 'accounts.User'
 
+# Loads the user with the role and role profiles needed for token claims
+AUTHENTICATION_BACKENDS = ['accounts.backends.ProfileModelBackend']
+
 FRONTEND_URL = 'http://localhost:3000'
 
 # REST Framework settings
@@ -114,17 +219,92 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'accounts.renderers.FastJSONRenderer',
     ],
     'EXCEPTION_HANDLER': 'accounts.utils.custom_exception_handler',
 }
 
+# Streaming exports (?stream=ndjson|json on the driver and supplier lists):
+# rows fetched per server-side cursor round trip, and rows per written chunk
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', 2000))
+EXPORT_BATCH_ROWS = int(os.getenv('EXPORT_BATCH_ROWS', 200))
+# Incremental sync (sync/<resource>/?since=<watermark>): rows per page,
+# how long rows are held back so transactions in flight can commit, and
+# how long tombstones of deleted rows are kept (older watermarks must
+# resync from scratch)
+SYNC_PAGE_SIZE = int(os.getenv('SYNC_PAGE_SIZE', 1000))
+SYNC_MAX_PAGE_SIZE = int(os.getenv('SYNC_MAX_PAGE_SIZE', 10000))
+SYNC_SETTLE_SECONDS = int(os.getenv('SYNC_SETTLE_SECONDS', 5))
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.getenv('SYNC_TOMBSTONE_RETENTION_DAYS', 30))
+# Bulk registration (admin/users/bulk/, manage.py provision_users): users per
+# request, threads hashing passwords when the hashing pool is off (0 = one
+# per CPU), and rows per INSERT
+PROVISIONING_BATCH_LIMIT = int(os.getenv('PROVISIONING_BATCH_LIMIT', 1000))
+PROVISIONING_HASH_THREADS = int(os.getenv('PROVISIONING_HASH_THREADS', 0))
+PROVISIONING_INSERT_BATCH_SIZE = int(os.getenv('PROVISIONING_INSERT_BATCH_SIZE', 1000))
+# Freshness of ETag/Last-Modified responses (profile, drivers, suppliers);
+# 0 makes clients revalidate every time and get 304 while unchanged
+CONDITIONAL_GET_MAX_AGE = int(os.getenv('CONDITIONAL_GET_MAX_AGE', 0))
+# How long filtered list counts are reused when ?count=estimate
+PAGINATION_COUNT_CACHE_TTL = int(os.getenv('PAGINATION_COUNT_CACHE_TTL', 60))  # seconds
+
+# JWT settings
+# Build request.user from the token claims instead of loading it from the DB
+# (needs REDIS_URL: revocation markers must be visible to every worker)
+JWT_STATELESS_AUTH = os.getenv('JWT_STATELESS_AUTH', 'False') == 'True'
+# Revocation markers must outlive the tokens they revoke (7 days)
+JWT_REVOCATION_TTL = int(os.getenv('JWT_REVOCATION_TTL', 7 * 24 * 60 * 60))
+# Token lifetimes in seconds. Access tokens are short-lived; clients renew
+# them with the refresh token at token/refresh/
+JWT_ACCESS_TOKEN_LIFETIME = int(os.getenv('JWT_ACCESS_TOKEN_LIFETIME', 15 * 60))
+JWT_REFRESH_TOKEN_LIFETIME = int(os.getenv('JWT_REFRESH_TOKEN_LIFETIME', 7 * 24 * 60 * 60))
+# How often each worker pulls new revoked jtis from the database
+JWT_DENY_LIST_SYNC_SECONDS = float(os.getenv('JWT_DENY_LIST_SYNC_SECONDS', 5))
+# Asymmetric token signing: directory of <kid>.pem private keys (RSA for
+# RS256, Ed25519 for EdDSA) and the kid new tokens are signed with. Unset
+# keeps HS256 with SECRET_KEY.
+JWT_KEYS_DIR = os.getenv('JWT_KEYS_DIR') or None
+JWT_ACTIVE_KID = os.getenv('JWT_ACTIVE_KID')
+# Keep accepting HS256 tokens issued before the switch to a key ring
+JWT_ACCEPT_HS256 = os.getenv('JWT_ACCEPT_HS256', 'True') == 'True'
+JWT_JWKS_CACHE_SECONDS = int(os.getenv('JWT_JWKS_CACHE_SECONDS', 300))
+# How long callers may cache a token/verify/ result (revocations can take
+# this long to reach them)
+JWT_VERIFY_CACHE_SECONDS = int(os.getenv('JWT_VERIFY_CACHE_SECONDS', 30))
+# Maximum tokens per token/verify/batch/ request
+JWT_VERIFY_BATCH_LIMIT = int(os.getenv('JWT_VERIFY_BATCH_LIMIT', 100))
+
+# Per-worker LRU cache of authenticated users (0 disables it). Each hit is
+# checked against the user's version in the shared cache, so changes made in
+# other workers are seen at once; the TTL only bounds memory
+AUTH_USER_CACHE_SIZE = int(os.getenv('AUTH_USER_CACHE_SIZE', 10000))
+AUTH_USER_CACHE_TTL = int(os.getenv('AUTH_USER_CACHE_TTL', 60))  # seconds
+# Lifetime of users and profile payloads in the shared cache
+AUTH_SHARED_CACHE_TTL = int(os.getenv('AUTH_SHARED_CACHE_TTL', 300))  # seconds
+
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True  # For development only
 CORS_ALLOW_CREDENTIALS = True
 
 KAFKA_BOOTSTRAP_SERVERS = os.environ.get('KAFKA_BOOTSTRAP_SERVERS', 'localhost:9093')
 KAFKA_SUPPLIER_EVENTS_TOPIC = os.environ.get('KAFKA_SUPPLIER_EVENTS_TOPIC', 'supplier-events')
+# Kafka client library: 'kafka-python' or 'confluent-kafka' (librdkafka)
+KAFKA_PRODUCER_BACKEND = os.environ.get('KAFKA_PRODUCER_BACKEND', 'kafka-python')
+# Message value encoding: json, or binary (schema-based, see utils/event_schema.py)
+KAFKA_EVENT_FORMAT = os.environ.get('KAFKA_EVENT_FORMAT', 'json')
+# Write supplier events to the outbox table (published by manage.py relay_outbox)
+KAFKA_SUPPLIER_OUTBOX = os.environ.get('KAFKA_SUPPLIER_OUTBOX', 'False') == 'True'
+# 'sync' waits for the broker on every publish; 'async' queues the event and
+# sends it from a background thread
+KAFKA_PUBLISH_MODE = os.environ.get('KAFKA_PUBLISH_MODE', 'sync')
+KAFKA_LINGER_MS = int(os.environ.get('KAFKA_LINGER_MS', 5))
+KAFKA_BATCH_SIZE = int(os.environ.get('KAFKA_BATCH_SIZE', 64 * 1024))  # bytes
+KAFKA_COMPRESSION_TYPE = os.environ.get('KAFKA_COMPRESSION_TYPE') or None  # gzip, snappy, lz4, zstd
+KAFKA_QUEUE_MAX_SIZE = int(os.environ.get('KAFKA_QUEUE_MAX_SIZE', 10000))
+# What to do when the async queue is full: 'block', 'drop' or 'spill' to disk
+KAFKA_QUEUE_FULL_POLICY = os.environ.get('KAFKA_QUEUE_FULL_POLICY', 'block')
+KAFKA_QUEUE_BLOCK_TIMEOUT = float(os.environ.get('KAFKA_QUEUE_BLOCK_TIMEOUT', 1.0))  # seconds
+KAFKA_SPILL_PATH = os.environ.get('KAFKA_SPILL_PATH', os.path.join(BASE_DIR, 'kafka-spill.jsonl'))
 
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATIC_URL = '/static/'
@@ -4,6 +4,8 @@ from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from accounts import views
+
 # Swagger schema view setup
 schema_view = get_schema_view(
     openapi.Info(
@@ -20,6 +22,7 @@ schema_view = get_schema_view(
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('.well-known/jwks.json', views.jwks_view, name='jwks'),
     path('api/v1/', include('accounts.urls')),
     path('api/v1/', include('api.urls')),
 
@@ -11,5 +11,11 @@ python manage.py init_roles
 echo "Collecting static files..."
 python manage.py collectstatic --noinput --clear
 
-echo "Starting server on port ${DJANGO_PORT}..."
-exec python manage.py runserver 0.0.0.0:${DJANGO_PORT}
+if [ "${DJANGO_SERVER:-gunicorn}" = "runserver" ]; then
+    echo "Starting development server on port ${DJANGO_PORT}..."
+    exec python manage.py runserver 0.0.0.0:${DJANGO_PORT}
+fi
+
+# Workers, threads and worker class are configured in gunicorn.conf.py
+echo "Starting gunicorn (${GUNICORN_WORKER_CLASS:-gthread} workers) on port ${DJANGO_PORT}..."
+exec gunicorn --config gunicorn.conf.py
@@ -0,0 +1,72 @@
+"""
+Gunicorn configuration for the Auth Service
+
+Loaded automatically when gunicorn is started from the project root. Every
+setting can be overridden through the environment:
+
+- GUNICORN_WORKER_CLASS: gthread (default), sync or uvicorn (ASGI)
+- GUNICORN_WORKERS / GUNICORN_THREADS: default to a count based on the CPUs
+  available to the container
+- GUNICORN_PRELOAD: import the app once in the master before forking
+- GUNICORN_MAX_REQUESTS / GUNICORN_MAX_REQUESTS_JITTER: recycle workers
+- GUNICORN_KEEPALIVE, GUNICORN_TIMEOUT, GUNICORN_GRACEFUL_TIMEOUT (seconds)
+"""
+
+import os
+
+
+def cpu_count():
+    """CPUs this process may run on (respects container CPU sets)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+WORKER_CLASSES = {
+    'sync': ('sync', 'auth-service.wsgi:application'),
+    'gthread': ('gthread', 'auth-service.wsgi:application'),
+    'uvicorn': ('uvicorn.workers.UvicornWorker', 'auth-service.asgi:application'),
+}
+
+worker_type = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+if worker_type not in WORKER_CLASSES:
+    raise RuntimeError(f"Unknown GUNICORN_WORKER_CLASS: {worker_type}")
+worker_class, wsgi_app = WORKER_CLASSES[worker_type]
+
+cpus = cpu_count()
+if worker_type == 'sync':
+    # Blocking workers sit idle during DB/Kafka/Redis I/O, so oversubscribe
+    default_workers, default_threads = 2 * cpus + 1, 1
+elif worker_type == 'gthread':
+    # Threads cover the I/O waits; one process per CPU for the hashing and
+    # serialization work that holds the GIL
+    default_workers, default_threads = cpus + 1, 4
+else:
+    # One event loop per CPU
+    default_workers, default_threads = cpus, 1
+
+workers = int(os.environ.get('GUNICORN_WORKERS', default_workers))
+threads = int(os.environ.get('GUNICORN_THREADS', default_threads))
+
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('DJANGO_PORT', '8000')}")
+
+# Share the imported app (settings, URL conf, serializers) copy-on-write
+# between workers and fail fast on import errors. The Kafka producer and
+# cache clients connect lazily, so nothing is opened before the fork.
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'True') == 'True'
+
+# Recycle workers to bound memory growth; the jitter keeps them from all
+# restarting at once
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 200))
+
+# Keep-alive must outlive the load balancer's idle timeout in front of us
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 75))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+backlog = int(os.environ.get('GUNICORN_BACKLOG', 2048))
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-') or None
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
@@ -0,0 +1,93 @@
+"""
+Database connection instrumentation.
+
+``utils.db.postgresql`` is the PostgreSQL backend with connection acquisition
+timed: opening a new connection, or checking one out of the psycopg pool when
+``DATABASE_POOL`` is on. Reused persistent connections cost nothing and are
+not recorded.
+
+Timings are aggregated per worker in ``connection_metrics`` and per request
+through ``start_request``/``end_request`` (see
+``accounts.middleware.DBConnectionTimingMiddleware``).
+"""
+
+import contextvars
+import threading
+from collections import deque
+
+_request_timer = contextvars.ContextVar('db_request_timer', default=None)
+
+
+class RequestTimer:
+    """Connection acquisition time accumulated during one request"""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.acquisitions = 0
+
+
+class ConnectionMetrics:
+    """Thread-safe connection acquisition counters and wait time samples"""
+
+    def __init__(self, samples=1000):
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=samples)
+        self.counters = {
+            'requests': 0,
+            'requests_with_acquire': 0,
+            'acquisitions': 0,
+            'failed': 0,
+        }
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def record_acquire(self, seconds):
+        with self._lock:
+            self.counters['acquisitions'] += 1
+            self._waits.append(seconds)
+
+    def snapshot(self):
+        """Current counters plus acquisition wait percentiles in milliseconds"""
+        with self._lock:
+            waits = sorted(self._waits)
+            data = dict(self.counters)
+
+        def percentile(p):
+            if not waits:
+                return None
+            index = min(len(waits) - 1, int(round(p * (len(waits) - 1))))
+            return round(waits[index] * 1000, 3)
+
+        data['acquire_ms'] = {
+            'p50': percentile(0.50),
+            'p99': percentile(0.99),
+            'max': percentile(1.0),
+        }
+        return data
+
+
+connection_metrics = ConnectionMetrics()
+
+
+def record_acquire(seconds):
+    """Called by the backend each time a connection is opened or checked out"""
+    connection_metrics.record_acquire(seconds)
+    timer = _request_timer.get()
+    if timer is not None:
+        timer.seconds += seconds
+        timer.acquisitions += 1
+
+
+def start_request():
+    """Start accumulating acquisition time; returns ``(timer, token)``"""
+    timer = RequestTimer()
+    return timer, _request_timer.set(timer)
+
+
+def end_request(timer, token):
+    _request_timer.reset(token)
+    connection_metrics.incr('requests')
+    if timer.acquisitions:
+        connection_metrics.incr('requests_with_acquire')
@@ -0,0 +1,19 @@
+import time
+
+from django.db.backends.postgresql import base
+
+from utils.db import connection_metrics, record_acquire
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL backend that times every connection open or pool checkout"""
+
+    def get_new_connection(self, conn_params):
+        started_at = time.perf_counter()
+        try:
+            connection = super().get_new_connection(conn_params)
+        except Exception:
+            connection_metrics.incr('failed')
+            raise
+        record_acquire(time.perf_counter() - started_at)
+        return connection
@@ -0,0 +1,320 @@
+"""
+Compact binary encoding for supplier events
+
+Messages use the Confluent wire format: a zero magic byte, a 4-byte
+big-endian schema id, then the record body encoded Avro-style:
+
+- fields are written in schema order without their names
+- ``long`` values are zig-zag varints, ``double`` values are 8 bytes
+  little-endian, and strings are a varint length followed by UTF-8 bytes
+- ``timestamp`` fields carry epoch microseconds instead of ISO 8601 strings
+- a union (a list of types) is a varint branch index followed by the value
+
+Schemas live in a local registry keyed by id, standing in for a schema
+registry service. Consumers need the same registry to decode. Any message
+that does not fit its schema is sent as JSON instead, and ``decode_event``
+accepts both formats.
+"""
+
+from datetime import datetime, timezone
+import struct
+
+from utils import json_utils
+
+MAGIC_BYTE = 0
+HEADER = struct.Struct('>bI')
+DOUBLE = struct.Struct('<d')
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class SchemaMismatch(ValueError):
+    """The value does not fit the schema it is encoded with"""
+
+
+SUPPLIER_USER_SCHEMA = {
+    'type': 'record',
+    'name': 'SupplierUser',
+    'fields': [
+        {'name': 'id', 'type': 'long'},
+        {'name': 'username', 'type': 'string'},
+        {'name': 'email', 'type': 'string'},
+        {'name': 'first_name', 'type': 'string'},
+        {'name': 'last_name', 'type': 'string'},
+        {'name': 'is_active', 'type': 'boolean'},
+    ],
+}
+
+SUPPLIER_SCHEMA = {
+    'type': 'record',
+    'name': 'Supplier',
+    'fields': [
+        {'name': 'user', 'type': SUPPLIER_USER_SCHEMA},
+        {'name': 'company_name', 'type': 'string'},
+        {'name': 'code', 'type': 'string'},
+        {'name': 'business_type', 'type': 'string'},
+        {'name': 'tax_id', 'type': 'string'},
+        {'name': 'compliance_score', 'type': 'double'},
+        {'name': 'active', 'type': 'boolean'},
+        {'name': 'created_at', 'type': ['null', 'timestamp']},
+        {'name': 'updated_at', 'type': ['null', 'timestamp']},
+    ],
+}
+
+
+def envelope_schema(name, payload_schema):
+    """The ``build_message`` envelope around a payload schema"""
+    return {
+        'type': 'record',
+        'name': name,
+        'fields': [
+            {'name': 'event_type', 'type': 'string'},
+            {'name': 'timestamp', 'type': 'long'},
+            {'name': 'payload', 'type': payload_schema},
+        ],
+    }
+
+
+# Varints
+
+def write_long(buf, value):
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise SchemaMismatch(f'Expected an integer, got {value!r}')
+    value = (value << 1) ^ (value >> 63)  # zig-zag
+    while value > 0x7F:
+        buf.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buf.append(value)
+
+
+def read_long(data, pos):
+    shift = result = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            break
+        shift += 7
+    return (result >> 1) ^ -(result & 1), pos
+
+
+# Encoders and decoders are compiled once per schema into closures
+
+def _string_encoder(buf, value):
+    if not isinstance(value, str):
+        raise SchemaMismatch(f'Expected a string, got {value!r}')
+    raw = value.encode('utf-8')
+    write_long(buf, len(raw))
+    buf += raw
+
+
+def _string_decoder(data, pos):
+    length, pos = read_long(data, pos)
+    end = pos + length
+    return bytes(data[pos:end]).decode('utf-8'), end
+
+
+def _boolean_encoder(buf, value):
+    if not isinstance(value, bool):
+        raise SchemaMismatch(f'Expected a boolean, got {value!r}')
+    buf.append(1 if value else 0)
+
+
+def _boolean_decoder(data, pos):
+    return data[pos] == 1, pos + 1
+
+
+def _double_encoder(buf, value):
+    if not isinstance(value, (int, float)) or isinstance(value, bool):
+        raise SchemaMismatch(f'Expected a number, got {value!r}')
+    buf += DOUBLE.pack(value)
+
+
+def _double_decoder(data, pos):
+    return DOUBLE.unpack_from(data, pos)[0], pos + DOUBLE.size
+
+
+def _timestamp_encoder(buf, value):
+    """ISO 8601 string (as rendered by DRF) or aware datetime -> epoch micros"""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            raise SchemaMismatch(f'Expected an ISO 8601 timestamp, got {value!r}')
+    if not isinstance(value, datetime) or value.tzinfo is None:
+        raise SchemaMismatch(f'Expected an aware timestamp, got {value!r}')
+    delta = value - EPOCH
+    write_long(buf, (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds)
+
+
+def _timestamp_decoder(data, pos):
+    micros, pos = read_long(data, pos)
+    seconds, micros = divmod(micros, 1000000)
+    value = datetime.fromtimestamp(seconds, timezone.utc).replace(microsecond=micros)
+    # Same rendering as DRF's DateTimeField with USE_TZ and UTC
+    return value.isoformat().replace('+00:00', 'Z'), pos
+
+
+PRIMITIVES = {
+    'long': (write_long, read_long),
+    'string': (_string_encoder, _string_decoder),
+    'boolean': (_boolean_encoder, _boolean_decoder),
+    'double': (_double_encoder, _double_decoder),
+    'timestamp': (_timestamp_encoder, _timestamp_decoder),
+}
+
+
+def compile_schema(schema):
+    """Return ``(encode(buf, value), decode(data, pos) -> (value, pos))``"""
+    if isinstance(schema, str):
+        if schema == 'null':
+            return _null_encoder, _null_decoder
+        if schema not in PRIMITIVES:
+            raise ValueError(f'Unknown schema type: {schema}')
+        return PRIMITIVES[schema]
+    if isinstance(schema, list):
+        return _compile_union(schema)
+    if schema.get('type') == 'record':
+        return _compile_record(schema)
+    raise ValueError(f'Unsupported schema: {schema!r}')
+
+
+def _null_encoder(buf, value):
+    if value is not None:
+        raise SchemaMismatch(f'Expected null, got {value!r}')
+
+
+def _null_decoder(data, pos):
+    return None, pos
+
+
+def _compile_union(branches):
+    # Only optional values (['null', T]) are needed for now
+    if len(branches) != 2 or branches[0] != 'null':
+        raise ValueError(f'Unsupported union: {branches!r}')
+    encode_value, decode_value = compile_schema(branches[1])
+
+    def encode(buf, value):
+        if value is None:
+            buf.append(0)
+        else:
+            buf.append(2)  # zig-zag varint for branch 1
+            encode_value(buf, value)
+
+    def decode(data, pos):
+        if data[pos] == 0:
+            return None, pos + 1
+        return decode_value(data, pos + 1)
+
+    return encode, decode
+
+
+def _compile_record(schema):
+    fields = [(field['name'],) + compile_schema(field['type']) for field in schema['fields']]
+    names = frozenset(name for name, _, _ in fields)
+    record_name = schema['name']
+
+    def encode(buf, value):
+        if not isinstance(value, dict):
+            raise SchemaMismatch(f'{record_name}: expected an object, got {value!r}')
+        if not names.issuperset(value):
+            # Encoding would silently drop the extra keys
+            extra = ', '.join(sorted(map(str, set(value) - names)))
+            raise SchemaMismatch(f'{record_name}: fields not in schema: {extra}')
+        for name, encode_field, _ in fields:
+            encode_field(buf, value.get(name))
+
+    def decode(data, pos):
+        record = {}
+        for name, _, decode_field in fields:
+            record[name], pos = decode_field(data, pos)
+        return record, pos
+
+    return encode, decode
+
+
+class SchemaRegistry:
+    """
+    In-process stand-in for a schema registry.
+
+    Maps schema ids to schemas and event types to the schema id they are
+    written with.
+    """
+
+    def __init__(self):
+        self._schemas = {}
+        self._compiled = {}
+        self._event_types = {}
+
+    def register(self, schema_id, schema, event_types=()):
+        if schema_id in self._schemas and self._schemas[schema_id] != schema:
+            raise ValueError(f'Schema id {schema_id} is already registered')
+        self._schemas[schema_id] = schema
+        self._compiled[schema_id] = compile_schema(schema)
+        for event_type in event_types:
+            self._event_types[event_type] = schema_id
+
+    def get(self, schema_id):
+        return self._schemas[schema_id]
+
+    def schema_id_for(self, event_type):
+        return self._event_types.get(event_type)
+
+    def encoder(self, schema_id):
+        return self._compiled[schema_id][0]
+
+    def decoder(self, schema_id):
+        try:
+            return self._compiled[schema_id][1]
+        except KeyError:
+            raise ValueError(f'Unknown schema id: {schema_id}')
+
+
+registry = SchemaRegistry()
+# Ids are part of the wire format: never reuse or change a registered schema,
+# register an evolved one under a new id instead
+registry.register(
+    1,
+    envelope_schema('SupplierEvent', SUPPLIER_SCHEMA),
+    event_types=('supplier_created', 'supplier_updated')
+)
+registry.register(
+    2,
+    envelope_schema('SupplierDeletedEvent', {
+        'type': 'record',
+        'name': 'SupplierRef',
+        'fields': [{'name': 'id', 'type': 'long'}],
+    }),
+    event_types=('supplier_deleted',)
+)
+
+
+def encode_event(message, schema_registry=None):
+    """
+    Encode a ``build_message`` envelope with its event type's schema.
+
+    Falls back to JSON when the event type has no schema or the payload does
+    not fit it.
+    """
+    schema_registry = schema_registry or registry
+    schema_id = schema_registry.schema_id_for(message.get('event_type'))
+    if schema_id is None:
+        return json_utils.dumps(message)
+
+    buf = bytearray(HEADER.pack(MAGIC_BYTE, schema_id))
+    try:
+        schema_registry.encoder(schema_id)(buf, message)
+    except SchemaMismatch:
+        return json_utils.dumps(message)
+    return bytes(buf)
+
+
+def decode_event(value, schema_registry=None):
+    """Decode a supplier event written in either the binary or the JSON format"""
+    schema_registry = schema_registry or registry
+    if not value or value[0] != MAGIC_BYTE:
+        return json_utils.loads(value)
+
+    _, schema_id = HEADER.unpack_from(value)
+    message, _ = schema_registry.decoder(schema_id)(memoryview(value), HEADER.size)
+    return message
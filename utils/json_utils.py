@@ -0,0 +1,45 @@
+"""
+Fast JSON encoding shared by the Kafka producer and the API renderer
+
+Uses orjson when it is installed and falls back to the standard library
+otherwise. Both paths produce the same output as DRF's JSONRenderer:
+compact separators, UTF-8 (no ASCII escaping) and ISO 8601 datetimes with a
+``Z`` suffix for UTC.
+"""
+
+import json
+
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+else:
+    ORJSON_OPTIONS = 0
+
+# Types orjson does not know (Decimal, lazy strings, querysets...) are
+# converted the same way DRF converts them
+_drf_default = JSONEncoder().default
+
+
+def dumps(obj):
+    """Serialize ``obj`` to JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_drf_default, option=ORJSON_OPTIONS)
+    return json.dumps(
+        obj,
+        cls=JSONEncoder,
+        ensure_ascii=False,
+        separators=(',', ':')
+    ).encode('utf-8')
+
+
+def loads(data):
+    """Parse JSON from bytes or str"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
@@ -1,62 +1,495 @@
 """
 Kafka utilities for publishing supplier events from the Auth Service
+
+With ``KAFKA_SUPPLIER_OUTBOX`` enabled events are written to the outbox table
+in the same transaction as the supplier change and published in bulk by
+``manage.py relay_outbox``.
+
+In ``sync`` mode (the default) ``publish_event`` waits for the broker to
+acknowledge each message. In ``async`` mode messages are put on a bounded
+in-memory queue and a background thread hands them to the Kafka client,
+which batches them (``linger_ms``/``batch_size``) and reports delivery
+through callbacks, so HTTP requests never wait on the broker.
+
+The client library is pluggable (``KAFKA_PRODUCER_BACKEND``): the pure-Python
+``kafka-python`` client or ``confluent-kafka`` (librdkafka), which runs an
+idempotent producer with ``poll()``-driven delivery reports.
+
+``KAFKA_EVENT_FORMAT=binary`` encodes message values with the schemas in
+``utils.event_schema`` instead of JSON; consumers decode both formats with
+``utils.event_schema.decode_event``.
 """
 
-import json
+import atexit
 import logging
+import os
+import queue
+import threading
 import time
+from collections import deque
 from kafka import KafkaProducer
+from kafka.errors import KafkaTimeoutError
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from utils import event_schema, json_utils
+
+try:
+    import confluent_kafka
+except ImportError:  # optional backend
+    confluent_kafka = None
 
 logger = logging.getLogger(__name__)
 
 
+class ProducerMetrics:
+    """Thread-safe counters and send latency samples for a producer"""
+    
+    def __init__(self, samples=1000):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=samples)
+        self.counters = {
+            'enqueued': 0,
+            'sent': 0,
+            'failed': 0,
+            'dropped': 0,
+            'spilled': 0,
+            'replayed': 0,
+        }
+    
+    def incr(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+    
+    def record_latency(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+    
+    def snapshot(self, queue_depth=None):
+        """Current counters plus latency percentiles in milliseconds"""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            data = dict(self.counters)
+        
+        def percentile(p):
+            if not latencies:
+                return None
+            index = min(len(latencies) - 1, int(round(p * (len(latencies) - 1))))
+            return round(latencies[index] * 1000, 3)
+        
+        data['queue_depth'] = queue_depth
+        data['latency_ms'] = {
+            'p50': percentile(0.50),
+            'p99': percentile(0.99),
+            'max': percentile(1.0),
+        }
+        return data
+
+
+class KafkaPythonBackend:
+    """Producer backend built on the pure-Python kafka-python client"""
+    name = 'kafka-python'
+    
+    def __init__(self, bootstrap_servers):
+        self._producer = KafkaProducer(
+            bootstrap_servers=bootstrap_servers,
+            acks='all',  # Wait for all replicas to acknowledge
+            linger_ms=settings.KAFKA_LINGER_MS,
+            batch_size=settings.KAFKA_BATCH_SIZE,
+            compression_type=settings.KAFKA_COMPRESSION_TYPE
+        )
+    
+    def send(self, topic, key, value, on_delivery):
+        """Queue a message; ``on_delivery(error)`` runs once it is acknowledged"""
+        future = self._producer.send(topic, key=key, value=value)
+        future.add_callback(lambda metadata: on_delivery(None))
+        future.add_errback(on_delivery)
+    
+    def send_and_wait(self, topic, key, value, timeout):
+        self._producer.send(topic, key=key, value=value).get(timeout=timeout)
+    
+    def poll(self, timeout=0):
+        # kafka-python delivers callbacks from its own I/O thread
+        pass
+    
+    def flush(self, timeout=None):
+        self._producer.flush(timeout=timeout)
+
+
+class ConfluentKafkaBackend:
+    """
+    Producer backend built on confluent-kafka (librdkafka).
+    
+    Delivery reports are only dispatched from ``poll()``/``flush()``, so
+    callers must poll regularly.
+    """
+    name = 'confluent-kafka'
+    
+    def __init__(self, bootstrap_servers, **extra_config):
+        if confluent_kafka is None:
+            raise ImproperlyConfigured("KAFKA_PRODUCER_BACKEND=confluent-kafka requires the confluent-kafka package")
+        config = {
+            'bootstrap.servers': bootstrap_servers,
+            'enable.idempotence': True,  # implies acks=all, no duplicates on retry
+            'acks': 'all',
+            'linger.ms': settings.KAFKA_LINGER_MS,
+            'batch.size': settings.KAFKA_BATCH_SIZE,
+            'compression.type': settings.KAFKA_COMPRESSION_TYPE or 'none',
+        }
+        config.update(extra_config)
+        self._producer = confluent_kafka.Producer(config)
+    
+    def send(self, topic, key, value, on_delivery):
+        """Queue a message; ``on_delivery(error)`` runs from a later poll()"""
+        def callback(err, msg):
+            on_delivery(err)
+        
+        try:
+            self._producer.produce(topic, value=value, key=key, on_delivery=callback)
+        except BufferError:
+            # Local queue full: serve delivery reports to make room, then retry
+            self._producer.poll(1)
+            self._producer.produce(topic, value=value, key=key, on_delivery=callback)
+        self._producer.poll(0)
+    
+    def send_and_wait(self, topic, key, value, timeout):
+        result = {}
+        self.send(topic, key, value, lambda error: result.setdefault('error', error))
+        self._producer.flush(timeout)
+        if 'error' not in result:
+            raise TimeoutError("Timed out waiting for delivery")
+        if result['error'] is not None:
+            raise confluent_kafka.KafkaException(result['error'])
+    
+    def poll(self, timeout=0):
+        self._producer.poll(timeout)
+    
+    def flush(self, timeout=None):
+        self._producer.flush(timeout if timeout is not None else -1)
+
+
+PRODUCER_BACKENDS = {
+    KafkaPythonBackend.name: KafkaPythonBackend,
+    ConfluentKafkaBackend.name: ConfluentKafkaBackend,
+}
+
+
+EVENT_FORMATS = ('json', 'binary')
+
+
 class KafkaSupplierProducer:
     """Producer for supplier events"""
     
-    def __init__(self):
+    # Wait between spill replays after a message failed to send again
+    SPILL_RETRY_SECONDS = 5
+    
+    def __init__(self, backend=None, bootstrap_servers=None, event_format=None):
         """Initialize Kafka producer"""
-        self.bootstrap_servers = settings.KAFKA_BOOTSTRAP_SERVERS
+        self.bootstrap_servers = bootstrap_servers or settings.KAFKA_BOOTSTRAP_SERVERS
         self.supplier_topic = settings.KAFKA_SUPPLIER_EVENTS_TOPIC
+        self.backend = backend or settings.KAFKA_PRODUCER_BACKEND
+        if self.backend not in PRODUCER_BACKENDS:
+            raise ImproperlyConfigured(f"Unknown Kafka producer backend: {self.backend}")
+        self.event_format = event_format or settings.KAFKA_EVENT_FORMAT
+        if self.event_format not in EVENT_FORMATS:
+            raise ImproperlyConfigured(f"Unknown Kafka event format: {self.event_format}")
+        self.mode = settings.KAFKA_PUBLISH_MODE
+        self.full_policy = settings.KAFKA_QUEUE_FULL_POLICY
+        self.metrics = ProducerMetrics()
         self._producer = None
+        self._queue = queue.Queue(maxsize=settings.KAFKA_QUEUE_MAX_SIZE)
+        self._sender = None
+        self._sender_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._replay_after = 0  # monotonic time of the next spill replay
+        self._pid = os.getpid()
         
     @property
     def producer(self):
-        """Lazy initialization of Kafka producer"""
+        """Lazy initialization of Kafka producer backend"""
         if self._producer is None:
             try:
-                self._producer = KafkaProducer(
-                    bootstrap_servers=self.bootstrap_servers,
-                    value_serializer=lambda v: json.dumps(v).encode('utf-8'),
-                    key_serializer=lambda k: str(k).encode('utf-8') if k else None,
-                    acks='all'  # Wait for all replicas to acknowledge
-                )
+                self._producer = PRODUCER_BACKENDS[self.backend](self.bootstrap_servers)
             except Exception as e:
                 logger.error(f"Failed to create Kafka producer: {str(e)}")
                 self._producer = None
         return self._producer
     
+    @staticmethod
+    def serialize_key(key):
+        return str(key).encode('utf-8') if key else None
+    
+    def serialize_value(self, message):
+        if self.event_format == 'binary':
+            return event_schema.encode_event(message)
+        return json_utils.dumps(message)
+    
+    @staticmethod
+    def build_message(event_type, payload, timestamp=None):
+        """Wrap a payload in the event envelope (timestamp in epoch millis)"""
+        return {
+            'event_type': event_type,
+            'timestamp': timestamp if timestamp is not None else int(time.time() * 1000),
+            'payload': payload
+        }
+    
     def publish_event(self, topic, event_type, payload, key=None):
-        """Publish an event to a Kafka topic"""
+        """
+        Publish an event to a Kafka topic.
+        
+        With KAFKA_SUPPLIER_OUTBOX enabled the event is written to the outbox
+        table in the caller's transaction and published later by the relay.
+        Otherwise, inside a transaction the send is deferred until commit.
+        In async mode this only enqueues the message and returns whether it
+        was accepted; delivery is reported through the metrics.
+        """
+        if settings.KAFKA_SUPPLIER_OUTBOX:
+            return self._write_outbox(topic, event_type, payload, key)
+        
+        message = self.build_message(event_type, payload)
+        
+        if transaction.get_connection().in_atomic_block:
+            # Never announce a change that may still be rolled back
+            transaction.on_commit(lambda: self._publish(topic, key, message))
+            return True
+        return self._publish(topic, key, message)
+    
+    def _publish(self, topic, key, message):
+        if self.mode == 'async':
+            return self._enqueue(topic, key, message)
+        
         if self.producer is None:
             logger.error("Kafka producer not initialized")
             return False
-            
-        message = {
-            'event_type': event_type,
-            'timestamp': int(time.time() * 1000),
-            'payload': payload
-        }
         
+        event_type = message['event_type']
+        started_at = time.monotonic()
         try:
-            future = self.producer.send(topic, key=key, value=message)
-            future.get(timeout=10)  # Wait for the send to complete
+            self.producer.send_and_wait(
+                topic,
+                self.serialize_key(key),
+                self.serialize_value(message),
+                timeout=10  # Wait for the send to complete
+            )
+            self.metrics.record_latency(time.monotonic() - started_at)
+            self.metrics.incr('sent')
             logger.info(f"Published event {event_type} to topic {topic}")
             return True
         except Exception as e:
+            self.metrics.incr('failed')
             logger.error(f"Failed to publish event to Kafka: {str(e)}")
             return False
     
+    def _write_outbox(self, topic, event_type, payload, key):
+        """Store the event in the transactional outbox"""
+        from accounts.models import OutboxEvent
+        
+        OutboxEvent.objects.create(
+            topic=topic,
+            event_type=event_type,
+            key=key,
+            payload=payload
+        )
+        return True
+    
+    def send_batch(self, messages, timeout=30):
+        """
+        Send ``(topic, key, message)`` tuples and wait for all of them at once.
+        
+        Used by the outbox relay. Returns one error string per message, or
+        None for the messages that were delivered.
+        """
+        producer = self.producer
+        if producer is None:
+            return ["Kafka producer not initialized"] * len(messages)
+        
+        started_at = time.monotonic()
+        pending = object()
+        results = [pending] * len(messages)
+        
+        def on_delivery(index, error):
+            results[index] = error
+        
+        for index, (topic, key, message) in enumerate(messages):
+            try:
+                producer.send(
+                    topic,
+                    self.serialize_key(key),
+                    self.serialize_value(message),
+                    lambda error, index=index: on_delivery(index, error)
+                )
+            except Exception as e:
+                results[index] = e
+        try:
+            producer.flush(timeout=timeout)
+        except KafkaTimeoutError:
+            # kafka-python raises when the timeout lapses; whatever has not
+            # been acknowledged is reported as timed out below
+            logger.warning(f"Timed out after {timeout}s flushing a batch of {len(messages)} events")
+        
+        errors = []
+        for error in results:
+            if error is pending:
+                error = "Timed out waiting for delivery"
+            if error is None:
+                self.metrics.incr('sent')
+            else:
+                self.metrics.incr('failed')
+            errors.append(str(error) if error is not None else None)
+        self.metrics.record_latency(time.monotonic() - started_at)
+        return errors
+    
+    def _enqueue(self, topic, key, message):
+        """Put a message on the send queue, applying the backpressure policy"""
+        self._ensure_sender()
+        item = (topic, key, message, time.monotonic())
+        try:
+            if self.full_policy == 'block':
+                self._queue.put(item, timeout=settings.KAFKA_QUEUE_BLOCK_TIMEOUT)
+            else:
+                self._queue.put_nowait(item)
+            self.metrics.incr('enqueued')
+            return True
+        except queue.Full:
+            if self.full_policy == 'spill':
+                return self._spill(topic, key, message)
+            self.metrics.incr('dropped')
+            logger.error(f"Kafka send queue full, dropped {message['event_type']} event")
+            return False
+    
+    def _ensure_sender(self):
+        """Start the sender thread (again after a fork, e.g. gunicorn --preload)"""
+        if self._sender is not None and self._sender.is_alive() and self._pid == os.getpid():
+            return
+        with self._sender_lock:
+            if self._pid != os.getpid():
+                # Threads and client sockets do not survive a fork
+                self._pid = os.getpid()
+                self._producer = None
+                self._queue = queue.Queue(maxsize=settings.KAFKA_QUEUE_MAX_SIZE)
+                self._sender = None
+            if self._sender is None or not self._sender.is_alive():
+                self._sender = threading.Thread(
+                    target=self._send_loop,
+                    name='kafka-supplier-sender',
+                    daemon=True
+                )
+                self._sender.start()
+    
+    def _send_loop(self):
+        """Drain the queue into the Kafka client, which batches the sends"""
+        while True:
+            try:
+                item = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                # Idle: serve delivery reports and retry messages spilled to disk
+                if self._producer is not None:
+                    self._producer.poll(0)
+                self._replay_spill()
+                continue
+            
+            topic, key, message, enqueued_at = item
+            try:
+                self._send(topic, key, message, enqueued_at)
+            finally:
+                self._queue.task_done()
+    
+    def _send(self, topic, key, message, enqueued_at, respill=False):
+        """
+        Hand one message to the Kafka client with delivery callbacks. With
+        ``respill`` a message that cannot be delivered goes back to the spill
+        file instead of being lost.
+        """
+        event_type = message['event_type']
+        retry = (topic, key, message) if respill else None
+        try:
+            producer = self.producer
+            if producer is None:
+                raise RuntimeError("Kafka producer not initialized")
+            producer.send(
+                topic,
+                self.serialize_key(key),
+                self.serialize_value(message),
+                lambda error: self._on_delivery(enqueued_at, event_type, error, retry)
+            )
+        except Exception as e:
+            self._on_failed(event_type, e, retry)
+    
+    def _on_delivery(self, enqueued_at, event_type, error, respill=None):
+        if error is not None:
+            self._on_failed(event_type, error, respill)
+            return
+        self.metrics.record_latency(time.monotonic() - enqueued_at)
+        self.metrics.incr('sent')
+    
+    def _on_failed(self, event_type, exc, respill=None):
+        self.metrics.incr('failed')
+        logger.error(f"Failed to publish {event_type} event to Kafka: {str(exc)}")
+        if respill:
+            self._spill(*respill)
+            self._replay_after = time.monotonic() + self.SPILL_RETRY_SECONDS
+    
+    def _spill(self, topic, key, message):
+        """Append a message that did not fit in the queue to the spill file"""
+        try:
+            with self._spill_lock:
+                with open(settings.KAFKA_SPILL_PATH, 'ab') as spill:
+                    spill.write(json_utils.dumps({'topic': topic, 'key': key, 'message': message}) + b'\n')
+            self.metrics.incr('spilled')
+            return True
+        except Exception as e:
+            self.metrics.incr('dropped')
+            logger.error(f"Failed to spill Kafka event to disk: {str(e)}")
+            return False
+    
+    def _replay_spill(self):
+        """
+        Send messages spilled to disk while the queue was full. Messages that
+        fail to send are spilled again and retried after
+        ``SPILL_RETRY_SECONDS``; unreadable lines are logged and skipped.
+        """
+        path = settings.KAFKA_SPILL_PATH
+        if time.monotonic() < self._replay_after or not os.path.exists(path):
+            return
+        if self.producer is None:
+            # Keep the file until there is a client to deliver it with
+            self._replay_after = time.monotonic() + self.SPILL_RETRY_SECONDS
+            return
+        replaying = f"{path}.{os.getpid()}.replay"
+        with self._spill_lock:
+            try:
+                os.replace(path, replaying)
+            except FileNotFoundError:
+                return
+        with open(replaying, 'rb') as spill:
+            for number, line in enumerate(spill, 1):
+                try:
+                    entry = json_utils.loads(line)
+                    topic, key, message = entry['topic'], entry['key'], entry['message']
+                    if 'event_type' not in message:
+                        raise ValueError("not an event")
+                except (ValueError, TypeError, KeyError) as e:
+                    logger.error(f"Skipping unreadable line {number} of the Kafka spill file: {str(e)}")
+                    continue
+                self._send(topic, key, message, time.monotonic(), respill=True)
+                self.metrics.incr('replayed')
+        os.remove(replaying)
+    
+    def flush(self, timeout=10):
+        """Wait until queued messages have been handed to Kafka and sent"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        if self._producer is not None:
+            try:
+                self._producer.flush(timeout=max(0, deadline - time.monotonic()))
+            except KafkaTimeoutError:
+                logger.warning("Timed out flushing queued Kafka events")
+    
+    def get_metrics(self):
+        """Counters, latency percentiles and current queue depth"""
+        return self.metrics.snapshot(queue_depth=self._queue.qsize())
+    
     def publish_supplier_created(self, supplier_id, data):
         """Publish a supplier created event"""
         return self.publish_event(
@@ -86,4 +519,6 @@ class KafkaSupplierProducer:
 
 
 # Create a singleton instance
-supplier_producer = KafkaSupplierProducer()
\ No newline at end of file
+supplier_producer = KafkaSupplierProducer()
+# Deliver whatever is still queued when the worker shuts down
+atexit.register(supplier_producer.flush)